@@ -3,125 +3,276 @@
 Script avançado para extrair todas as imagens possíveis do PDF
 """
 
+import os
+
+# O paralelismo é feito por processo (uma página por worker); evita que cada
+# worker também dispare threads OpenMP e sobrecarregue a CPU
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
 import fitz
 import cv2
 import numpy as np
-import os
 import sys
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
-def extract_all_images(pdf_path):
-    """Extrai todas as imagens possíveis do PDF"""
-    print(f"Analisando PDF: {pdf_path}")
+cv2.ocl.setUseOpenCL(False)
+
+# Classificador Haar carregado uma única vez (evita reler o XML a cada imagem/página)
+FACE_CASCADE = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+# Modelo YuNet (detector DNN do OpenCV); se não estiver disponível usa o Haar
+YUNET_MODEL = os.environ.get(
+    'YUNET_MODEL',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'face_detection_yunet_2023mar.onnx')
+)
+
+def _load_yunet():
+    """Carrega o detector YuNet, retornando None se o modelo não existir"""
+    if not hasattr(cv2, 'FaceDetectorYN') or not os.path.exists(YUNET_MODEL):
+        return None
+    try:
+        return cv2.FaceDetectorYN.create(YUNET_MODEL, "", (320, 320))
+    except cv2.error as e:
+        print(f"Aviso: não foi possível carregar o YuNet ({e}), usando Haar")
+        return None
+
+FACE_DETECTOR = _load_yunet()
+
+# Zoom usado para renderizar a página e fator de redução aplicado antes do Haar
+RENDER_ZOOM = 2.0
+DETECTION_SCALE = 0.5
+
+# Parâmetros de gravação JPEG: imagens intermediárias usam qualidade menor e
+# sem otimização de Huffman; recortes de face finais mantêm qualidade 95
+JPEG_OPTS = [cv2.IMWRITE_JPEG_QUALITY, 85, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+FACE_JPEG_OPTS = [cv2.IMWRITE_JPEG_QUALITY, 95]
+
+def pixmap_to_bgr(pix):
+    """Converte um Pixmap do PyMuPDF em imagem BGR sem passar por PNG"""
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+    arr = arr[:, :pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
     
-    if not os.path.exists(pdf_path):
-        print(f"Arquivo não encontrado: {pdf_path}")
-        return
+    channels = pix.n - pix.alpha
+    if channels == 1:
+        return cv2.cvtColor(arr[:, :, 0], cv2.COLOR_GRAY2BGR)
+    if pix.alpha:
+        return cv2.cvtColor(arr, cv2.COLOR_RGBA2BGR)
+    return cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
+
+def decode_embedded_image(doc, xref):
+    """Decodifica uma imagem embutida a partir dos bytes originais do PDF"""
+    info = doc.extract_image(xref)
+    if info and info.get("image"):
+        img_array = np.frombuffer(info["image"], dtype=np.uint8)
+        img_cv = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+        if img_cv is not None:
+            return img_cv
     
-    try:
+    # Formatos que o OpenCV não decodifica (ex.: JPX): usa o Pixmap
+    pix = fitz.Pixmap(doc, xref)
+    if pix.n - pix.alpha >= 4:
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    return pixmap_to_bgr(pix)
+
+def detect_faces(image, min_size=30):
+    """Detecta faces com YuNet (uma única passada, BGR) ou Haar (escala de cinza)"""
+    if FACE_DETECTOR is not None:
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        h, w = image.shape[:2]
+        FACE_DETECTOR.setInputSize((w, h))
+        _, faces = FACE_DETECTOR.detect(image)
+        if faces is None:
+            return np.empty((0, 4), dtype=int)
+        # As caixas do YuNet podem sair da imagem (faces na borda da página):
+        # recorta para os limites, senão o corte da face fica vazio
+        boxes = faces[:, :4].astype(int)
+        x1 = np.clip(boxes[:, 0] + boxes[:, 2], 0, w)
+        y1 = np.clip(boxes[:, 1] + boxes[:, 3], 0, h)
+        np.clip(boxes[:, 0], 0, w, out=boxes[:, 0])
+        np.clip(boxes[:, 1], 0, h, out=boxes[:, 1])
+        boxes[:, 2] = x1 - boxes[:, 0]
+        boxes[:, 3] = y1 - boxes[:, 1]
+        return boxes[(boxes[:, 2] >= min_size) & (boxes[:, 3] >= min_size)]
+    
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return FACE_CASCADE.detectMultiScale(image, 1.1, 4, minSize=(min_size, min_size))
+
+def find_photo_candidates(gray, min_area=5000, scale=0.25):
+    """Localiza regiões que podem ser fotos usando componentes conexos
+    
+    A imagem é reduzida, binarizada com Otsu e rotulada em uma única passada;
+    as estatísticas (x, y, w, h, área) de cada componente são filtradas
+    diretamente e reescaladas para a resolução original.
+    """
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    _, bw = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(bw, connectivity=8)
+    
+    # Descarta o rótulo 0 (fundo) e volta para a escala original
+    stats = stats[1:].astype(np.float64)
+    x = stats[:, cv2.CC_STAT_LEFT] / scale
+    y = stats[:, cv2.CC_STAT_TOP] / scale
+    w = stats[:, cv2.CC_STAT_WIDTH] / scale
+    h = stats[:, cv2.CC_STAT_HEIGHT] / scale
+    area = stats[:, cv2.CC_STAT_AREA] / (scale * scale)
+    
+    # Filtros para identificar possíveis fotos (proporção entre 0.5 e 2.0)
+    mask = (area > min_area) & (w >= 0.5 * h) & (w <= 2.0 * h) & (w > 80) & (h > 80)
+    
+    img_h, img_w = gray.shape[:2]
+    candidates = []
+    for i in np.flatnonzero(mask):
+        cx, cy = int(x[i]), int(y[i])
+        cw, ch = min(int(w[i]), img_w - cx), min(int(h[i]), img_h - cy)
+        candidates.append((cx, cy, cw, ch, float(area[i])))
+    return candidates
+
+def _init_worker():
+    """Inicializa um processo do pool com uma única thread do OpenCV"""
+    cv2.setNumThreads(1)
+
+def _iter_rendered_pages(pdf_path, num_pages):
+    """Renderiza as páginas em uma thread produtora enquanto o chamador analisa a anterior
+    
+    A fila limitada a 2 páginas sobrepõe a renderização do PyMuPDF com a
+    detecção do OpenCV (ambos liberam o GIL) sem acumular imagens na memória.
+    """
+    pages = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    
+    def producer():
+        # Documento próprio: o PyMuPDF não é thread-safe
         doc = fitz.open(pdf_path)
-        print(f"PDF aberto com sucesso. Páginas: {len(doc)}")
-        
+        try:
+            mat = fitz.Matrix(RENDER_ZOOM, RENDER_ZOOM)
+            for page_num in range(num_pages):
+                if stop.is_set():
+                    break
+                pix = doc.load_page(page_num).get_pixmap(matrix=mat)
+                pages.put((page_num, pixmap_to_bgr(pix)))
+        except Exception as e:
+            print(f"Erro ao renderizar páginas: {e}")
+        finally:
+            doc.close()
+            pages.put(None)
+    
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    
+    item = ()
+    try:
+        while True:
+            item = pages.get()
+            if item is None:
+                break
+            yield item
+    finally:
+        # Se o consumidor parou antes do fim, libera o produtor e aguarda
+        stop.set()
+        while item is not None:
+            item = pages.get()
+        thread.join()
+
+def _process_page(pdf_path, page_num, debug=False, page_img=None):
+    """Processa uma única página do PDF (executado em um processo do pool)
+    
+    page_img pode trazer a página já renderizada (ver _iter_rendered_pages).
+    """
+    # Documentos do PyMuPDF não podem ser compartilhados entre processos
+    doc = fitz.open(pdf_path)
+    try:
+        page = doc.load_page(page_num)
         total_images = 0
+        face_count = 0
         
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            
-            # Método 1: Imagens embutidas
-            image_list = page.get_images()
-            print(f"\nPágina {page_num + 1} - Imagens embutidas: {len(image_list)}")
-            
-            for img_index, img in enumerate(image_list):
-                try:
-                    xref = img[0]
-                    pix = fitz.Pixmap(doc, xref)
-                    
-                    print(f"  Imagem embutida {img_index + 1}: {pix.width}x{pix.height}")
+        # Método 1: Imagens embutidas
+        image_list = page.get_images()
+        print(f"\nPágina {page_num + 1} - Imagens embutidas: {len(image_list)}")
+        
+        for img_index, img in enumerate(image_list):
+            try:
+                xref = img[0]
+                img_cv = decode_embedded_image(doc, xref)
+                
+                if img_cv is not None:
+                    print(f"  Imagem embutida {img_index + 1}: {img_cv.shape[1]}x{img_cv.shape[0]}")
                     
-                    if pix.n - pix.alpha < 4:
-                        img_data = pix.tobytes("png")
-                        img_array = np.frombuffer(img_data, dtype=np.uint8)
-                        img_cv = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-                        
-                        if img_cv is not None:
-                            output_path = f"embedded_p{page_num + 1}_i{img_index}.jpg"
-                            cv2.imwrite(output_path, img_cv)
-                            print(f"    Salva: {output_path}")
-                            
-                            # Detecta faces
-                            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-                            gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-                            faces = face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(30, 30))
-                            print(f"    Faces: {len(faces)}")
-                            
-                            total_images += 1
+                    if debug:
+                        output_path = f"embedded_p{page_num + 1}_i{img_index}.jpg"
+                        cv2.imwrite(output_path, img_cv, JPEG_OPTS)
+                        print(f"    Salva: {output_path}")
                     
-                    pix = None
+                    # Detecta faces
+                    embedded_faces = detect_faces(img_cv, 30)
+                    print(f"    Faces: {len(embedded_faces)}")
                     
-                except Exception as e:
-                    print(f"    Erro: {e}")
-            
-            # Método 2: Renderizar página como imagem e procurar por regiões
-            print(f"\nPágina {page_num + 1} - Renderizando página completa...")
-            
-            # Renderiza a página em alta resolução
-            mat = fitz.Matrix(2.0, 2.0)  # 2x zoom
+                    total_images += 1
+                
+            except Exception as e:
+                print(f"    Erro: {e}")
+        
+        # Método 2: Renderizar página como imagem e procurar por regiões
+        print(f"\nPágina {page_num + 1} - Renderizando página completa...")
+        
+        # Renderiza a página em alta resolução (se ainda não foi renderizada)
+        if page_img is None:
+            mat = fitz.Matrix(RENDER_ZOOM, RENDER_ZOOM)
             pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            img_array = np.frombuffer(img_data, dtype=np.uint8)
-            page_img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            
-            if page_img is not None:
+            page_img = pixmap_to_bgr(pix)
+        
+        if page_img is not None:
+            if debug:
                 output_path = f"page_render_p{page_num + 1}.jpg"
-                cv2.imwrite(output_path, page_img)
+                cv2.imwrite(output_path, page_img, JPEG_OPTS)
                 print(f"  Página renderizada salva: {output_path}")
+            
+            # Escala de cinza calculada uma única vez por página
+            gray = cv2.cvtColor(page_img, cv2.COLOR_BGR2GRAY)
+            
+            # YuNet trabalha em BGR; o Haar reaproveita a escala de cinza
+            detection_img = page_img if FACE_DETECTOR is not None else gray
+            
+            # Detecta faces na página completa em resolução reduzida
+            # (o custo da detecção cresce com o número de pixels) e reescala
+            # as coordenadas para a imagem em alta resolução
+            small_img = cv2.resize(detection_img, None, fx=DETECTION_SCALE, fy=DETECTION_SCALE,
+                                   interpolation=cv2.INTER_AREA)
+            faces = detect_faces(small_img, int(30 * DETECTION_SCALE))
+            if len(faces) > 0:
+                faces = (faces / DETECTION_SCALE).astype(int)
+            face_count = len(faces)
+            print(f"  Faces detectadas na página: {face_count}")
+            
+            if len(faces) > 0:
+                print(f"  Coordenadas das faces: {faces}")
+                for i, (x, y, w, h) in enumerate(faces):
+                    # Extrai a região da face
+                    face_region = page_img[y:y+h, x:x+w]
+                    face_output = f"face_p{page_num + 1}_f{i}.jpg"
+                    cv2.imwrite(face_output, face_region, FACE_JPEG_OPTS)
+                    print(f"    Face {i+1} extraída: {face_output}")
                 
-                # Detecta faces na página completa
-                face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-                gray = cv2.cvtColor(page_img, cv2.COLOR_BGR2GRAY)
-                faces = face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(30, 30))
-                print(f"  Faces detectadas na página: {len(faces)}")
-                
-                if len(faces) > 0:
-                    print(f"  Coordenadas das faces: {faces}")
+                if debug:
                     # Salva imagem com faces marcadas
                     img_with_faces = page_img.copy()
-                    for i, (x, y, w, h) in enumerate(faces):
+                    for (x, y, w, h) in faces:
                         cv2.rectangle(img_with_faces, (x, y), (x+w, y+h), (0, 255, 0), 3)
-                        
-                        # Extrai a região da face
-                        face_region = page_img[y:y+h, x:x+w]
-                        face_output = f"face_p{page_num + 1}_f{i}.jpg"
-                        cv2.imwrite(face_output, face_region)
-                        print(f"    Face {i+1} extraída: {face_output}")
                     
                     faces_marked_path = f"faces_marked_p{page_num + 1}.jpg"
-                    cv2.imwrite(faces_marked_path, img_with_faces)
+                    cv2.imwrite(faces_marked_path, img_with_faces, JPEG_OPTS)
                     print(f"  Faces marcadas: {faces_marked_path}")
-                
-                # Método 3: Procurar por regiões que podem ser fotos
+            
+            # Método 3: Procurar por regiões que podem ser fotos
+            # (desnecessário quando a página inteira já teve face detectada)
+            if len(faces) == 0:
                 print(f"  Procurando regiões de foto...")
                 
-                # Converte para escala de cinza
-                gray = cv2.cvtColor(page_img, cv2.COLOR_BGR2GRAY)
-                
-                # Detecta contornos
-                edges = cv2.Canny(gray, 50, 150)
-                contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
-                # Filtra contornos por tamanho (possíveis fotos)
-                min_area = 5000  # área mínima para ser considerada uma foto
-                photo_candidates = []
-                
-                for contour in contours:
-                    area = cv2.contourArea(contour)
-                    if area > min_area:
-                        x, y, w, h = cv2.boundingRect(contour)
-                        aspect_ratio = w / h
-                        
-                        # Filtros para identificar possíveis fotos
-                        if 0.5 <= aspect_ratio <= 2.0 and w > 80 and h > 80:
-                            photo_candidates.append((x, y, w, h, area))
+                photo_candidates = find_photo_candidates(gray, min_area=5000)
                 
                 print(f"  Candidatos a foto encontrados: {len(photo_candidates)}")
                 
@@ -129,37 +280,96 @@ def extract_all_images(pdf_path):
                     # Ordena por área (maior primeiro)
                     photo_candidates.sort(key=lambda x: x[4], reverse=True)
                     
-                    img_with_candidates = page_img.copy()
                     for i, (x, y, w, h, area) in enumerate(photo_candidates):
-                        cv2.rectangle(img_with_candidates, (x, y), (x+w, y+h), (255, 0, 0), 2)
+                        # Tenta detectar face na região candidata
+                        candidate_faces = detect_faces(detection_img[y:y+h, x:x+w], 20)
+                        print(f"    Candidato {i+1} (área: {area}) - faces: {len(candidate_faces)}")
                         
-                        # Extrai a região candidata
-                        candidate_region = page_img[y:y+h, x:x+w]
-                        candidate_output = f"candidate_p{page_num + 1}_c{i}.jpg"
-                        cv2.imwrite(candidate_output, candidate_region)
-                        print(f"    Candidato {i+1}: {candidate_output} (área: {area})")
+                        # Fora do modo debug só salva candidatos que contêm face
+                        if debug or len(candidate_faces) > 0:
+                            candidate_region = page_img[y:y+h, x:x+w]
+                            candidate_output = f"candidate_p{page_num + 1}_c{i}.jpg"
+                            cv2.imwrite(candidate_output, candidate_region, JPEG_OPTS)
+                            print(f"      Salvo: {candidate_output}")
                         
-                        # Tenta detectar face na região candidata
-                        candidate_gray = cv2.cvtColor(candidate_region, cv2.COLOR_BGR2GRAY)
-                        candidate_faces = face_cascade.detectMultiScale(candidate_gray, 1.1, 4, minSize=(20, 20))
-                        print(f"      Faces no candidato: {len(candidate_faces)}")
+                        # Basta a primeira região com face (foto do documento)
+                        if len(candidate_faces) > 0:
+                            face_count = len(candidate_faces)
+                            break
                     
-                    candidates_marked_path = f"candidates_marked_p{page_num + 1}.jpg"
-                    cv2.imwrite(candidates_marked_path, img_with_candidates)
-                    print(f"  Candidatos marcados: {candidates_marked_path}")
-            
-            pix = None
+                    if debug:
+                        img_with_candidates = page_img.copy()
+                        for (x, y, w, h, _) in photo_candidates:
+                            cv2.rectangle(img_with_candidates, (x, y), (x+w, y+h), (255, 0, 0), 2)
+                        
+                        candidates_marked_path = f"candidates_marked_p{page_num + 1}.jpg"
+                        cv2.imwrite(candidates_marked_path, img_with_candidates, JPEG_OPTS)
+                        print(f"  Candidatos marcados: {candidates_marked_path}")
         
+        return {'page': page_num, 'images': total_images, 'faces': face_count}
+    finally:
+        doc.close()
+
+def extract_all_images(pdf_path, max_pages=None, stop_on_face=True, debug=False):
+    """Extrai todas as imagens possíveis do PDF
+    
+    max_pages limita quantas páginas são analisadas e, com stop_on_face=True,
+    o processamento termina na primeira página em que uma face é encontrada
+    (documentos de identidade costumam ter a foto na primeira página).
+    Com debug=True também grava as imagens intermediárias (renderizações,
+    imagens embutidas e marcações de faces/candidatos).
+    """
+    print(f"Analisando PDF: {pdf_path}")
+    
+    if not os.path.exists(pdf_path):
+        print(f"Arquivo não encontrado: {pdf_path}")
+        return
+    
+    try:
+        doc = fitz.open(pdf_path)
+        print(f"PDF aberto com sucesso. Páginas: {len(doc)}")
+        num_pages = len(doc)
         doc.close()
-        print(f"\nProcessamento concluído!")
+        
+        if max_pages:
+            num_pages = min(num_pages, max_pages)
+        
+        max_workers = min(os.cpu_count() or 1, 4, num_pages)
+        if max_workers <= 1:
+            # Um único processo: usa todas as threads do OpenCV e renderiza a
+            # próxima página enquanto a atual é analisada
+            cv2.setNumThreads(cv2.getNumberOfCPUs())
+            results = []
+            for page_num, page_img in _iter_rendered_pages(pdf_path, num_pages):
+                results.append(_process_page(pdf_path, page_num, debug, page_img))
+                if stop_on_face and results[-1]['faces'] > 0:
+                    break
+        else:
+            # Páginas são independentes: processa em paralelo
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+                futures = [executor.submit(_process_page, pdf_path, page_num, debug)
+                           for page_num in range(num_pages)]
+                
+                results = []
+                for future in futures:
+                    results.append(future.result())
+                    if stop_on_face and results[-1]['faces'] > 0:
+                        # Descarta as páginas que ainda não começaram
+                        for pending in futures:
+                            pending.cancel()
+                        break
+        
+        total_images = sum(r['images'] for r in results)
+        print(f"\nProcessamento concluído! Imagens embutidas analisadas: {total_images}")
         
     except Exception as e:
         print(f"Erro ao processar PDF: {e}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Uso: python3 advanced_image_extraction.py <caminho_do_pdf>")
+    args = [arg for arg in sys.argv[1:] if arg != '--debug']
+    if len(args) != 1:
+        print("Uso: python3 advanced_image_extraction.py <caminho_do_pdf> [--debug]")
         sys.exit(1)
     
-    pdf_path = sys.argv[1]
-    extract_all_images(pdf_path)
+    pdf_path = args[0]
+    extract_all_images(pdf_path, debug='--debug' in sys.argv[1:])
@@ -8,10 +8,20 @@ import os
 import sys
 import json
 import uuid
+import shutil
+import tempfile
+import threading
+import time
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for
+
+# Cada worker do Gunicorn já roda em paralelo: limita as threads internas
+# do OpenCV/OpenMP para não sobrecarregar a CPU. Precisa vir antes dos imports
+# de terceiros, pois o OpenBLAS do numpy lê a variável ao ser carregado
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+from flask import Flask, render_template, request, jsonify, send_from_directory, flash, redirect, url_for
 from werkzeug.utils import secure_filename
-from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.exceptions import RequestEntityTooLarge, NotFound
 import logging
 
 # Adicionar o diretório atual ao path para importar o processador
@@ -24,6 +34,13 @@ except ImportError as e:
     DocumentProcessor = None
     CPFValidator = None
 
+try:
+    import cv2
+    cv2.setNumThreads(1)
+    cv2.ocl.setUseOpenCL(False)
+except ImportError:
+    pass
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
 app.config['MAX_CONTENT_LENGTH'] = 20 * 1024 * 1024  # 20MB max file size
@@ -32,6 +49,9 @@ app.config['MAX_CONTENT_LENGTH'] = 20 * 1024 * 1024  # 20MB max file size
 UPLOAD_FOLDER = '/opt/document-processor/uploads'
 OUTPUT_FOLDER = '/opt/document-processor/output'
 ALLOWED_EXTENSIONS = {'pdf'}
+UPLOAD_COPY_BUFFER = 1024 * 1024  # 1MB por leitura ao copiar o upload
+PHOTO_CACHE_MAX_AGE = 3600  # segundos de cache das fotos extraídas
+MAX_BATCH_CPFS = 10000  # limite de CPFs por requisição em /validate_cpfs
 
 # Criar diretórios se não existirem
 for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER]:
@@ -41,10 +61,65 @@ for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER]:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Processador (e seu cliente boto3) compartilhado entre as requisições
+_PROCESSOR = None
+_PROCESSOR_LOCK = threading.Lock()
+
+def get_processor():
+    """Retorna a instância única do DocumentProcessor, criando-a na primeira chamada"""
+    global _PROCESSOR
+    if _PROCESSOR is None:
+        with _PROCESSOR_LOCK:
+            if _PROCESSOR is None:
+                processor = DocumentProcessor(region='us-east-1')  # Usar região us-east-1 para Textract
+                try:
+                    processor.initialize_textract()
+                except Exception as e:
+                    logger.warning(f"Textract não inicializado: {e}")
+                _PROCESSOR = processor
+    return _PROCESSOR
+
+# Resultado da verificação do cliente Textract usado pelo /health
+AWS_STATUS_TTL = 60  # segundos
+_AWS_STATUS = None
+_AWS_STATUS_CHECKED_AT = 0.0
+
+def _probe_aws():
+    """Verifica se o cliente Textract pode ser criado, reaproveitando o resultado por AWS_STATUS_TTL"""
+    global _AWS_STATUS, _AWS_STATUS_CHECKED_AT
+    now = time.monotonic()
+    if _AWS_STATUS is None or now - _AWS_STATUS_CHECKED_AT > AWS_STATUS_TTL:
+        try:
+            import boto3
+            boto3.client('textract', region_name='us-east-1')
+            _AWS_STATUS = "configured"
+        except Exception as e:
+            _AWS_STATUS = f"error: {str(e)}"
+        _AWS_STATUS_CHECKED_AT = now
+    return _AWS_STATUS
+
 def allowed_file(filename):
     """Verifica se o arquivo tem extensão permitida"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def link_or_copy(src, dst):
+    """Cria um hardlink de src em dst, copiando apenas se o link não for possível"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Sistemas de arquivos diferentes ou sem suporte a hardlink
+        shutil.copy2(src, dst)
+
+def validate_cpfs_batch(cpfs):
+    """
+    Valida uma lista de CPFs de uma vez (CPFValidator.validate_cpf_batch, do processador)
+    Returns: (lista de CPFs limpos, lista de booleanos de validade)
+    """
+    # Mesma limpeza da rota /validate_cpf (o clean_cpf do processador aproveita
+    # 11 dígitos de entradas mais longas, ex.: 200~262106898/76)
+    cleaned = [CPFValidator.clean_cpf(str(cpf)) for cpf in cpfs]
+    return cleaned, CPFValidator.validate_cpf_batch(cleaned).tolist()
+
 def sanitize_result(result):
     """Sanitiza o resultado removendo informações sensíveis para exibição"""
     if not result or not isinstance(result, dict):
@@ -95,20 +170,24 @@ def upload_file():
         # Gerar nome único para o arquivo
         unique_id = str(uuid.uuid4())
         filename = secure_filename(file.filename)
-        file_path = os.path.join(UPLOAD_FOLDER, f"{unique_id}_{filename}")
         
-        # Salvar arquivo
-        file.save(file_path)
-        logger.info(f"Arquivo salvo: {file_path}")
-        
-        # Processar documento REAL com versão melhorada
-        processor = DocumentProcessor(region='us-east-1')  # Usar região us-east-1 para Textract
-        output_dir = os.path.join(OUTPUT_FOLDER, unique_id)
-        os.makedirs(output_dir, exist_ok=True)
-        
-        logger.info(f"Iniciando processamento melhorado do documento: {filename}")
-        result = processor.process_document(file_path, output_dir)
-        logger.info(f"Resultado do processamento: {result}")
+        # Salvar arquivo em um temporário removido automaticamente ao final
+        with tempfile.NamedTemporaryFile(suffix='.pdf', prefix=f"{unique_id}_", dir=UPLOAD_FOLDER) as tmp:
+            shutil.copyfileobj(file.stream, tmp, length=UPLOAD_COPY_BUFFER)
+            tmp.flush()
+            file_path = tmp.name
+            logger.info(f"Arquivo salvo: {file_path}")
+            
+            # Processar documento REAL com versão melhorada
+            processor = get_processor()
+            output_dir = os.path.join(OUTPUT_FOLDER, unique_id)
+            os.makedirs(output_dir, exist_ok=True)
+            
+            logger.info(f"Iniciando processamento melhorado do documento: {filename}")
+            # Roda na própria thread da requisição: o timeout do Gunicorn
+            # (gunicorn.conf.py) derruba um worker travado
+            result = processor.process_document(file_path, output_dir)
+            logger.info(f"Resultado do processamento: {result}")
         
         # Sanitizar resultado para exibição
         display_result = sanitize_result(result)
@@ -127,11 +206,10 @@ def upload_file():
             photo_path = os.path.join(output_dir, photo_filename)
             
             if result['foto_extraida'] != photo_path:
-                import shutil
                 try:
-                    shutil.copy2(result['foto_extraida'], photo_path)
+                    link_or_copy(result['foto_extraida'], photo_path)
                     display_result['foto_url'] = f"/download_photo/{unique_id}/{photo_filename}"
-                    logger.info(f"Foto copiada para: {photo_path}")
+                    logger.info(f"Foto disponibilizada em: {photo_path}")
                 except Exception as e:
                     logger.error(f"Erro ao copiar foto: {e}")
             else:
@@ -144,12 +222,6 @@ def upload_file():
         else:
             display_result['has_structured_data'] = False
         
-        # Limpar arquivo original após processamento
-        try:
-            os.remove(file_path)
-        except Exception as e:
-            logger.warning(f"Erro ao remover arquivo original: {e}")
-        
         logger.info(f"Processamento melhorado concluído para {filename}")
         return jsonify(display_result)
         
@@ -169,11 +241,15 @@ def upload_file():
 def download_photo(upload_id, filename):
     """Endpoint para download de fotos extraídas"""
     try:
-        file_path = os.path.join(OUTPUT_FOLDER, upload_id, filename)
-        if os.path.exists(file_path):
-            return send_file(file_path, as_attachment=False)
-        else:
-            return jsonify({'error': 'Foto não encontrada'}), 404
+        # upload_id é um UUID, então a URL pode ser cacheada por bastante tempo;
+        # conditional=True responde 304 com base em ETag/Last-Modified
+        response = send_from_directory(os.path.join(OUTPUT_FOLDER, secure_filename(upload_id)), filename,
+                                       as_attachment=False, conditional=True, max_age=PHOTO_CACHE_MAX_AGE)
+        response.cache_control.public = True
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        return response
+    except NotFound:
+        return jsonify({'error': 'Foto não encontrada'}), 404
     except Exception as e:
         logger.error(f"Erro no download da foto: {str(e)}")
         return jsonify({'error': 'Erro no download da foto'}), 500
@@ -184,13 +260,7 @@ def health_check():
     processor_status = "available" if DocumentProcessor is not None else "unavailable"
     
     # Verificar se as credenciais AWS estão configuradas
-    aws_status = "unknown"
-    try:
-        import boto3
-        client = boto3.client('textract', region_name='us-east-1')
-        aws_status = "configured"
-    except Exception as e:
-        aws_status = f"error: {str(e)}"
+    aws_status = _probe_aws()
     
     return jsonify({
         'status': 'healthy', 
@@ -208,11 +278,12 @@ def test_processor():
             return jsonify({'error': 'DocumentProcessor não disponível'})
         
         # Testar importação e inicialização
-        processor = DocumentProcessor(region='us-east-1')
+        processor = get_processor()
         
-        # Testar inicialização do Textract
+        # Testar inicialização do Textract (reaproveita o cliente já criado)
         try:
-            processor.initialize_textract()
+            if processor.textract_client is None:
+                processor.initialize_textract()
             textract_status = "initialized"
         except Exception as e:
             textract_status = f"error: {str(e)}"
@@ -250,8 +321,8 @@ def validate_cpf():
         if CPFValidator is None:
             return jsonify({'error': 'Validador de CPF não disponível'}), 500
         
-        is_valid = CPFValidator.validate_cpf(cpf)
         clean_cpf = CPFValidator.clean_cpf(cpf)
+        is_valid = CPFValidator.validate_cpf(clean_cpf)
         
         return jsonify({
             'cpf': cpf,
@@ -263,6 +334,34 @@ def validate_cpf():
     except Exception as e:
         return jsonify({'error': f'Erro na validação: {str(e)}'}), 500
 
+@app.route('/validate_cpfs', methods=['POST'])
+def validate_cpfs():
+    """Endpoint para validar vários CPFs em uma única requisição"""
+    try:
+        data = request.get_json()
+        cpfs = data.get('cpfs') if data else None
+        
+        if not cpfs or not isinstance(cpfs, list):
+            return jsonify({'error': 'Lista de CPFs não fornecida'}), 400
+        
+        if len(cpfs) > MAX_BATCH_CPFS:
+            return jsonify({'error': f'Máximo de {MAX_BATCH_CPFS} CPFs por requisição'}), 400
+        
+        if CPFValidator is None:
+            return jsonify({'error': 'Validador de CPF não disponível'}), 500
+        
+        clean_cpfs, valid = validate_cpfs_batch(cpfs)
+        
+        return jsonify({
+            'cpfs_limpos': clean_cpfs,
+            'validos': valid,
+            'total': len(valid),
+            'total_validos': sum(valid)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro na validação: {str(e)}'}), 500
+
 @app.errorhandler(413)
 def too_large(e):
     return jsonify({'error': 'Arquivo muito grande. Tamanho máximo: 20MB'}), 413
@@ -272,5 +371,6 @@ def internal_error(e):
     return jsonify({'error': 'Erro interno do servidor'}), 500
 
 if __name__ == '__main__':
-    # Configuração para desenvolvimento
-    app.run(debug=False, host='0.0.0.0', port=5000)
+    # Servidor de desenvolvimento; em produção use:
+    #   gunicorn -c gunicorn.conf.py app_improved:app
+    app.run(host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', 5000)))
@@ -8,12 +8,19 @@ import os
 import sys
 import json
 import uuid
+import shutil
+import tempfile
+import threading
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_from_directory, flash, redirect, url_for
 from werkzeug.utils import secure_filename
-from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.exceptions import RequestEntityTooLarge, NotFound
 import logging
 
+# Cada worker do Gunicorn já roda em paralelo: limita as threads internas
+# do OpenCV/OpenMP para não sobrecarregar a CPU
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
 # Adicionar o diretório atual ao path para importar o processador
 sys.path.append('/opt/document-processor')
 
@@ -23,6 +30,13 @@ except ImportError as e:
     logging.error(f"Erro ao importar DocumentProcessor: {e}")
     DocumentProcessor = None
 
+try:
+    import cv2
+    cv2.setNumThreads(1)
+    cv2.ocl.setUseOpenCL(False)
+except ImportError:
+    pass
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
@@ -31,6 +45,8 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 UPLOAD_FOLDER = '/opt/document-processor/uploads'
 OUTPUT_FOLDER = '/opt/document-processor/output'
 ALLOWED_EXTENSIONS = {'pdf'}
+UPLOAD_COPY_BUFFER = 1024 * 1024  # 1MB por leitura ao copiar o upload
+PHOTO_CACHE_MAX_AGE = 3600  # segundos de cache das fotos extraídas
 
 # Criar diretórios se não existirem
 for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER]:
@@ -40,10 +56,31 @@ for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER]:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Processador compartilhado entre as requisições
+_PROCESSOR = None
+_PROCESSOR_LOCK = threading.Lock()
+
+def get_processor():
+    """Retorna a instância única do DocumentProcessor, criando-a na primeira chamada"""
+    global _PROCESSOR
+    if _PROCESSOR is None:
+        with _PROCESSOR_LOCK:
+            if _PROCESSOR is None:
+                _PROCESSOR = DocumentProcessor()
+    return _PROCESSOR
+
 def allowed_file(filename):
     """Verifica se o arquivo tem extensão permitida"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def link_or_copy(src, dst):
+    """Cria um hardlink de src em dst, copiando apenas se o link não for possível"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Sistemas de arquivos diferentes ou sem suporte a hardlink
+        shutil.copy2(src, dst)
+
 def sanitize_result(result):
     """Sanitiza o resultado removendo informações sensíveis para exibição"""
     if not result or not isinstance(result, dict):
@@ -90,20 +127,24 @@ def upload_file():
         # Gerar nome único para o arquivo
         unique_id = str(uuid.uuid4())
         filename = secure_filename(file.filename)
-        file_path = os.path.join(UPLOAD_FOLDER, f"{unique_id}_{filename}")
-        
-        # Salvar arquivo
-        file.save(file_path)
-        logger.info(f"Arquivo salvo: {file_path}")
-        
-        # Processar documento REAL
-        processor = DocumentProcessor()
-        output_dir = os.path.join(OUTPUT_FOLDER, unique_id)
-        os.makedirs(output_dir, exist_ok=True)
         
-        logger.info(f"Iniciando processamento real do documento: {filename}")
-        result = processor.process_document(file_path, output_dir)
-        logger.info(f"Resultado do processamento: {result}")
+        # Salvar arquivo em um temporário removido automaticamente ao final
+        with tempfile.NamedTemporaryFile(suffix='.pdf', prefix=f"{unique_id}_", dir=UPLOAD_FOLDER) as tmp:
+            shutil.copyfileobj(file.stream, tmp, length=UPLOAD_COPY_BUFFER)
+            tmp.flush()
+            file_path = tmp.name
+            logger.info(f"Arquivo salvo: {file_path}")
+            
+            # Processar documento REAL
+            processor = get_processor()
+            output_dir = os.path.join(OUTPUT_FOLDER, unique_id)
+            os.makedirs(output_dir, exist_ok=True)
+            
+            logger.info(f"Iniciando processamento real do documento: {filename}")
+            # Roda na própria thread da requisição: o timeout do Gunicorn
+            # (gunicorn.conf.py) derruba um worker travado
+            result = processor.process_document(file_path, output_dir)
+            logger.info(f"Resultado do processamento: {result}")
         
         # Sanitizar resultado para exibição
         display_result = sanitize_result(result)
@@ -121,22 +162,15 @@ def upload_file():
             photo_path = os.path.join(output_dir, photo_filename)
             
             if result['foto_extraida'] != photo_path:
-                import shutil
                 try:
-                    shutil.copy2(result['foto_extraida'], photo_path)
+                    link_or_copy(result['foto_extraida'], photo_path)
                     display_result['foto_url'] = f"/download_photo/{unique_id}/{photo_filename}"
-                    logger.info(f"Foto copiada para: {photo_path}")
+                    logger.info(f"Foto disponibilizada em: {photo_path}")
                 except Exception as e:
                     logger.error(f"Erro ao copiar foto: {e}")
             else:
                 display_result['foto_url'] = f"/download_photo/{unique_id}/{photo_filename}"
         
-        # Limpar arquivo original após processamento
-        try:
-            os.remove(file_path)
-        except Exception as e:
-            logger.warning(f"Erro ao remover arquivo original: {e}")
-        
         logger.info(f"Processamento real concluído para {filename}")
         return jsonify(display_result)
         
@@ -150,11 +184,15 @@ def upload_file():
 def download_photo(upload_id, filename):
     """Endpoint para download de fotos extraídas"""
     try:
-        file_path = os.path.join(OUTPUT_FOLDER, upload_id, filename)
-        if os.path.exists(file_path):
-            return send_file(file_path, as_attachment=False)
-        else:
-            return jsonify({'error': 'Foto não encontrada'}), 404
+        # upload_id é um UUID, então a URL pode ser cacheada por bastante tempo;
+        # conditional=True responde 304 com base em ETag/Last-Modified
+        response = send_from_directory(os.path.join(OUTPUT_FOLDER, secure_filename(upload_id)), filename,
+                                       as_attachment=False, conditional=True, max_age=PHOTO_CACHE_MAX_AGE)
+        response.cache_control.public = True
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        return response
+    except NotFound:
+        return jsonify({'error': 'Foto não encontrada'}), 404
     except Exception as e:
         logger.error(f"Erro no download da foto: {str(e)}")
         return jsonify({'error': 'Erro no download da foto'}), 500
@@ -177,7 +215,7 @@ def test_processor():
             return jsonify({'error': 'DocumentProcessor não disponível'})
         
         # Testar importação e inicialização
-        processor = DocumentProcessor()
+        processor = get_processor()
         return jsonify({
             'status': 'success',
             'message': 'Processador inicializado com sucesso',
@@ -198,5 +236,6 @@ def internal_error(e):
     return jsonify({'error': 'Erro interno do servidor'}), 500
 
 if __name__ == '__main__':
-    # Configuração para desenvolvimento
-    app.run(debug=False, host='0.0.0.0', port=5000)
+    # Servidor de desenvolvimento; em produção use:
+    #   gunicorn -c gunicorn.conf.py app_real:app
+    app.run(host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', 5000)))
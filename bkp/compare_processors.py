@@ -7,43 +7,120 @@ e a nova versão com AWS Textract
 import sys
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import fitz  # PyMuPDF
 from document_processor import DocumentProcessor  # Versão original
-from document_processor_textract import DocumentProcessorTextract  # Nova versão
+from document_processor_textract import CPFValidator, DocumentProcessorTextract  # Nova versão
 
-def compare_processors(pdf_path):
+# Uma página com pelo menos esta quantidade de caracteres embutidos e sem
+# imagens cobrindo mais que MAX_IMAGE_COVERAGE da área não precisa de OCR
+MIN_TEXT_CHARS = 50
+MAX_IMAGE_COVERAGE = 0.5
+
+@lru_cache(maxsize=None)
+def _get_processor(processor_class):
     """
-    Compara os resultados dos dois processadores
+    Instancia cada processador uma única vez (Tesseract/cliente Textract)
+    e o reaproveita entre os PDFs comparados
     """
-    print(f"Comparando processadores para: {pdf_path}")
-    print("=" * 60)
+    return processor_class()
+
+def _page_needs_ocr(page) -> bool:
+    """
+    Classifica a página: False quando já existe uma camada de texto
+    suficiente e nenhuma imagem ocupa a maior parte da página
+    """
+    if len(page.get_text().strip()) < MIN_TEXT_CHARS:
+        return True
     
-    # Processar com versão original (Tesseract)
-    print("Processando com Tesseract...")
+    page_area = abs(page.rect)
+    for img in page.get_images():
+        try:
+            bbox = page.get_image_bbox(img) & page.rect
+        except Exception:
+            continue
+        if abs(bbox) > MAX_IMAGE_COVERAGE * page_area:
+            return True
+    
+    return False
+
+def _classify_document(pdf_path):
+    """
+    Returns: (número de páginas, True se alguma página precisar de OCR)
+    """
+    try:
+        with fitz.open(pdf_path) as doc:
+            return len(doc), any(_page_needs_ocr(page) for page in doc)
+    except Exception:
+        return 0, True
+
+def _run_text_layer(pdf_path):
+    """
+    Extrai as informações direto da camada de texto do PDF, sem chamar o Textract
+    Returns: (resultado, tempo em segundos, sucesso)
+    """
     start_time = time.time()
     try:
-        processor_old = DocumentProcessor()
-        result_old = processor_old.process_document(pdf_path)
-        time_old = time.time() - start_time
-        success_old = result_old.get('sucesso', False)
+        processor = _get_processor(DocumentProcessorTextract)
+        with fitz.open(pdf_path) as doc:
+            text = "\n".join(page.get_text() for page in doc)
+        
+        info = processor.extract_information_from_text(text)
+        result = {
+            'tipo_documento': processor.identify_document_type(text),
+            'nome': info['nome'],
+            'cpf': info['cpf'],
+            'rg': info['rg'],
+            'cpf_valido': CPFValidator.validate_cpf(info['cpf']) if info['cpf'] else False,
+            'texto_completo': text,
+            'modo': 'texto embutido',
+            'sucesso': True
+        }
+        return result, time.time() - start_time, True
     except Exception as e:
-        print(f"Erro no processador Tesseract: {e}")
-        result_old = {'erro': str(e), 'sucesso': False}
-        time_old = time.time() - start_time
-        success_old = False
-    
-    # Processar com Textract
-    print("Processando com AWS Textract...")
+        print(f"Erro ao ler a camada de texto: {e}")
+        return {'erro': str(e), 'sucesso': False}, time.time() - start_time, False
+
+def _run_processor(processor_class, pdf_path, label, method="process_document"):
+    """
+    Executa um processador e mede o tempo
+    Returns: (resultado, tempo em segundos, sucesso)
+    """
     start_time = time.time()
     try:
-        processor_new = DocumentProcessorTextract()
-        result_new = processor_new.process_document(pdf_path)
-        time_new = time.time() - start_time
-        success_new = result_new.get('sucesso', False)
+        processor = _get_processor(processor_class)
+        result = getattr(processor, method)(pdf_path)
+        return result, time.time() - start_time, result.get('sucesso', False)
     except Exception as e:
-        print(f"Erro no processador Textract: {e}")
-        result_new = {'erro': str(e), 'sucesso': False}
-        time_new = time.time() - start_time
-        success_new = False
+        print(f"Erro no processador {label}: {e}")
+        return {'erro': str(e), 'sucesso': False}, time.time() - start_time, False
+
+def compare_processors(pdf_path):
+    """
+    Compara os resultados dos dois processadores
+    """
+    print(f"Comparando processadores para: {pdf_path}")
+    print("=" * 60)
+    
+    # Processa com as duas versões ao mesmo tempo: o Tesseract roda em um
+    # subprocesso e o Textract espera pela rede, então as threads não competem pelo GIL
+    print("Processando com Tesseract e AWS Textract em paralelo...")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        future_old = executor.submit(_run_processor, DocumentProcessor, pdf_path, "Tesseract")
+        # PDFs gerados digitalmente já têm o texto: dispensa a chamada ao Textract
+        num_pages, needs_ocr = _classify_document(pdf_path)
+        if needs_ocr:
+            # Várias páginas: um único job assíncrono em vez de uma chamada por página
+            method = "process_document_async" if num_pages > 1 else "process_document"
+            future_new = executor.submit(_run_processor, DocumentProcessorTextract, pdf_path, "Textract", method)
+        else:
+            print("Todas as páginas têm camada de texto: Textract dispensado")
+            future_new = executor.submit(_run_text_layer, pdf_path)
+        
+        result_old, time_old, success_old = future_old.result()
+        result_new, time_new, success_new = future_new.result()
+        result_new.setdefault('modo', 'textract')
     
     # Comparar resultados
     print("\n" + "=" * 60)
@@ -61,6 +138,9 @@ def compare_processors(pdf_path):
     # Tempo de processamento
     print(f"{'Tempo (s)':<20} {time_old:.2f}s{'':<18} {time_new:.2f}s{'':<18}")
     
+    # Modo usado na coluna Textract (OCR ou camada de texto do PDF)
+    print(f"{'Modo':<20} {'tesseract':<25} {result_new['modo']:<25}")
+    
     if success_old and success_new:
         # Comparar campos específicos
         fields = ['tipo_documento', 'nome', 'cpf', 'cpf_valido']
@@ -122,17 +202,19 @@ def compare_processors(pdf_path):
         print("• Tempos de processamento similares")
 
 def main():
-    if len(sys.argv) != 2:
-        print("Uso: python compare_processors.py <caminho_do_pdf>")
+    if len(sys.argv) < 2:
+        print("Uso: python compare_processors.py <caminho_do_pdf> [<caminho_do_pdf> ...]")
         sys.exit(1)
     
-    pdf_path = sys.argv[1]
+    pdf_paths = sys.argv[1:]
     
-    if not os.path.exists(pdf_path):
-        print(f"Erro: Arquivo não encontrado: {pdf_path}")
-        sys.exit(1)
+    for pdf_path in pdf_paths:
+        if not os.path.exists(pdf_path):
+            print(f"Erro: Arquivo não encontrado: {pdf_path}")
+            sys.exit(1)
     
-    compare_processors(pdf_path)
+    for pdf_path in pdf_paths:
+        compare_processors(pdf_path)
 
 if __name__ == "__main__":
     main()
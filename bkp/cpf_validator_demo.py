@@ -1,10 +1,106 @@
 #!/usr/bin/env python3
 """
 Demonstração do validador de CPF
-Este script funciona sem dependências externas
+Este script funciona sem dependências externas; com numpy a validação em lote
+(validate_many) é vetorizada, e com numba ela é compilada com JIT
 """
 
 import re
+from operator import mul
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Pesos dos dígitos verificadores; como os dígitos são lidos como bytes ASCII,
+# o deslocamento de ord('0') em cada posição é descontado de uma vez só
+_W1 = (10, 9, 8, 7, 6, 5, 4, 3, 2)
+_W2 = (11, 10, 9, 8, 7, 6, 5, 4, 3, 2)
+_W1_OFFSET = ord('0') * sum(_W1)
+_W2_OFFSET = ord('0') * sum(_W2)
+
+# Tabela de remoção com todos os bytes que não são dígitos ASCII
+_NON_DIGIT_BYTES = bytes(b for b in range(256) if not ord('0') <= b <= ord('9'))
+
+# Fallback para entradas com caracteres fora do ASCII
+_NON_DIGIT_RE = re.compile(r'[^0-9]')
+
+if np is not None:
+    # Pesos como vetores float32: a soma ponderada vira um produto matriz-vetor
+    # (BLAS); os valores máximos (9 * 65) são exatos em float32
+    _W1_VEC = np.array(_W1, dtype=np.float32)
+    _W2_VEC = np.array(_W2, dtype=np.float32)
+    
+    def cpfs_to_digit_matrix(cpfs) -> "np.ndarray":
+        """
+        Converte uma lista de CPFs em uma matriz (N, 11) uint8 de dígitos
+        (layout contíguo, uma linha por CPF). Entradas sem 11 dígitos viram
+        uma linha de zeros, que a validação rejeita (todos os dígitos iguais).
+        """
+        cleaned = (CPFValidator.clean_cpf(cpf) for cpf in cpfs)
+        joined = ''.join(cpf if len(cpf) == 11 else '00000000000' for cpf in cleaned)
+        digits = np.frombuffer(joined.encode('ascii'), dtype=np.uint8).reshape(-1, 11)
+        return digits - ord('0')
+    
+    def _validate_digit_matrix_numpy(digits):
+        """Valida uma matriz (N, 11) de dígitos com operações vetorizadas"""
+        d = digits.astype(np.float32)
+        sum1 = (d[:, :9] @ _W1_VEC).astype(np.int64)
+        sum2 = (d[:, :10] @ _W2_VEC).astype(np.int64)
+        
+        # 11 - (soma % 11), com 10 virando 0: seleção vetorizada (blend) em vez
+        # de uma segunda divisão inteira
+        rest1 = (-sum1) % 11
+        rest2 = (-sum2) % 11
+        digit1 = np.where(rest1 < 10, rest1, 0)
+        digit2 = np.where(rest2 < 10, rest2, 0)
+        
+        all_equal = (digits == digits[:, :1]).all(axis=1)
+        return (digits[:, 9] == digit1) & (digits[:, 10] == digit2) & ~all_equal
+else:
+    cpfs_to_digit_matrix = None
+    _validate_digit_matrix_numpy = None
+
+if np is not None and njit is not None:
+    @njit(cache=True)
+    def _validate_digits(d):
+        """Valida um CPF já convertido em 11 dígitos (uint8)"""
+        all_equal = True
+        for i in range(1, 11):
+            if d[i] != d[0]:
+                all_equal = False
+                break
+        if all_equal:
+            return False
+        
+        s1 = 0
+        s2 = 0
+        for i in range(9):
+            s1 += d[i] * (10 - i)
+            s2 += d[i] * (11 - i)
+        s2 += d[9] * 2
+        
+        return d[9] == (-s1) % 11 % 10 and d[10] == (-s2) % 11 % 10
+    
+    @njit(cache=True, parallel=True)
+    def _validate_digit_matrix(digits):
+        """Valida uma matriz (N, 11) de dígitos em paralelo"""
+        n = digits.shape[0]
+        out = np.zeros(n, dtype=np.bool_)
+        for i in prange(n):
+            out[i] = _validate_digits(digits[i])
+        return out
+    
+    # Compila (ou carrega do cache) já na importação
+    _validate_digit_matrix(np.zeros((1, 11), dtype=np.uint8))
+else:
+    _validate_digit_matrix = None
 
 class CPFValidator:
     """Classe para validação de CPF"""
@@ -12,7 +108,13 @@ class CPFValidator:
     @staticmethod
     def clean_cpf(cpf: str) -> str:
         """Remove caracteres não numéricos do CPF"""
-        return re.sub(r'[^0-9]', '', cpf)
+        if cpf.isascii():
+            # Caso comum de entrada já limpa
+            if cpf.isdigit():
+                return cpf
+            # Uma única passada em C removendo os bytes não numéricos
+            return cpf.encode('ascii').translate(None, _NON_DIGIT_BYTES).decode('ascii')
+        return _NON_DIGIT_RE.sub('', cpf)
     
     @staticmethod
     def validate_cpf(cpf: str) -> bool:
@@ -30,20 +132,35 @@ class CPFValidator:
         if cpf == cpf[0] * 11:
             return False
         
-        # Calcula primeiro dígito verificador
-        sum1 = sum(int(cpf[i]) * (10 - i) for i in range(9))
-        digit1 = 11 - (sum1 % 11)
-        if digit1 >= 10:
-            digit1 = 0
+        # Produto escalar dos dígitos (bytes ASCII) com os pesos, sem int() por dígito
+        digits = cpf.encode('ascii')
+        sum1 = sum(map(mul, digits, _W1)) - _W1_OFFSET
+        sum2 = sum(map(mul, digits, _W2)) - _W2_OFFSET
         
-        # Calcula segundo dígito verificador
-        sum2 = sum(int(cpf[i]) * (11 - i) for i in range(10))
-        digit2 = 11 - (sum2 % 11)
-        if digit2 >= 10:
-            digit2 = 0
+        # 11 - (soma % 11), com 10 e 11 virando 0
+        digit1 = (-sum1) % 11 % 10
+        digit2 = (-sum2) % 11 % 10
         
         # Verifica se os dígitos calculados conferem
-        return cpf[9] == str(digit1) and cpf[10] == str(digit2)
+        return digits[9] - 48 == digit1 and digits[10] - 48 == digit2
+    
+    @staticmethod
+    def validate_many(cpfs) -> list:
+        """
+        Valida uma lista de CPFs de uma vez
+        Returns: lista de booleanos na mesma ordem da entrada
+        """
+        if np is None:
+            return [CPFValidator.validate_cpf(cpf) for cpf in cpfs]
+        
+        cpfs = list(cpfs)
+        if not cpfs:
+            return []
+        
+        digits = cpfs_to_digit_matrix(cpfs)
+        if _validate_digit_matrix is not None:
+            return _validate_digit_matrix(digits).tolist()
+        return _validate_digit_matrix_numpy(digits).tolist()
 
 def main():
     print("=== DEMONSTRAÇÃO DO VALIDADOR DE CPF ===\n")
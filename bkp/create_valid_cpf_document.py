@@ -5,12 +5,16 @@ Cria um documento PDF de teste com CPF válido
 
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
+from multiprocessing import Pool
 import os
 
-def create_test_document():
-    """Cria documento de teste com CPF válido"""
-    
-    filename = "documento_cpf_valido.pdf"
+def _make_one(params):
+    """
+    Cria um PDF de teste a partir de um dicionário de parâmetros
+    (filename, titulo, nome, cpf, rg, nascimento, orgao). Função de nível
+    de módulo para poder ser usada em um multiprocessing.Pool.
+    """
+    filename = params["filename"]
     
     # Criar PDF
     c = canvas.Canvas(filename, pagesize=A4)
@@ -18,76 +22,58 @@ def create_test_document():
     
     # Título
     c.setFont("Helvetica-Bold", 16)
-    c.drawString(100, height - 100, "REGISTRO GERAL")
+    c.drawString(100, height - 100, params["titulo"])
     
     # Informações
     c.setFont("Helvetica", 12)
     y_pos = height - 150
     
-    # Nome
-    c.drawString(100, y_pos, "Nome: JOÃO DA SILVA SANTOS")
-    y_pos -= 30
-    
-    # CPF válido (111.444.777-35)
-    c.drawString(100, y_pos, "CPF 111.444.777-35")
-    y_pos -= 30
-    
-    # RG
-    c.drawString(100, y_pos, "RG: 12.345.678-9")
-    y_pos -= 30
+    lines = [
+        f"Nome: {params['nome']}",
+        params["cpf"],  # Linha completa, para testar variações do rótulo
+        f"RG: {params['rg']}",
+        f"Data de Nascimento: {params['nascimento']}",
+        f"Órgão Expedidor: {params['orgao']}",
+    ]
     
-    # Data de nascimento
-    c.drawString(100, y_pos, "Data de Nascimento: 01/01/1990")
-    y_pos -= 30
-    
-    # Órgão expedidor
-    c.drawString(100, y_pos, "Órgão Expedidor: SSP/SP")
+    for line in lines:
+        c.drawString(100, y_pos, line)
+        y_pos -= 30
     
     c.save()
     print(f"Documento criado: {filename}")
     
     return filename
 
+# CPF válido (111.444.777-35) sem dois pontos
+TEST_DOCUMENT = {
+    "filename": "documento_cpf_valido.pdf",
+    "titulo": "REGISTRO GERAL",
+    "nome": "JOÃO DA SILVA SANTOS",
+    "cpf": "CPF 111.444.777-35",
+    "rg": "12.345.678-9",
+    "nascimento": "01/01/1990",
+    "orgao": "SSP/SP",
+}
+
+# CPF válido com dois pontos
+TEST_DOCUMENT_WITH_COLON = {
+    "filename": "documento_cpf_valido_colon.pdf",
+    "titulo": "CARTEIRA DE IDENTIDADE",
+    "nome": "MARIA SILVA SANTOS",
+    "cpf": "CPF: 111.444.777-35",
+    "rg": "98.765.432-1",
+    "nascimento": "15/05/1985",
+    "orgao": "SSP/RJ",
+}
+
+def create_test_document():
+    """Cria documento de teste com CPF válido"""
+    return _make_one(TEST_DOCUMENT)
+
 def create_test_document_with_colon():
     """Cria documento de teste com CPF válido usando dois pontos"""
-    
-    filename = "documento_cpf_valido_colon.pdf"
-    
-    # Criar PDF
-    c = canvas.Canvas(filename, pagesize=A4)
-    width, height = A4
-    
-    # Título
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(100, height - 100, "CARTEIRA DE IDENTIDADE")
-    
-    # Informações
-    c.setFont("Helvetica", 12)
-    y_pos = height - 150
-    
-    # Nome
-    c.drawString(100, y_pos, "Nome: MARIA SILVA SANTOS")
-    y_pos -= 30
-    
-    # CPF válido com dois pontos
-    c.drawString(100, y_pos, "CPF: 111.444.777-35")
-    y_pos -= 30
-    
-    # RG
-    c.drawString(100, y_pos, "RG: 98.765.432-1")
-    y_pos -= 30
-    
-    # Data de nascimento
-    c.drawString(100, y_pos, "Data de Nascimento: 15/05/1985")
-    y_pos -= 30
-    
-    # Órgão expedidor
-    c.drawString(100, y_pos, "Órgão Expedidor: SSP/RJ")
-    
-    c.save()
-    print(f"Documento criado: {filename}")
-    
-    return filename
+    return _make_one(TEST_DOCUMENT_WITH_COLON)
 
 if __name__ == "__main__":
     # Instalar reportlab se necessário
@@ -98,8 +84,10 @@ if __name__ == "__main__":
         os.system("pip3 install reportlab")
         from reportlab.pdfgen import canvas
     
-    doc1 = create_test_document()
-    doc2 = create_test_document_with_colon()
+    # Documentos independentes: gera em paralelo
+    params = [TEST_DOCUMENT, TEST_DOCUMENT_WITH_COLON]
+    with Pool(min(os.cpu_count() or 1, len(params))) as pool:
+        doc1, doc2 = pool.map(_make_one, params)
     
     print(f"\nDocumentos criados:")
     print(f"1. {doc1} - CPF sem dois pontos")
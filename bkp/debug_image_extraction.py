@@ -8,6 +8,99 @@ import cv2
 import numpy as np
 import os
 import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from debug_io import BackgroundWriter, pixmap_to_cv
+
+# A detecção roda com a imagem reduzida para no máximo este lado; rostos de
+# documento continuam bem acima do tamanho mínimo da janela do Haar
+DETECTION_MAX_SIDE = 800
+
+# Imagens menores que isso ou mais largas que 3:1 não podem conter uma foto
+MIN_FACE_IMAGE_SIDE = 64
+MAX_FACE_IMAGE_ASPECT = 3.0
+
+# Detector YuNet quantizado (int8); sem o modelo, cai no Haar cascade
+YUNET_MODEL = os.environ.get(
+    'YUNET_MODEL',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'face_detection_yunet_2023mar_int8.onnx')
+)
+YUNET_SCORE_THRESHOLD = 0.6
+USE_YUNET = hasattr(cv2, 'FaceDetectorYN') and os.path.exists(YUNET_MODEL)
+
+_thread_local = threading.local()
+
+def _get_yunet():
+    """Carrega o YuNet uma vez por thread (setInputSize altera o estado do detector)"""
+    detector = getattr(_thread_local, "yunet", None)
+    if detector is None:
+        detector = cv2.FaceDetectorYN.create(YUNET_MODEL, "", (320, 320), YUNET_SCORE_THRESHOLD)
+        _thread_local.yunet = detector
+    return detector
+
+def _get_face_cascade():
+    """Carrega o Haar cascade uma vez por thread (o classificador não é thread-safe)"""
+    cascade = getattr(_thread_local, "face_cascade", None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        _thread_local.face_cascade = cascade
+    return cascade
+
+def detect_faces(img_cv):
+    """
+    Detecta faces com YuNet (BGR, uma passada) ou Haar (escala de cinza), na
+    imagem reduzida para DETECTION_MAX_SIDE
+    Returns: array (N, 4) de x, y, w, h na resolução original
+    """
+    scale = min(1.0, DETECTION_MAX_SIDE / max(img_cv.shape[:2]))
+    small = img_cv
+    if scale < 1.0:
+        small = cv2.resize(img_cv, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    
+    if USE_YUNET:
+        if small.ndim == 2:
+            small = cv2.cvtColor(small, cv2.COLOR_GRAY2BGR)
+        detector = _get_yunet()
+        detector.setInputSize((small.shape[1], small.shape[0]))
+        _, detections = detector.detect(small)
+        faces = np.empty((0, 4)) if detections is None else detections[:, :4]
+    else:
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        min_size = (20, 20) if scale < 1.0 else (30, 30)
+        faces = _get_face_cascade().detectMultiScale(gray, 1.2, 4, minSize=min_size)
+    
+    # Volta as coordenadas para a resolução original
+    return (np.asarray(faces, dtype=np.float32).reshape(-1, 4) / scale).astype(int)
+
+def needs_face_detection(width, height):
+    """Filtro barato por tamanho/proporção antes de decodificar e rodar o detector"""
+    if width < MIN_FACE_IMAGE_SIDE or height < MIN_FACE_IMAGE_SIDE:
+        return False
+    return width / height <= MAX_FACE_IMAGE_ASPECT
+
+def _process_one(page_num, img_index, img_cv, writer):
+    """Procura faces em uma imagem (executado no pool de threads)
+
+    Retorna as linhas de log e o número de imagens extraídas.
+    """
+    lines = []
+    lines.append(f"      OpenCV shape: {img_cv.shape}")
+    
+    # Tenta detectar faces
+    faces = detect_faces(img_cv)
+    lines.append(f"      Faces detectadas: {len(faces)}")
+    
+    if len(faces) > 0:
+        lines.append(f"      Coordenadas das faces: {faces}")
+        # Salva imagem com faces marcadas
+        img_with_faces = img_cv.copy()
+        for (x, y, w, h) in faces:
+            cv2.rectangle(img_with_faces, (x, y), (x+w, y+h), (255, 0, 0), 2)
+        face_output_path = f"debug_faces_p{page_num + 1}_i{img_index}.jpg"
+        writer.write(face_output_path, cv2.imencode('.jpg', img_with_faces)[1].tobytes())
+        lines.append(f"      Imagem com faces marcadas: {face_output_path}")
+    
+    return lines, 1
 
 def debug_image_extraction(pdf_path):
     """Debug da extração de imagens"""
@@ -23,77 +116,77 @@ def debug_image_extraction(pdf_path):
         
         total_images = 0
         
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            image_list = page.get_images()
-            
-            print(f"\nPágina {page_num + 1}:")
-            print(f"  Imagens encontradas: {len(image_list)}")
-            
-            for img_index, img in enumerate(image_list):
-                print(f"  Imagem {img_index + 1}:")
-                print(f"    xref: {img[0]}")
-                print(f"    smask: {img[1]}")
-                print(f"    width: {img[2]}")
-                print(f"    height: {img[3]}")
-                print(f"    bpc: {img[4]}")
-                print(f"    colorspace: {img[5]}")
-                print(f"    alt: {img[6]}")
-                print(f"    name: {img[7]}")
-                print(f"    filter: {img[8]}")
+        # O PyMuPDF não é thread-safe: a leitura dos pixmaps fica na thread
+        # principal e a decodificação/gravação/detecção (OpenCV, libera o GIL)
+        # vai para o pool. A saída é acumulada e impressa na ordem original.
+        output = []
+        with BackgroundWriter() as writer, ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for page_num in range(len(doc)):
+                image_list = doc.get_page_images(page_num)
                 
-                try:
-                    xref = img[0]
-                    pix = fitz.Pixmap(doc, xref)
-                    
-                    print(f"    Pixmap info:")
-                    print(f"      width: {pix.width}")
-                    print(f"      height: {pix.height}")
-                    print(f"      n: {pix.n}")
-                    print(f"      alpha: {pix.alpha}")
-                    print(f"      colorspace: {pix.colorspace}")
+                output.append(f"\nPágina {page_num + 1}:")
+                output.append(f"  Imagens encontradas: {len(image_list)}")
+                
+                for img_index, img in enumerate(image_list):
+                    output.append(f"  Imagem {img_index + 1}:")
+                    output.append(f"    xref: {img[0]}")
+                    output.append(f"    smask: {img[1]}")
+                    output.append(f"    width: {img[2]}")
+                    output.append(f"    height: {img[3]}")
+                    output.append(f"    bpc: {img[4]}")
+                    output.append(f"    colorspace: {img[5]}")
+                    output.append(f"    alt: {img[6]}")
+                    output.append(f"    name: {img[7]}")
+                    output.append(f"    filter: {img[8]}")
                     
-                    if pix.n - pix.alpha < 4:  # GRAY or RGB
-                        img_data = pix.tobytes("png")
-                        img_array = np.frombuffer(img_data, dtype=np.uint8)
-                        img_cv = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+                    try:
+                        xref = img[0]
+                        pix = fitz.Pixmap(doc, xref)
                         
-                        if img_cv is not None:
-                            print(f"      OpenCV shape: {img_cv.shape}")
-                            
-                            # Salva a imagem para inspeção
-                            output_path = f"debug_img_p{page_num + 1}_i{img_index}.jpg"
-                            cv2.imwrite(output_path, img_cv)
-                            print(f"      Imagem salva: {output_path}")
-                            
-                            # Tenta detectar faces
-                            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-                            gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY) if len(img_cv.shape) == 3 else img_cv
-                            faces = face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(30, 30))
-                            print(f"      Faces detectadas: {len(faces)}")
-                            
-                            if len(faces) > 0:
-                                print(f"      Coordenadas das faces: {faces}")
-                                # Salva imagem com faces marcadas
-                                img_with_faces = img_cv.copy()
-                                for (x, y, w, h) in faces:
-                                    cv2.rectangle(img_with_faces, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                                face_output_path = f"debug_faces_p{page_num + 1}_i{img_index}.jpg"
-                                cv2.imwrite(face_output_path, img_with_faces)
-                                print(f"      Imagem com faces marcadas: {face_output_path}")
+                        output.append(f"    Pixmap info:")
+                        output.append(f"      width: {pix.width}")
+                        output.append(f"      height: {pix.height}")
+                        output.append(f"      n: {pix.n}")
+                        output.append(f"      alpha: {pix.alpha}")
+                        output.append(f"      colorspace: {pix.colorspace}")
+                        
+                        if pix.n - pix.alpha < 4:  # GRAY or RGB
+                            # Salva a imagem para inspeção direto do pixmap, sem
+                            # passar por numpy/OpenCV; a gravação fica com a thread de I/O
+                            output_path = f"debug_img_p{page_num + 1}_i{img_index}.png"
+                            writer.write(output_path, pix.tobytes("png"))
+                            output.append(f"      Imagem salva: {output_path}")
                             
-                            total_images += 1
+                            # Só a detecção de faces precisa da imagem decodificada
+                            if needs_face_detection(pix.width, pix.height):
+                                img_cv = pixmap_to_cv(pix)
+                                output.append(executor.submit(_process_one, page_num, img_index, img_cv, writer))
+                            else:
+                                output.append(f"      Detecção de faces pulada: tamanho/proporção incompatível com foto")
+                                total_images += 1
                         else:
-                            print(f"      Erro: Não foi possível decodificar a imagem")
-                    else:
-                        print(f"      Pulando: Colorspace não suportado")
-                    
-                    pix = None
-                    
-                except Exception as e:
-                    print(f"    Erro ao processar imagem: {e}")
+                            output.append(f"      Pulando: Colorspace não suportado")
+                        
+                        pix = None
+                        
+                    except Exception as e:
+                        output.append(f"    Erro ao processar imagem: {e}")
+            
+            doc.close()
+            
+            for item in output:
+                if isinstance(item, Future):
+                    try:
+                        lines, extracted = item.result()
+                    except Exception as e:
+                        print(f"    Erro ao processar imagem: {e}")
+                        continue
+                    for line in lines:
+                        print(line)
+                    total_images += extracted
+                else:
+                    print(item)
         
-        doc.close()
         print(f"\nTotal de imagens extraídas: {total_images}")
         
     except Exception as e:
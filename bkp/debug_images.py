@@ -8,59 +8,95 @@ import cv2
 import numpy as np
 import os
 import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from debug_io import BackgroundWriter, pixmap_to_cv
 from photo_detector_improved import ImprovedPhotoDetector
 
+# Qualidade dos JPEGs de depuração (mesmo valor que o PyMuPDF usaria em tobytes("jpeg"))
+DEBUG_JPEG_OPTS = [cv2.IMWRITE_JPEG_QUALITY, 85]
+
+_thread_local = threading.local()
+
+def _get_detector() -> ImprovedPhotoDetector:
+    """Um detector por thread: os CascadeClassifier não podem ser compartilhados entre threads"""
+    detector = getattr(_thread_local, "detector", None)
+    if detector is None:
+        detector = ImprovedPhotoDetector()
+        _thread_local.detector = detector
+    return detector
+
+def _process_one(page_num: int, img_index: int, img_cv: np.ndarray, writer: BackgroundWriter):
+    """Salva e analisa uma imagem (executado no pool de threads)
+
+    Retorna a própria imagem e as linhas de log.
+    """
+    # Salva a imagem para análise
+    filename = f"debug_img_p{page_num+1}_i{img_index}.jpg"
+    # A imagem já está em memória para a análise: codifica o JPEG direto do
+    # array (sem o PNG intermediário), na thread do pool
+    writer.write(filename, cv2.imencode('.jpg', img_cv, DEBUG_JPEG_OPTS)[1].tobytes())
+    
+    # Analisa a imagem
+    detector = _get_detector()
+    metrics = detector.analyze_image_quality(img_cv)
+    is_signature = detector.is_signature_like(img_cv)
+    is_photo = detector.is_photo_like(img_cv)
+    
+    lines = [
+        f"  Imagem {img_index}:",
+        f"    Arquivo: {filename}",
+        f"    Tamanho: {img_cv.shape[1]}x{img_cv.shape[0]}",
+        f"    É assinatura: {is_signature}",
+        f"    É foto: {is_photo}",
+        f"    Tem face: {metrics.get('has_face', False)}",
+        f"    Tem olhos: {metrics.get('has_eyes', False)}",
+        f"    Densidade: {metrics.get('density', 0):.3f}",
+        f"    Entropia: {metrics.get('entropy', 0):.2f}",
+        f"    Proporção: {metrics.get('aspect_ratio', 0):.2f}",
+    ]
+    return img_cv, lines
+
 def extract_and_analyze_all_images(pdf_path: str):
     """Extrai e analisa todas as imagens do PDF"""
     print(f"Analisando todas as imagens de: {pdf_path}")
     
-    detector = ImprovedPhotoDetector()
+    detector = _get_detector()
     
     try:
         doc = fitz.open(pdf_path)
         all_images = []
         
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            image_list = page.get_images()
-            
-            print(f"\nPágina {page_num + 1}: {len(image_list)} imagens encontradas")
-            
-            for img_index, img in enumerate(image_list):
-                xref = img[0]
-                pix = fitz.Pixmap(doc, xref)
+        # O PyMuPDF não é thread-safe: os pixmaps são lidos na thread principal
+        # e a decodificação/análise (OpenCV, libera o GIL) roda no pool.
+        # A saída é acumulada para manter a ordem das páginas e imagens.
+        output = []
+        with BackgroundWriter() as writer, ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for page_num in range(len(doc)):
+                image_list = doc.get_page_images(page_num)
                 
-                if pix.n - pix.alpha < 4:  # GRAY or RGB
-                    img_data = pix.tobytes("png")
-                    img_array = np.frombuffer(img_data, dtype=np.uint8)
-                    img_cv = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-                    
-                    if img_cv is not None:
-                        all_images.append(img_cv)
-                        
-                        # Salva a imagem para análise
-                        filename = f"debug_img_p{page_num+1}_i{img_index}.jpg"
-                        cv2.imwrite(filename, img_cv)
-                        
-                        # Analisa a imagem
-                        metrics = detector.analyze_image_quality(img_cv)
-                        is_signature = detector.is_signature_like(img_cv)
-                        is_photo = detector.is_photo_like(img_cv)
-                        
-                        print(f"  Imagem {img_index}:")
-                        print(f"    Arquivo: {filename}")
-                        print(f"    Tamanho: {img_cv.shape[1]}x{img_cv.shape[0]}")
-                        print(f"    É assinatura: {is_signature}")
-                        print(f"    É foto: {is_photo}")
-                        print(f"    Tem face: {metrics.get('has_face', False)}")
-                        print(f"    Tem olhos: {metrics.get('has_eyes', False)}")
-                        print(f"    Densidade: {metrics.get('density', 0):.3f}")
-                        print(f"    Entropia: {metrics.get('entropy', 0):.2f}")
-                        print(f"    Proporção: {metrics.get('aspect_ratio', 0):.2f}")
+                output.append(f"\nPágina {page_num + 1}: {len(image_list)} imagens encontradas")
                 
-                pix = None
-        
-        doc.close()
+                for img_index, img in enumerate(image_list):
+                    xref = img[0]
+                    pix = fitz.Pixmap(doc, xref)
+                    
+                    if pix.n - pix.alpha < 4:  # GRAY or RGB
+                        img_cv = pixmap_to_cv(pix)
+                        output.append(executor.submit(_process_one, page_num, img_index, img_cv, writer))
+                    
+                    pix = None
+            
+            doc.close()
+            
+            for item in output:
+                if isinstance(item, Future):
+                    img_cv, lines = item.result()
+                    all_images.append(img_cv)
+                    for line in lines:
+                        print(line)
+                else:
+                    print(item)
         
         # Tenta detectar a melhor foto
         print(f"\n{'='*50}")
@@ -74,7 +110,7 @@ def extract_and_analyze_all_images(pdf_path: str):
             print(f"Métricas: {best_metrics}")
             
             # Salva a melhor foto
-            cv2.imwrite("melhor_foto_detectada.jpg", best_photo)
+            cv2.imwrite("melhor_foto_detectada.jpg", best_photo, DEBUG_JPEG_OPTS)
             print("Salva como: melhor_foto_detectada.jpg")
         else:
             print("Nenhuma foto válida encontrada.")
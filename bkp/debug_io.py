@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Utilitários compartilhados pelos scripts de depuração de imagens
+(debug_image_extraction.py e debug_images.py)
+"""
+
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+def pixmap_to_cv(pix):
+    """Converte um fitz.Pixmap (GRAY/RGB, com ou sem alpha) direto para array OpenCV"""
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    if pix.n - pix.alpha >= 3:
+        code = cv2.COLOR_RGBA2BGR if pix.alpha else cv2.COLOR_RGB2BGR
+        return cv2.cvtColor(arr, code)
+    return np.ascontiguousarray(arr[..., 0])
+
+class BackgroundWriter:
+    """Grava arquivos em uma thread dedicada, sobrepondo disco e CPU
+
+    Os workers só codificam a imagem em memória e enfileiram (caminho, bytes).
+    """
+    
+    def __init__(self, maxsize=32):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name="io-writer", daemon=True)
+        self._thread.start()
+    
+    def write(self, path, data):
+        self._queue.put((path, data))
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, data = item
+            try:
+                with open(path, 'wb') as f:
+                    f.write(data)
+            except OSError as e:
+                print(f"Erro ao gravar {path}: {e}")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        # Esvazia a fila antes de sair
+        self._queue.put(None)
+        self._thread.join()
@@ -4,8 +4,17 @@ Script para debugar a saída do Textract e entender o formato do texto
 """
 
 from document_processor_textract import DocumentProcessorTextract
+import re
 import sys
 
+# Todas as variantes "cpf[:] <número>" (com espaço, dois pontos ou quebra de linha)
+# cabem na primeira alternativa; a segunda pega qualquer número no formato CPF.
+# Uma única passada sobre o texto, compilada uma vez.
+_CPF_RE = re.compile(
+    r'cpf\s*:?\s*(\d{3}\.?\d{3}\.?\d{3}-?\d{2})|(\d{3}\.?\d{3}\.?\d{3}-?\d{2})',
+    re.IGNORECASE | re.MULTILINE
+)
+
 def debug_textract_output(pdf_path):
     """Debug da saída do Textract"""
     
@@ -35,21 +44,19 @@ def debug_textract_output(pdf_path):
     
     # Testa padrões de CPF no texto
     print("\n=== TESTE DE PADRÕES CPF ===")
-    import re
     
     text = textract_result['text']
     
-    cpf_patterns = [
-        r'cpf\s*:?\s*(\d{3}\.?\d{3}\.?\d{3}-?\d{2})',
-        r'cpf\s+(\d{3}\.?\d{3}\.?\d{3}-?\d{2})',
-        r'cpf\s*(\d{3}\.?\d{3}\.?\d{3}-?\d{2})',
-        r'cpf\s*\n\s*(\d{3}\.?\d{3}\.?\d{3}-?\d{2})',
-        r'(\d{3}\.?\d{3}\.?\d{3}-?\d{2})',  # Qualquer número no formato CPF
-    ]
+    found = False
+    for match in _CPF_RE.finditer(text):
+        found = True
+        if match.group(1):
+            print(f"Posição {match.start()}: '{match.group(1)}' (após rótulo CPF)")
+        else:
+            print(f"Posição {match.start()}: '{match.group(2)}' (sem rótulo)")
     
-    for i, pattern in enumerate(cpf_patterns, 1):
-        matches = re.findall(pattern, text, re.IGNORECASE | re.MULTILINE)
-        print(f"Padrão {i} ('{pattern}'): {matches}")
+    if not found:
+        print("Nenhum número no formato CPF encontrado")
     
     # Analisa formulários estruturados
     print("\n=== FORMULÁRIOS ESTRUTURADOS ===")
@@ -3,14 +3,29 @@
 Script de diagnóstico para problemas de extração de PDF
 """
 
+import os
+
+# Um Tesseract por núcleo, cada um com uma única thread OpenMP
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
 import fitz
 import cv2
-import numpy as np
 import pytesseract
-import os
 import sys
+from PIL import Image
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # Bindings diretos da libtesseract: o modelo fica carregado entre as páginas
+    from tesserocr import PyTessBaseAPI, PSM
+except ImportError:
+    PyTessBaseAPI = None
+
+# Escala de renderização das páginas para o OCR
+_MAT_2X = fitz.Matrix(2.0, 2.0)
 
-def diagnose_pdf(pdf_path):
+def diagnose_pdf(pdf_path, debug=False):
     """Diagnóstica problemas com o PDF"""
     print(f"=== DIAGNÓSTICO DO PDF: {pdf_path} ===\n")
     
@@ -30,7 +45,7 @@ def diagnose_pdf(pdf_path):
         print(f"   - Metadados: {doc.metadata}")
         
         # Verifica cada página
-        total_text = ""
+        page_texts = []
         total_images = 0
         
         for page_num in range(len(doc)):
@@ -39,7 +54,7 @@ def diagnose_pdf(pdf_path):
             # Texto da página
             page_text = page.get_text()
             text_len = len(page_text.strip())
-            total_text += page_text
+            page_texts.append(page_text)
             
             # Imagens da página
             images = page.get_images()
@@ -50,6 +65,8 @@ def diagnose_pdf(pdf_path):
             if text_len > 0:
                 print(f"     Amostra do texto: {repr(page_text[:100])}")
         
+        total_text = ''.join(page_texts)
+        
         print(f"\n📊 RESUMO:")
         print(f"   - Total de texto: {len(total_text)} caracteres")
         print(f"   - Total de imagens: {total_images}")
@@ -57,7 +74,7 @@ def diagnose_pdf(pdf_path):
         # Se não tem texto, tenta OCR
         if len(total_text.strip()) < 10:
             print(f"\n🔍 POUCO TEXTO ENCONTRADO - Testando OCR...")
-            test_ocr(doc)
+            test_ocr(doc, debug)
         
         doc.close()
         return True
@@ -66,41 +83,75 @@ def diagnose_pdf(pdf_path):
         print(f"❌ ERRO ao abrir PDF: {e}")
         return False
 
-def test_ocr(doc):
-    """Testa OCR na primeira página"""
+def _ocr_batch(image_paths):
+    """Executa o Tesseract uma vez para um lote de imagens; retorna o texto de cada página"""
+    list_path = os.path.splitext(image_paths[0])[0] + "_lista.txt"
+    with open(list_path, "w") as f:
+        f.write("\n".join(image_paths))
+    
+    ocr_text = pytesseract.image_to_string(list_path, lang='por')
+    return ocr_text.split("\f")[:len(image_paths)]
+
+def _ocr_pages_tesserocr(images):
+    """OCR das páginas (PIL em memória) com uma única API do tesserocr (sem subprocessos)"""
+    with PyTessBaseAPI(lang='por', psm=PSM.AUTO) as api:
+        pages = []
+        for image in images:
+            api.SetImage(image)
+            pages.append(api.GetUTF8Text())
+        return pages
+
+def _ocr_pages_pytesseract(image_paths):
+    """
+    OCR via pytesseract: um lote contíguo de páginas por núcleo; cada lote é uma
+    execução do Tesseract com uma lista de imagens (modelo 'por' carregado uma vez)
+    """
+    n_batches = min(os.cpu_count() or 1, len(image_paths))
+    size = -(-len(image_paths) // n_batches)
+    batches = [image_paths[i:i + size] for i in range(0, len(image_paths), size)]
+    
+    with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+        batch_pages = list(executor.map(_ocr_batch, batches))
+    
+    return [page for batch in batch_pages for page in batch]
+
+def test_ocr(doc, debug=False):
+    """Testa OCR em todas as páginas (tesserocr residente ou um Tesseract por núcleo)"""
     try:
-        page = doc.load_page(0)
-        
-        # Converte para imagem
-        mat = fitz.Matrix(2.0, 2.0)
-        pix = page.get_pixmap(matrix=mat)
-        img_data = pix.tobytes("png")
-        
-        # Salva imagem temporária para debug
-        with open("debug_page.png", "wb") as f:
-            f.write(img_data)
-        print("   - Imagem da página salva como debug_page.png")
-        
-        # Converte para OpenCV
-        img_array = np.frombuffer(img_data, dtype=np.uint8)
-        img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-        
-        if img is not None:
-            print(f"   - Imagem convertida: {img.shape}")
-            
-            # Testa OCR
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            ocr_text = pytesseract.image_to_string(gray, lang='por')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pages_input = []
+            for page_num in range(len(doc)):
+                page = doc.load_page(page_num)
+                
+                # Converte para imagem em tons de cinza
+                pix = page.get_pixmap(matrix=_MAT_2X, colorspace=fitz.csGRAY)
+                if PyTessBaseAPI is not None:
+                    # Buffer cru da pixmap direto para o tesserocr, sem arquivo intermediário
+                    pages_input.append(Image.frombytes("L", (pix.width, pix.height), pix.samples))
+                else:
+                    image_path = os.path.join(tmp_dir, f"page_{page_num}.png")
+                    pix.save(image_path)
+                    pages_input.append(image_path)
+                
+                if page_num == 0:
+                    print(f"   - Imagem convertida: {(pix.height, pix.width)}")
+                    if debug:
+                        # Salva a primeira página para debug
+                        pix.save("debug_page.png")
+                        print("   - Imagem da página salva como debug_page.png")
+                pix = None
             
-            print(f"   - OCR extraiu: {len(ocr_text)} caracteres")
-            if ocr_text.strip():
-                print(f"   - Amostra OCR: {repr(ocr_text[:100])}")
+            if PyTessBaseAPI is not None:
+                pages = _ocr_pages_tesserocr(pages_input)
             else:
-                print("   - OCR não encontrou texto")
-        else:
-            print("   - Erro ao converter imagem")
-            
-        pix = None
+                pages = _ocr_pages_pytesseract(pages_input)
+        
+        for page_num, page_text in enumerate(pages):
+            print(f"   - Página {page_num + 1}: OCR extraiu {len(page_text)} caracteres")
+            if page_text.strip():
+                print(f"     Amostra OCR: {repr(page_text[:100])}")
+            else:
+                print("     OCR não encontrou texto")
         
     except Exception as e:
         print(f"   - Erro no teste OCR: {e}")
@@ -135,15 +186,19 @@ def test_dependencies():
         print(f"❌ Pillow: {e}")
 
 def main():
-    if len(sys.argv) != 2:
-        print("Uso: python diagnose_pdf.py <caminho_do_pdf>")
+    args = sys.argv[1:]
+    debug = '--debug' in args
+    if debug:
+        args.remove('--debug')
+    if len(args) != 1:
+        print("Uso: python diagnose_pdf.py [--debug] <caminho_do_pdf>")
         sys.exit(1)
     
-    pdf_path = sys.argv[1]
+    pdf_path = args[0]
     
     test_dependencies()
     print()
-    diagnose_pdf(pdf_path)
+    diagnose_pdf(pdf_path, debug)
 
 if __name__ == "__main__":
     main()
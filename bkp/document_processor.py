@@ -4,6 +4,12 @@ Aplicação para processamento de documentos pessoais em PDF
 Identifica tipo de documento, extrai informações e valida CPF
 """
 
+import os
+
+# O paralelismo interno (OpenMP) do Tesseract rende pouco: roda-se um processo
+# do Tesseract por núcleo, cada um com uma única thread
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
 import re
 import fitz  # PyMuPDF
 import cv2
@@ -13,7 +19,184 @@ import pytesseract
 from typing import Dict, List, Optional, Tuple
 import argparse
 import sys
-import os
+import tempfile
+import threading
+import multiprocessing
+import hashlib
+from functools import lru_cache
+from operator import mul
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    # Bindings diretos da libtesseract: o modelo fica carregado entre as páginas
+    from tesserocr import PyTessBaseAPI, PSM
+except ImportError:
+    PyTessBaseAPI = None
+
+def _ocr_image_batch(image_paths: List[str]) -> str:
+    """Executa o Tesseract uma vez para uma lista de imagens (arquivo com uma por linha)"""
+    list_path = os.path.splitext(image_paths[0])[0] + "_lista.txt"
+    with open(list_path, "w") as f:
+        f.write("\n".join(image_paths))
+    
+    text = pytesseract.image_to_string(list_path, lang='por')
+    
+    # As páginas vêm separadas por form-feed
+    return "\n".join(page.strip() for page in text.split("\f"))
+
+# Padrões auxiliares usados a cada chamada, compilados uma única vez
+_NON_DIGIT_RE = re.compile(r'[^0-9]')
+_NON_NAME_CHAR_RE = re.compile(r'[^A-Za-zÀ-ÿ\s]')
+_CPF_LABEL_RE = re.compile(r'c\.?p\.?f', re.IGNORECASE)
+
+# Pesos dos dígitos verificadores do CPF; como os dígitos são lidos como bytes
+# ASCII, o deslocamento de ord('0') em cada posição é descontado de uma vez só
+_CPF_W1 = (10, 9, 8, 7, 6, 5, 4, 3, 2)
+_CPF_W2 = (11, 10, 9, 8, 7, 6, 5, 4, 3, 2)
+_CPF_W1_OFFSET = ord('0') * sum(_CPF_W1)
+_CPF_W2_OFFSET = ord('0') * sum(_CPF_W2)
+
+# Os mesmos pesos para a validação em lote (produto matriz-vetor); os valores
+# máximos (9 * 65) são exatos em float32
+_CPF_W1_VEC = np.array(_CPF_W1, dtype=np.float32)
+_CPF_W2_VEC = np.array(_CPF_W2, dtype=np.float32)
+
+# Escala de renderização das páginas para o OCR
+_MAT_2X = fitz.Matrix(2, 2)
+
+# Detector de rostos YuNet (ONNX, via cv2.dnn); sem o modelo, cai no Haar cascade
+YUNET_MODEL = os.environ.get(
+    'YUNET_MODEL',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'face_detection_yunet_2023mar.onnx')
+)
+YUNET_SCORE_THRESHOLD = 0.6
+USE_YUNET = hasattr(cv2, 'FaceDetectorYN') and os.path.exists(YUNET_MODEL)
+
+# Detectores do OpenCV por thread (não são thread-safe), carregados uma vez
+_thread_local = threading.local()
+
+def _get_yunet():
+    """Carrega o YuNet uma vez por thread (setInputSize altera o estado do detector)"""
+    detector = getattr(_thread_local, "yunet", None)
+    if detector is None:
+        detector = cv2.FaceDetectorYN.create(YUNET_MODEL, "", (320, 320), YUNET_SCORE_THRESHOLD)
+        _thread_local.yunet = detector
+    return detector
+
+def _get_face_cascade():
+    """Carrega o Haar cascade uma vez por thread, em vez de reler o XML a cada documento"""
+    cascade = getattr(_thread_local, "face_cascade", None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        _thread_local.face_cascade = cascade
+    return cascade
+
+def _combine_patterns(patterns: List[str]) -> re.Pattern:
+    """
+    Une padrões (cada um com um grupo de captura) em uma única alternância;
+    o padrão i fica no grupo nomeado f'p{i}', logo antes do seu grupo de captura.
+    O lookahead testa a alternância em toda posição, inclusive dentro de uma
+    ocorrência anterior, como faria o search() de cada padrão separado
+    """
+    return re.compile('(?=' + '|'.join(f'(?P<p{i}>{p})' for i, p in enumerate(patterns)) + ')', re.IGNORECASE)
+
+def _search_by_priority(regex: re.Pattern, text: str, accept=None) -> Optional[str]:
+    """
+    Uma única passada com a alternância de _combine_patterns; retorna o valor do
+    padrão de maior prioridade (menor índice) que casou, como no laço padrão a padrão.
+    accept(valor) pode transformar o valor ou rejeitá-lo retornando None
+    """
+    best_priority, best_value = None, None
+    seen = set()
+    for match in regex.finditer(text):
+        # O grupo externo fecha por último: lastgroup é o nome do padrão que casou
+        priority = int(match.lastgroup[1:])
+        # Como no search() de cada padrão, só a primeira ocorrência conta
+        if priority in seen or (best_priority is not None and priority >= best_priority):
+            continue
+        seen.add(priority)
+        value = match.group(regex.groupindex[match.lastgroup] + 1)
+        if accept is not None:
+            value = accept(value)
+        if value is None:
+            continue
+        best_priority, best_value = priority, value
+        if priority == 0:
+            break
+    return best_value
+
+def _clean_name(nome: str) -> Optional[str]:
+    """Remove caracteres especiais e números; nomes com até 3 caracteres são rejeitados"""
+    nome = _NON_NAME_CHAR_RE.sub('', nome.strip().title())
+    return nome if len(nome) > 3 else None
+
+# A partir deste número de páginas, o texto é extraído em paralelo (um processo
+# por faixa de páginas); abaixo disso o custo de despachar as faixas não compensa.
+# Só vale com parallel_pages=True (a CLI): nos workers do Gunicorn, um pool de
+# processos por requisição multiplicaria os processos e as threads
+PARALLEL_MIN_PAGES = 4
+
+# Pool de processos compartilhado, criado sob demanda. Com forkserver os workers
+# não herdam as threads (OCR, OpenCV) do processo que os cria
+_PAGE_POOL = None
+_PAGE_POOL_LOCK = threading.Lock()
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    """Pool de processos da extração de texto paralela"""
+    global _PAGE_POOL
+    with _PAGE_POOL_LOCK:
+        if _PAGE_POOL is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _PAGE_POOL = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                             mp_context=multiprocessing.get_context(method))
+        return _PAGE_POOL
+
+def _decode_pdf_image(doc, xref: int) -> Optional[np.ndarray]:
+    """
+    Converte uma imagem embutida (xref) para BGR direto do buffer da pixmap, sem
+    passar por PNG; o alpha é descartado. None se não for GRAY/RGB
+    """
+    pix = fitz.Pixmap(doc, xref)
+    colors = pix.n - pix.alpha
+    if colors >= 4:  # CMYK e afins ficam de fora
+        return None
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    if colors == 3:
+        return cv2.cvtColor(arr[..., :3], cv2.COLOR_RGB2BGR)
+    return cv2.cvtColor(np.ascontiguousarray(arr[..., 0]), cv2.COLOR_GRAY2BGR)
+
+def _extract_page_text(pdf_path: str, start: int, stop: int) -> str:
+    """
+    Worker do pool de processos: abre o PDF uma vez e extrai o texto das
+    páginas [start, stop)
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        return ''.join(doc.load_page(page_num).get_text() for page_num in range(start, stop))
+    finally:
+        doc.close()
+
+# Número de padrões distintos de um tipo a partir do qual ele é aceito sem
+# pontuar os demais tipos
+DOC_TYPE_CONFIDENT_SCORE = 3
+
+# A detecção de rostos roda com a imagem reduzida para no máximo este lado;
+# as coordenadas voltam para a resolução original no recorte
+DETECTION_MAX_SIDE = 600
+
+# Parâmetros fixos do JPEG da foto salva (a mesma qualidade padrão do imwrite,
+# sem a passada extra de otimização de Huffman)
+PHOTO_JPEG_OPTS = [cv2.IMWRITE_JPEG_QUALITY, 95, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+
+# Altura da faixa preta entre as imagens empilhadas na detecção de rostos em lote
+FACE_BATCH_GAP = 32
+
+# Quantos textos (pelo hash) têm o tipo de documento memorizado por processador
+DOC_TYPE_CACHE_SIZE = 256
+
+# Abaixo desta quantidade de caracteres na camada de texto o PDF é tratado
+# como escaneado e passa pelo OCR
+MIN_TEXT_LAYER_CHARS = 50
 
 class CPFValidator:
     """Classe para validação de CPF"""
@@ -22,7 +205,7 @@ class CPFValidator:
     def clean_cpf(cpf: str) -> str:
         """Remove caracteres não numéricos do CPF e extrai os 11 dígitos corretos"""
         # Remove todos os caracteres não numéricos
-        cleaned = re.sub(r'[^0-9]', '', cpf)
+        cleaned = _NON_DIGIT_RE.sub('', cpf)
         
         # Se o CPF limpo tem mais de 11 dígitos, tenta extrair o CPF correto
         if len(cleaned) > 11:
@@ -39,6 +222,7 @@ class CPFValidator:
         return cleaned
     
     @staticmethod
+    @lru_cache(maxsize=4096)
     def validate_cpf(cpf: str) -> bool:
         """
         Valida CPF usando o algoritmo oficial
@@ -54,25 +238,62 @@ class CPFValidator:
         if cpf == cpf[0] * 11:
             return False
         
-        # Calcula primeiro dígito verificador
-        sum1 = sum(int(cpf[i]) * (10 - i) for i in range(9))
-        digit1 = 11 - (sum1 % 11)
-        if digit1 >= 10:
-            digit1 = 0
+        # Produto escalar dos dígitos (bytes ASCII) com os pesos, sem int() por dígito
+        digits = cpf.encode('ascii')
+        sum1 = sum(map(mul, digits, _CPF_W1)) - _CPF_W1_OFFSET
+        sum2 = sum(map(mul, digits, _CPF_W2)) - _CPF_W2_OFFSET
         
-        # Calcula segundo dígito verificador
-        sum2 = sum(int(cpf[i]) * (11 - i) for i in range(10))
-        digit2 = 11 - (sum2 % 11)
-        if digit2 >= 10:
-            digit2 = 0
+        # 11 - (soma % 11), com 10 e 11 virando 0
+        digit1 = (-sum1) % 11 % 10
+        digit2 = (-sum2) % 11 % 10
         
         # Verifica se os dígitos calculados conferem
-        return cpf[9] == str(digit1) and cpf[10] == str(digit2)
+        return digits[9] - 48 == digit1 and digits[10] - 48 == digit2
+    
+    @staticmethod
+    def validate_cpf_batch(cpfs: List[str]) -> np.ndarray:
+        """
+        Valida vários CPFs de uma vez: uma matriz (N, 11) de dígitos e um produto
+        matricial por dígito verificador. Para um único CPF, use validate_cpf
+        Returns: array de booleanos na mesma ordem da entrada
+        """
+        if not cpfs:
+            return np.zeros(0, dtype=bool)
+        
+        # Entradas sem 11 dígitos viram uma linha de zeros (rejeitada: dígitos iguais)
+        cleaned = (CPFValidator.clean_cpf(cpf) for cpf in cpfs)
+        joined = ''.join(cpf if len(cpf) == 11 else '0' * 11 for cpf in cleaned)
+        digits = np.frombuffer(joined.encode('ascii'), dtype=np.uint8).reshape(-1, 11) - ord('0')
+        
+        d = digits.astype(np.float32)
+        sum1 = (d[:, :9] @ _CPF_W1_VEC).astype(np.int64)
+        sum2 = (d[:, :10] @ _CPF_W2_VEC).astype(np.int64)
+        
+        # 11 - (soma % 11), com 10 e 11 virando 0
+        digit1 = (-sum1) % 11 % 10
+        digit2 = (-sum2) % 11 % 10
+        
+        all_equal = (digits == digits[:, :1]).all(axis=1)
+        return (digits[:, 9] == digit1) & (digits[:, 10] == digit2) & ~all_equal
 
 class DocumentProcessor:
     """Classe principal para processamento de documentos"""
     
-    def __init__(self):
+    def __init__(self, parallel_pages: bool = False):
+        # Extração de texto com um processo por faixa de páginas (PDFs grandes, CLI)
+        self.parallel_pages = parallel_pages
+        
+        # APIs do tesserocr (uma por thread de OCR), criadas sob demanda
+        self._ocr_executor = None
+        self._ocr_local = threading.local()
+        self._ocr_apis = []
+        self._ocr_lock = threading.Lock()
+        
+        # Tipo de documento já identificado, por hash do texto (não guarda o texto);
+        # o processador é compartilhado entre as threads do Gunicorn, daí o lock
+        self._doc_type_cache = {}
+        self._doc_type_lock = threading.Lock()
+        
         self.document_patterns = {
             'RG': [
                 r'registro\s+geral',
@@ -117,56 +338,180 @@ class DocumentProcessor:
                 r'(\d{3}[^\d\s]\d{6}[^\d\s]\d{2})',
             ]
         }
+        
+        # Compila todos os padrões uma única vez
+        self.document_patterns = {
+            doc_type: [re.compile(p, re.IGNORECASE) for p in patterns]
+            for doc_type, patterns in self.document_patterns.items()
+        }
+        # Os padrões de cada campo também numa única alternância (uma passada no texto)
+        self._info_res = {
+            field: _combine_patterns(patterns)
+            for field, patterns in self.info_patterns.items()
+        }
+        self.info_patterns = {
+            field: [re.compile(p, re.IGNORECASE) for p in patterns]
+            for field, patterns in self.info_patterns.items()
+        }
     
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extrai texto do PDF usando PyMuPDF"""
+    def extract_text_from_pdf(self, doc: fitz.Document) -> str:
+        """Extrai texto do PDF aberto (sem normalizar a caixa: os padrões usam IGNORECASE)"""
         try:
-            doc = fitz.open(pdf_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text.lower()
+            return ''.join(page.get_text() for page in doc)
         except Exception as e:
             print(f"Erro ao extrair texto do PDF: {e}")
             return ""
     
-    def extract_images_from_pdf(self, pdf_path: str) -> List[np.ndarray]:
-        """Extrai imagens do PDF"""
+    def _get_tess_api(self):
+        """API do tesserocr residente da thread atual (a API não é thread-safe)"""
+        api = getattr(self._ocr_local, "api", None)
+        if api is None:
+            api = PyTessBaseAPI(lang='por', psm=PSM.AUTO)
+            self._ocr_local.api = api
+            with self._ocr_lock:
+                self._ocr_apis.append(api)
+        return api
+    
+    def _ocr_image(self, image: Image.Image) -> str:
+        """OCR de uma página com a API residente da thread"""
+        api = self._get_tess_api()
+        api.SetImage(image)
+        return api.GetUTF8Text().strip()
+    
+    def _ocr_pdf_tesserocr(self, doc) -> str:
+        """OCR via tesserocr: páginas em paralelo, modelo carregado uma vez por thread"""
         images = []
+        for page_num in range(len(doc)):
+            pix = doc.load_page(page_num).get_pixmap(matrix=_MAT_2X, colorspace=fitz.csGRAY)
+            images.append(Image.frombytes("L", (pix.width, pix.height), pix.samples))
+        
+        with self._ocr_lock:
+            if self._ocr_executor is None:
+                self._ocr_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        
+        # O tesserocr libera o GIL durante o reconhecimento
+        return "\n".join(self._ocr_executor.map(self._ocr_image, images))
+    
+    def ocr_pdf(self, doc: fitz.Document) -> str:
+        """
+        Faz OCR de todas as páginas do PDF aberto. Com o tesserocr instalado, a API fica
+        residente entre as páginas e as chamadas. Sem ele, as páginas são divididas em lotes
+        contíguos, um por núcleo; cada lote é uma única execução do Tesseract
+        (um processo e um carregamento do modelo 'por' por lote)
+        """
         try:
-            doc = fitz.open(pdf_path)
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                image_list = page.get_images()
+            if PyTessBaseAPI is not None:
+                return self._ocr_pdf_tesserocr(doc)
+            
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                image_paths = []
+                for page_num in range(len(doc)):
+                    # Renderiza direto em tons de cinza: 1 canal em vez de 3, que é o que o Tesseract usa
+                    pix = doc.load_page(page_num).get_pixmap(matrix=_MAT_2X, colorspace=fitz.csGRAY)
+                    image_path = os.path.join(tmp_dir, f"page_{page_num}.png")
+                    pix.save(image_path)
+                    image_paths.append(image_path)
+                
+                if not image_paths:
+                    return ""
                 
-                for img_index, img in enumerate(image_list):
-                    xref = img[0]
-                    pix = fitz.Pixmap(doc, xref)
-                    
-                    if pix.n - pix.alpha < 4:  # GRAY or RGB
-                        img_data = pix.tobytes("png")
-                        img_array = np.frombuffer(img_data, dtype=np.uint8)
-                        img_cv = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-                        if img_cv is not None:
-                            images.append(img_cv)
-                    pix = None
-            doc.close()
+                n_batches = min(os.cpu_count() or 1, len(image_paths))
+                size = -(-len(image_paths) // n_batches)
+                batches = [image_paths[i:i + size] for i in range(0, len(image_paths), size)]
+                
+                # As threads só esperam pelos subprocessos do Tesseract (sem GIL)
+                with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+                    texts = list(executor.map(_ocr_image_batch, batches))
+            
+            return "\n".join(texts)
+        except Exception as e:
+            print(f"Erro no OCR do PDF: {e}")
+            return ""
+    
+    def __del__(self):
+        """Libera as APIs do tesserocr e o pool de OCR"""
+        executor = getattr(self, "_ocr_executor", None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+        for api in getattr(self, "_ocr_apis", []):
+            api.End()
+    
+    def extract_images_from_pdf(self, doc: fitz.Document) -> List[np.ndarray]:
+        """Extrai as imagens embutidas do PDF aberto"""
+        images = []
+        try:
+            for page_num in range(len(doc)):
+                for img in doc.load_page(page_num).get_images():
+                    img_cv = _decode_pdf_image(doc, img[0])
+                    if img_cv is not None:
+                        images.append(img_cv)
         except Exception as e:
             print(f"Erro ao extrair imagens: {e}")
         
         return images
     
+    def find_face_in_pdf(self, doc: fitz.Document) -> Tuple[List[np.ndarray], Optional[Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Extrai as imagens do PDF aberto, parando na primeira que contém um rosto
+        (o detector roda uma única vez por imagem)
+        Returns: (imagens extraídas, (imagem, caixa x, y, w, h do rosto) ou None)
+        """
+        images = []
+        try:
+            for page_num in range(len(doc)):
+                for img in doc.load_page(page_num).get_images():
+                    img_cv = _decode_pdf_image(doc, img[0])
+                    if img_cv is None:
+                        continue
+                    images.append(img_cv)
+                    faces = self._find_faces(img_cv)
+                    if len(faces) > 0:
+                        return images, (img_cv, faces[0])
+        except Exception as e:
+            print(f"Erro ao extrair imagens: {e}")
+        
+        return images, None
+    
+    def extract_text_parallel(self, pdf_path: str, num_pages: int) -> str:
+        """
+        Extrai o texto com um processo por faixa contígua de páginas (PyMuPDF não
+        é thread-safe). Returns: texto na ordem das páginas
+        """
+        n_workers = min(os.cpu_count() or 1, num_pages)
+        size = -(-num_pages // n_workers)
+        starts = list(range(0, num_pages, size))
+        stops = [min(start + size, num_pages) for start in starts]
+        
+        return ''.join(_get_page_pool().map(_extract_page_text, [pdf_path] * len(starts), starts, stops))
+    
     def identify_document_type(self, text: str) -> Optional[str]:
-        """Identifica o tipo de documento baseado no texto"""
-        text = text.lower()
+        """
+        Identifica o tipo de documento baseado no texto: cada padrão presente vale
+        um ponto (search para na primeira ocorrência) e um tipo que atinge
+        DOC_TYPE_CONFIDENT_SCORE é retornado sem avaliar os demais.
+        O resultado fica memorizado pelo hash do texto
+        """
+        key = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        with self._doc_type_lock:
+            if key in self._doc_type_cache:
+                return self._doc_type_cache[key]
         
+        # A pontuação roda fora do lock; duas threads com o mesmo texto só repetem o cálculo
+        doc_type = self._score_document_type(text)
+        with self._doc_type_lock:
+            if key not in self._doc_type_cache and len(self._doc_type_cache) >= DOC_TYPE_CACHE_SIZE:
+                # Descarta a entrada mais antiga (dicts mantêm a ordem de inserção)
+                del self._doc_type_cache[next(iter(self._doc_type_cache))]
+            self._doc_type_cache[key] = doc_type
+        return doc_type
+    
+    def _score_document_type(self, text: str) -> Optional[str]:
+        """Pontua os tipos de documento (ver identify_document_type)"""
         scores = {}
         for doc_type, patterns in self.document_patterns.items():
-            score = 0
-            for pattern in patterns:
-                matches = len(re.findall(pattern, text, re.IGNORECASE))
-                score += matches
+            score = sum(1 for pattern in patterns if pattern.search(text))
+            if score >= DOC_TYPE_CONFIDENT_SCORE:
+                return doc_type
             scores[doc_type] = score
         
         # Retorna o tipo com maior pontuação se > 0
@@ -175,49 +520,145 @@ class DocumentProcessor:
         
         return None
     
-    def extract_information(self, text: str) -> Dict[str, str]:
-        """Extrai nome e CPF do texto"""
+    def find_cpf_in_blocks(self, doc: fitz.Document) -> Optional[str]:
+        """
+        Procura o CPF só perto do rótulo: nos blocos de texto (get_text("blocks"),
+        em ordem de leitura) que contêm "cpf" e no bloco seguinte a cada um.
+        Evita os falsos positivos (RG, números de série) da busca no texto inteiro
+        Returns: o CPF encontrado ou None
+        """
+        try:
+            for page in doc:
+                # Só blocos de texto (tipo 0), de cima para baixo
+                blocks = sorted((b for b in page.get_text("blocks") if b[6] == 0),
+                                key=lambda b: (b[1], b[0]))
+                for i, block in enumerate(blocks):
+                    if _CPF_LABEL_RE.search(block[4]) is None:
+                        continue
+                    region = ''.join(b[4] for b in blocks[i:i + 2])
+                    cpf = _search_by_priority(self._info_res['cpf'], region)
+                    if cpf:
+                        return cpf
+        except Exception as e:
+            print(f"Erro ao procurar CPF nos blocos do PDF: {e}")
+        return None
+    
+    def extract_information(self, text: str, search_cpf: bool = True) -> Dict[str, str]:
+        """
+        Extrai nome e CPF do texto. Com search_cpf=False só o nome é procurado
+        (o CPF já veio de find_cpf_in_blocks)
+        """
         info = {'nome': '', 'cpf': ''}
         
-        # Extrai nome
-        for pattern in self.info_patterns['nome']:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                nome = match.group(1).strip().title()
-                # Remove caracteres especiais e números
-                nome = re.sub(r'[^A-Za-zÀ-ÿ\s]', '', nome)
-                if len(nome) > 3:  # Nome deve ter pelo menos 3 caracteres
-                    info['nome'] = nome
-                    break
+        # Extrai nome (o padrão de maior prioridade com um nome de mais de 3 caracteres)
+        nome = _search_by_priority(self._info_res['nome'], text, _clean_name)
+        if nome:
+            info['nome'] = nome
         
         # Extrai CPF
-        for pattern in self.info_patterns['cpf']:
-            match = re.search(pattern, text)
-            if match:
-                cpf = match.group(1) if len(match.groups()) > 0 else match.group(0)
+        if search_cpf:
+            cpf = _search_by_priority(self._info_res['cpf'], text)
+            if cpf:
                 info['cpf'] = cpf
-                break
         
         return info
     
-    def detect_face_in_images(self, images: List[np.ndarray]) -> Optional[np.ndarray]:
-        """Detecta e extrai foto/rosto das imagens"""
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    def _detect_faces_raw(self, img: np.ndarray) -> np.ndarray:
+        """
+        Detecta rostos em uma imagem BGR com o YuNet (direto no BGR) ou, sem o
+        modelo, com o Haar cascade, na resolução recebida
+        Returns: array (N, 4) de x, y, w, h dentro dos limites da imagem
+        """
+        if USE_YUNET:
+            detector = _get_yunet()
+            detector.setInputSize((img.shape[1], img.shape[0]))
+            _, detections = detector.detect(img)
+            if detections is None:
+                return np.empty((0, 4), dtype=int)
+            # As caixas do YuNet podem sair parcialmente da imagem: recorta para os
+            # limites, ajustando também largura e altura
+            h, w = img.shape[:2]
+            faces = detections[:, :4].astype(int)
+            x1 = np.clip(faces[:, 0] + faces[:, 2], 0, w)
+            y1 = np.clip(faces[:, 1] + faces[:, 3], 0, h)
+            np.clip(faces[:, 0], 0, w, out=faces[:, 0])
+            np.clip(faces[:, 1], 0, h, out=faces[:, 1])
+            faces[:, 2] = x1 - faces[:, 0]
+            faces[:, 3] = y1 - faces[:, 1]
+            return faces
         
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        faces = _get_face_cascade().detectMultiScale(gray, 1.1, 4)
+        return np.asarray(faces, dtype=int).reshape(-1, 4)
+    
+    @staticmethod
+    def _downscale_for_detection(img: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Reduz a imagem para no máximo DETECTION_MAX_SIDE de lado; retorna (imagem, escala)"""
+        scale = min(1.0, DETECTION_MAX_SIDE / max(img.shape[:2]))
+        if scale < 1.0:
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return img, scale
+    
+    def _find_faces(self, img: np.ndarray) -> np.ndarray:
+        """
+        Detecta rostos com a imagem reduzida para DETECTION_MAX_SIDE
+        Returns: array (N, 4) de x, y, w, h na resolução original
+        """
+        small, scale = self._downscale_for_detection(img)
+        return (self._detect_faces_raw(small) / scale).astype(int)
+    
+    def _find_faces_batch(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Detecta rostos em várias imagens BGR com uma única passada do detector:
+        as imagens, reduzidas para DETECTION_MAX_SIDE, são empilhadas em uma tela,
+        separadas por faixas pretas
+        Returns: para cada imagem, array (N, 4) de x, y, w, h nas coordenadas dela
+        """
+        images, scales = zip(*(self._downscale_for_detection(img) for img in images))
+        max_w = max(img.shape[1] for img in images)
+        offsets = []
+        y = 0
         for img in images:
-            if img is None:
-                continue
-                
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-            
+            offsets.append(y)
+            y += img.shape[0] + FACE_BATCH_GAP
+        
+        canvas = np.zeros((y - FACE_BATCH_GAP, max_w, 3), dtype=np.uint8)
+        for img, y0 in zip(images, offsets):
+            canvas[y0:y0 + img.shape[0], :img.shape[1]] = img
+        
+        detections = self._detect_faces_raw(canvas)
+        
+        per_image = []
+        for img, y0, scale in zip(images, offsets, scales):
+            h, w = img.shape[:2]
+            # Só valem as caixas inteiramente dentro da imagem (não na faixa nem na letterbox)
+            inside = ((detections[:, 1] >= y0) & (detections[:, 1] + detections[:, 3] <= y0 + h) &
+                      (detections[:, 0] + detections[:, 2] <= w))
+            faces = detections[inside].copy()
+            faces[:, 1] -= y0
+            per_image.append((faces / scale).astype(int))
+        return per_image
+    
+    def detect_face_in_images(self, images: List[np.ndarray]) -> Optional[np.ndarray]:
+        """Detecta e extrai foto/rosto das imagens (uma passada do detector para todas)"""
+        images = [img for img in images if img is not None]
+        if len(images) > 1 and all(img.ndim == 3 and img.shape[2] == 3 for img in images):
+            faces_per_image = self._find_faces_batch(images)
+        else:
+            faces_per_image = [self._find_faces(img) for img in images]
+        
+        for img, faces in zip(images, faces_per_image):
             if len(faces) > 0:
                 # Retorna a primeira face encontrada
                 (x, y, w, h) = faces[0]
                 face_img = img[y:y+h, x:x+w]
                 return face_img
         
-        # Se não encontrar face, retorna a primeira imagem que pareça ser uma foto
+        return self._first_photo_like(images)
+    
+    @staticmethod
+    def _first_photo_like(images: List[np.ndarray]) -> Optional[np.ndarray]:
+        """Sem rosto detectado: a primeira imagem que pareça ser uma foto"""
         for img in images:
             if img is not None and img.shape[0] > 100 and img.shape[1] > 100:
                 return img
@@ -225,16 +666,25 @@ class DocumentProcessor:
         return None
     
     def save_photo(self, photo: np.ndarray, output_path: str) -> bool:
-        """Salva a foto extraída"""
+        """Salva a foto extraída (codifica em memória e grava os bytes de uma vez)"""
         try:
-            cv2.imwrite(output_path, photo)
+            ext = os.path.splitext(output_path)[1] or '.jpg'
+            ok, buf = cv2.imencode(ext, photo, PHOTO_JPEG_OPTS)
+            if not ok:
+                print(f"Erro ao codificar foto: {output_path}")
+                return False
+            with open(output_path, 'wb') as f:
+                f.write(buf.tobytes())
             return True
         except Exception as e:
             print(f"Erro ao salvar foto: {e}")
             return False
     
-    def process_document(self, pdf_path: str, output_dir: str = ".") -> Dict:
-        """Processa o documento completo"""
+    def process_document(self, pdf_path: str, output_dir: str = ".", extract_photo: bool = True) -> Dict:
+        """
+        Processa o documento completo. Com extract_photo=False e um PDF com
+        camada de texto, nenhuma imagem é decodificada
+        """
         if not os.path.exists(pdf_path):
             return {"erro": "Arquivo PDF não encontrado"}
         
@@ -243,60 +693,93 @@ class DocumentProcessor:
         
         print(f"Processando documento: {pdf_path}")
         
-        # Extrai texto
-        text = self.extract_text_from_pdf(pdf_path)
-        if not text:
+        # O PDF é aberto uma única vez e compartilhado por todas as etapas
+        try:
+            doc = fitz.open(pdf_path)
+        except Exception as e:
+            print(f"Erro ao abrir o PDF: {e}")
             return {"erro": "Não foi possível extrair texto do PDF"}
         
-        # Identifica tipo de documento
-        doc_type = self.identify_document_type(text)
-        print(f"Tipo de documento identificado: {doc_type or 'Não identificado'}")
-        
-        # Extrai informações
-        info = self.extract_information(text)
-        print(f"Informações extraídas: {info}")
-        
-        # Valida CPF
-        cpf_valido = False
-        if info['cpf']:
-            cpf_valido = CPFValidator.validate_cpf(info['cpf'])
-            print(f"CPF válido: {cpf_valido}")
-        
-        # Extrai imagens e procura por foto
-        images = self.extract_images_from_pdf(pdf_path)
-        photo_path = None
-        
-        if images:
-            photo = self.detect_face_in_images(images)
-            if photo is not None:
-                photo_filename = f"foto_extraida_{os.path.basename(pdf_path)}.jpg"
-                photo_path = os.path.join(output_dir, photo_filename)
-                if self.save_photo(photo, photo_path):
-                    print(f"Foto salva em: {photo_path}")
+        with doc:
+            # PDFs grandes (só com parallel_pages): texto extraído em paralelo por páginas
+            num_pages = len(doc)
+            try:
+                if self.parallel_pages and num_pages >= PARALLEL_MIN_PAGES:
+                    text = self.extract_text_parallel(pdf_path, num_pages)
                 else:
-                    photo_path = None
-        
-        # Resultado final
-        resultado = {
-            "tipo_documento": doc_type,
-            "nome": info['nome'],
-            "cpf": info['cpf'],
-            "cpf_valido": cpf_valido,
-            "foto_extraida": photo_path,
-            "sucesso": True
-        }
-        
-        return resultado
+                    text = self.extract_text_from_pdf(doc)
+            except Exception as e:
+                print(f"Erro na extração paralela, usando a sequencial: {e}")
+                text = self.extract_text_from_pdf(doc)
+            
+            # O OCR só roda em PDFs escaneados (camada de texto vazia ou mínima)
+            text_layer_chars = len(text.strip())
+            has_text_layer = text_layer_chars >= MIN_TEXT_LAYER_CHARS
+            if not has_text_layer:
+                print("PDF sem texto embutido suficiente, executando OCR...")
+                text = self.ocr_pdf(doc) or text
+            if not text.strip():
+                return {"erro": "Não foi possível extrair texto do PDF"}
+            
+            # Identifica tipo de documento
+            doc_type = self.identify_document_type(text)
+            print(f"Tipo de documento identificado: {doc_type or 'Não identificado'}")
+            
+            # Extrai informações; com camada de texto, o CPF é procurado primeiro junto ao rótulo
+            cpf_from_blocks = self.find_cpf_in_blocks(doc) if has_text_layer else None
+            info = self.extract_information(text, search_cpf=cpf_from_blocks is None)
+            if cpf_from_blocks:
+                info['cpf'] = cpf_from_blocks
+            print(f"Informações extraídas: {info}")
+            
+            # Valida CPF
+            cpf_valido = False
+            if info['cpf']:
+                cpf_valido = CPFValidator.validate_cpf(info['cpf'])
+                print(f"CPF válido: {cpf_valido}")
+            
+            # Extrai imagens e procura por foto, parando no primeiro rosto; o recorte
+            # usa a caixa dessa mesma detecção
+            photo_path = None
+            
+            if extract_photo:
+                images, face = self.find_face_in_pdf(doc)
+                if face is not None:
+                    img, (x, y, w, h) = face
+                    photo = img[y:y+h, x:x+w]
+                else:
+                    photo = self._first_photo_like(images)
+                
+                if photo is not None:
+                    photo_filename = f"foto_extraida_{os.path.basename(pdf_path)}.jpg"
+                    photo_path = os.path.join(output_dir, photo_filename)
+                    if self.save_photo(photo, photo_path):
+                        print(f"Foto salva em: {photo_path}")
+                    else:
+                        photo_path = None
+            
+            # Resultado final
+            resultado = {
+                "tipo_documento": doc_type,
+                "nome": info['nome'],
+                "cpf": info['cpf'],
+                "cpf_valido": cpf_valido,
+                "foto_extraida": photo_path,
+                "sucesso": True
+            }
+            
+            return resultado
 
 def main():
     parser = argparse.ArgumentParser(description='Processador de Documentos Pessoais')
     parser.add_argument('pdf_path', help='Caminho para o arquivo PDF')
     parser.add_argument('-o', '--output', default='.', help='Diretório de saída (padrão: diretório atual)')
+    parser.add_argument('--sem-foto', action='store_true', help='Não extrai a foto (só texto, mais rápido)')
     
     args = parser.parse_args()
     
-    processor = DocumentProcessor()
-    resultado = processor.process_document(args.pdf_path, args.output)
+    processor = DocumentProcessor(parallel_pages=True)
+    resultado = processor.process_document(args.pdf_path, args.output, extract_photo=not args.sem_foto)
     
     if "erro" in resultado:
         print(f"ERRO: {resultado['erro']}")
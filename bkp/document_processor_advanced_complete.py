@@ -11,22 +11,182 @@ import numpy as np
 from PIL import Image
 import boto3
 import base64
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Dict, List, Optional, Tuple, Any
 import argparse
 import sys
 import os
 import logging
 import json
 import gc  # Garbage collector
+import time
+import uuid
+from collections import OrderedDict
+from operator import mul
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError, NoCredentialsError
 
+try:
+    # Multi-padrão em uma única passada (DFA compilado); opcional
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# Detector de rostos YuNet (ONNX, backend DNN do OpenCV); sem o modelo, cai na
+# pilha de Haar cascades
+YUNET_MODEL = os.environ.get(
+    'YUNET_MODEL',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'face_detection_yunet_2023mar.onnx')
+)
+YUNET_SCORE_THRESHOLD = 0.6
+USE_YUNET = hasattr(cv2, 'FaceDetectorYN') and os.path.exists(YUNET_MODEL)
+
+# Textract: acima deste número de páginas o PDF vai para a API assíncrona (via
+# S3), que processa as páginas em paralelo no servidor
+TEXTRACT_ASYNC_MIN_PAGES = 5
+TEXTRACT_S3_PREFIX = 'textract-tmp/'
+TEXTRACT_POLL_INTERVAL = 2  # segundos
+TEXTRACT_TIMEOUT = 300  # segundos
+
+# Garante os caminhos SIMD (universal intrinsics) do OpenCV
+cv2.setUseOptimized(True)
+
+# Pool interno do OpenCV (parallel_for_) com metade dos núcleos: dois
+# processadores em paralelo ocupam a máquina sem disputar threads
+cv2.setNumThreads(max(1, (os.cpu_count() or 1) // 2))
+
+# Parâmetros de codificação da foto salva, por extensão (PNG com zlib nível 1)
+PHOTO_ENCODE_OPTS = {
+    '.jpg': [cv2.IMWRITE_JPEG_QUALITY, 92],
+    '.jpeg': [cv2.IMWRITE_JPEG_QUALITY, 92],
+    '.png': [cv2.IMWRITE_PNG_COMPRESSION, 1],
+}
+
+# T-API: imagens grandes (páginas renderizadas) vão para os cascades como UMat,
+# que usam OpenCL (ex.: GPU integrada) quando disponível e a CPU caso contrário
+cv2.ocl.setUseOpenCL(True)
+UMAT_MIN_PIXELS = 2000000
+
+# Classificadores Haar, na ordem em que são aplicados, e seus parâmetros
+CASCADE_FILES = {
+    'frontal_default': 'haarcascade_frontalface_default.xml',
+    'frontal_alt': 'haarcascade_frontalface_alt.xml',
+    'profile': 'haarcascade_profileface.xml',
+}
+CASCADE_PARAMS = {
+    'frontal_default': dict(scaleFactor=1.1, minNeighbors=4, minSize=(30, 30), maxSize=(500, 500)),
+    'frontal_alt': dict(scaleFactor=1.05, minNeighbors=3, minSize=(25, 25), maxSize=(400, 400)),
+    'profile': dict(scaleFactor=1.1, minNeighbors=5, minSize=(30, 30), maxSize=(300, 300)),
+}
+
+# Bônus de confiança por método de detecção (os demais ficam com 1.0)
+METHOD_CONFIDENCE_BONUS = {
+    'frontal_default': 1.2,
+    'frontal_alt': 1.1,
+}
+
+# Páginas renderizadas mantidas em cache (LRU) enquanto o mesmo documento está aberto
+PAGE_CACHE_SIZE = 6
+
+# Confiança (fração da área, com bônus) de uma face achada na imagem original a
+# partir da qual a busca pela melhor foto para nas imagens seguintes
+FACE_EARLY_EXIT_CONFIDENCE = 0.05
+
+def _detect_with_cascade(cascade, gray: np.ndarray, method_name: str):
+    """Worker: roda um dos cascades já carregados sobre a imagem em escala de cinza"""
+    # detectMultiScale libera o GIL
+    return cascade.detectMultiScale(_detection_input(gray), **CASCADE_PARAMS[method_name])
+
+def _detection_input(gray: np.ndarray):
+    """Imagem para o detectMultiScale: UMat (OpenCL) se for grande e houver OpenCL"""
+    if gray.size > UMAT_MIN_PIXELS and cv2.ocl.useOpenCL():
+        return cv2.UMat(gray)
+    return gray
+
+# Padrões auxiliares usados a cada chamada, compilados uma única vez
+_NON_DIGIT_RE = re.compile(r'[^0-9]')
+
+# Caracteres em que o Hyperscan diverge do re (\s, \d e caixa): separadores
+# \x1c-\x1f, İ/ı e dígitos fora do BMP; com eles no texto, o pré-filtro é ignorado
+_HS_UNSAFE_CHARS_RE = re.compile('[\x1c-\x1f\u0130\u0131\U00010000-\U0010ffff]')
+
+# Separadores removidos do fim das chaves dos formulários do Textract
+_KEY_TRAILING_CHARS = ': \t\n\r\f\v'
+
+# Pesos dos dígitos verificadores do CPF; como os dígitos são lidos como bytes
+# ASCII, o deslocamento de ord('0') em cada posição é descontado de uma vez só
+_CPF_W1 = (10, 9, 8, 7, 6, 5, 4, 3, 2)
+_CPF_W2 = (11, 10, 9, 8, 7, 6, 5, 4, 3, 2)
+_CPF_W1_OFFSET = ord('0') * sum(_CPF_W1)
+_CPF_W2_OFFSET = ord('0') * sum(_CPF_W2)
+
+# Faces detectadas em estrutura de arrays: caixas (N, 4) int32 (x, y, w, h) e,
+# ao lado, a lista com o método de cada uma
+_NO_BOXES = np.empty((0, 4), dtype=np.int32)
+
+def _as_boxes(detections) -> np.ndarray:
+    """Normaliza a saída do detectMultiScale (tupla vazia ou array) para (N, 4) int32"""
+    if len(detections) == 0:
+        return _NO_BOXES
+    return np.asarray(detections, dtype=np.int32).reshape(-1, 4)
+
+def _stack_boxes(boxes_list: List[np.ndarray]) -> np.ndarray:
+    """Concatena listas de caixas (N, 4)"""
+    return np.vstack(boxes_list) if boxes_list else _NO_BOXES
+
+def _reuse_buffer(buf: Optional[np.ndarray], shape: Tuple[int, ...]) -> np.ndarray:
+    """Devolve buf se já tiver o formato pedido (uint8); senão aloca um novo"""
+    if buf is None or buf.shape != shape:
+        return np.empty(shape, dtype=np.uint8)
+    return buf
+
+def pixmap_to_bgr(pix: fitz.Pixmap) -> np.ndarray:
+    """
+    Converte uma pixmap GRAY/RGB (com ou sem alpha) direto do buffer para BGR,
+    sem passar por PNG; o alpha é descartado, como no cv2.IMREAD_COLOR
+    """
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    if pix.n - pix.alpha >= 3:
+        return cv2.cvtColor(arr[..., :3], cv2.COLOR_RGB2BGR)
+    return cv2.cvtColor(np.ascontiguousarray(arr[..., 0]), cv2.COLOR_GRAY2BGR)
+
+def _compute_3x4_box(img_height: int, img_width: int, x: int, y: int, w: int, h: int) -> Tuple[int, int, int, int]:
+    """
+    Caixa 3x4 em torno do rosto, só com aritmética inteira (mesmo resultado das
+    contas em ponto flutuante). Returns: (x, y, w, h)
+    """
+    # Margens: 30% em cima, 20% embaixo, 10% dos lados
+    top_margin = h * 3 // 10
+    bottom_margin = h // 5
+    side_margin = w // 10
+    
+    # Área expandida
+    box_x = max(0, x - side_margin)
+    box_y = max(0, y - top_margin)
+    box_w = min(img_width - box_x, w + 2 * side_margin)
+    box_h = min(img_height - box_y, h + top_margin + bottom_margin)
+    
+    # Ajusta para a proporção 3x4 (w/h > 3/4 <=> 4w > 3h)
+    if 4 * box_w > 3 * box_h:
+        new_width = box_h * 3 // 4
+        box_x += (box_w - new_width) // 2
+        box_w = new_width
+    else:
+        new_height = box_w * 4 // 3
+        box_y += (box_h - new_height) // 2
+        box_h = new_height
+    
+    # Garante os limites
+    box_x = max(0, box_x)
+    box_y = max(0, box_y)
+    return box_x, box_y, min(img_width - box_x, box_w), min(img_height - box_y, box_h)
+
 class CPFValidator:
     """Classe para validação de CPF"""
     
     @staticmethod
     def clean_cpf(cpf: str) -> str:
         """Remove caracteres não numéricos do CPF"""
-        return re.sub(r'[^0-9]', '', cpf)
+        return _NON_DIGIT_RE.sub('', cpf)
     
     @staticmethod
     def validate_cpf(cpf: str) -> bool:
@@ -44,20 +204,17 @@ class CPFValidator:
         if cpf == cpf[0] * 11:
             return False
         
-        # Calcula primeiro dígito verificador
-        sum1 = sum(int(cpf[i]) * (10 - i) for i in range(9))
-        digit1 = 11 - (sum1 % 11)
-        if digit1 >= 10:
-            digit1 = 0
+        # Produto escalar dos dígitos (bytes ASCII) com os pesos, sem int() por dígito
+        digits = cpf.encode('ascii')
+        sum1 = sum(map(mul, digits, _CPF_W1)) - _CPF_W1_OFFSET
+        sum2 = sum(map(mul, digits, _CPF_W2)) - _CPF_W2_OFFSET
         
-        # Calcula segundo dígito verificador
-        sum2 = sum(int(cpf[i]) * (11 - i) for i in range(10))
-        digit2 = 11 - (sum2 % 11)
-        if digit2 >= 10:
-            digit2 = 0
+        # 11 - (soma % 11), com 10 e 11 virando 0
+        digit1 = (-sum1) % 11 % 10
+        digit2 = (-sum2) % 11 % 10
         
         # Verifica se os dígitos calculados conferem
-        return cpf[9] == str(digit1) and cpf[10] == str(digit2)
+        return digits[9] - 48 == digit1 and digits[10] - 48 == digit2
 
 class AdvancedFaceDetector:
     """Detector avançado de rostos com múltiplos métodos"""
@@ -65,160 +222,203 @@ class AdvancedFaceDetector:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
-        # Carrega diferentes classificadores Haar
-        self.face_cascades = []
+        # Com o YuNet disponível, uma única passada da rede substitui os cascades
+        # e as variantes melhoradas da imagem
+        self.yunet = None
+        if USE_YUNET:
+            try:
+                self.yunet = cv2.FaceDetectorYN.create(
+                    YUNET_MODEL, "", (320, 320), YUNET_SCORE_THRESHOLD,
+                    backend_id=cv2.dnn.DNN_BACKEND_OPENCV, target_id=cv2.dnn.DNN_TARGET_CPU
+                )
+                self.logger.info("Detector YuNet carregado")
+            except cv2.error as e:
+                self.logger.warning(f"Erro ao carregar o YuNet, usando Haar cascades: {e}")
         
-        # Classificador frontal padrão
-        try:
-            frontal_face = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            if not frontal_face.empty():
-                self.face_cascades.append(('frontal_default', frontal_face))
-        except:
-            pass
+        # Buffers reaproveitados entre chamadas (cinza e versão melhorada), para
+        # não alocar uma imagem nova por conversão
+        self._gray_buf = None
+        self._scratch_buf = None
         
-        # Classificador frontal alternativo
-        try:
-            frontal_alt = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_alt.xml')
-            if not frontal_alt.empty():
-                self.face_cascades.append(('frontal_alt', frontal_alt))
-        except:
-            pass
+        # Carrega diferentes classificadores Haar
+        self.face_cascades = []
+        self._executor = None
+        if self.yunet is not None:
+            return
         
-        # Classificador de perfil
-        try:
-            profile_face = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_profileface.xml')
-            if not profile_face.empty():
-                self.face_cascades.append(('profile', profile_face))
-        except:
-            pass
+        # Frontal padrão, frontal alternativo e perfil
+        for method_name, filename in CASCADE_FILES.items():
+            try:
+                cascade = cv2.CascadeClassifier(cv2.data.haarcascades + filename)
+                if not cascade.empty():
+                    self.face_cascades.append((method_name, cascade))
+            except:
+                pass
         
         self.logger.info(f"Carregados {len(self.face_cascades)} classificadores de face")
     
-    def detect_faces_multiple_methods(self, image: np.ndarray) -> List[Tuple[int, int, int, int, str]]:
+    def detect_faces_multiple_methods(self, image: np.ndarray) -> Tuple[np.ndarray, List[str]]:
         """
         Detecta faces usando múltiplos métodos
-        Returns: Lista de (x, y, w, h, method_name)
+        Returns: (caixas (N, 4) int32 com x, y, w, h, nomes dos métodos)
         """
-        all_faces = []
-        
         if image is None or image.size == 0:
-            return all_faces
+            return _NO_BOXES, []
+        
+        if self.yunet is not None:
+            return self.detect_faces_yunet(image)
         
         # Converte para escala de cinza
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        gray = _detection_input(self._to_gray(image))
         
         # Aplica diferentes métodos de detecção
+        all_boxes = []
+        all_methods = []
         for method_name, cascade in self.face_cascades:
             try:
                 # Parâmetros otimizados para cada método
-                if method_name == 'frontal_default':
-                    faces = cascade.detectMultiScale(
-                        gray, 
-                        scaleFactor=1.1, 
-                        minNeighbors=4, 
-                        minSize=(30, 30),
-                        maxSize=(500, 500)
-                    )
-                elif method_name == 'frontal_alt':
-                    faces = cascade.detectMultiScale(
-                        gray, 
-                        scaleFactor=1.05, 
-                        minNeighbors=3, 
-                        minSize=(25, 25),
-                        maxSize=(400, 400)
-                    )
-                elif method_name == 'profile':
-                    faces = cascade.detectMultiScale(
-                        gray, 
-                        scaleFactor=1.1, 
-                        minNeighbors=5, 
-                        minSize=(30, 30),
-                        maxSize=(300, 300)
-                    )
-                
-                # Adiciona faces encontradas
-                for (x, y, w, h) in faces:
-                    all_faces.append((x, y, w, h, method_name))
+                boxes = _as_boxes(cascade.detectMultiScale(gray, **CASCADE_PARAMS[method_name]))
+                all_boxes.append(boxes)
+                all_methods.extend([method_name] * len(boxes))
                     
             except Exception as e:
                 self.logger.warning(f"Erro no método {method_name}: {e}")
                 continue
         
         # Remove duplicatas (faces muito próximas)
-        unique_faces = self.remove_duplicate_faces(all_faces)
+        unique_boxes, unique_methods = self.remove_duplicate_faces(_stack_boxes(all_boxes), all_methods)
         
-        self.logger.info(f"Detectadas {len(unique_faces)} faces únicas usando {len(self.face_cascades)} métodos")
-        return unique_faces
+        self.logger.info(f"Detectadas {len(unique_boxes)} faces únicas usando {len(self.face_cascades)} métodos")
+        return unique_boxes, unique_methods
     
-    def remove_duplicate_faces(self, faces: List[Tuple[int, int, int, int, str]]) -> List[Tuple[int, int, int, int, str]]:
-        """Remove faces duplicadas (muito próximas)"""
-        if len(faces) <= 1:
-            return faces
+    def detect_faces_in_variants(self, images: List[np.ndarray]) -> List[Tuple[np.ndarray, List[str]]]:
+        """
+        Detecta faces em várias versões de uma imagem, uma versão por vez, com os
+        cascades em paralelo. O resultado de cada versão é o mesmo de
+        detect_faces_multiple_methods (mesma ordem, duplicatas removidas por versão)
+        """
+        if self.yunet is not None or not self.face_cascades:
+            return [self.detect_faces_multiple_methods(img) for img in images]
         
-        unique_faces = []
+        # Um cascade por thread: cada instância só é usada por uma tarefa de cada
+        # vez (a versão seguinte só é submetida depois que a atual termina)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.face_cascades))
         
-        for face in faces:
-            x1, y1, w1, h1, method1 = face
-            is_duplicate = False
+        results = []
+        for image in images:
+            if image is None or image.size == 0:
+                results.append((_NO_BOXES, []))
+                continue
             
-            for unique_face in unique_faces:
-                x2, y2, w2, h2, method2 = unique_face
-                
-                # Calcula sobreposição
-                overlap_x = max(0, min(x1 + w1, x2 + w2) - max(x1, x2))
-                overlap_y = max(0, min(y1 + h1, y2 + h2) - max(y1, y2))
-                overlap_area = overlap_x * overlap_y
-                
-                area1 = w1 * h1
-                area2 = w2 * h2
-                
-                # Se sobreposição > 50%, considera duplicata
-                if overlap_area > 0.5 * min(area1, area2):
-                    is_duplicate = True
-                    break
+            # O buffer de cinza é reaproveitado: a versão termina antes da próxima
+            gray = self._to_gray(image)
+            futures = [(method_name, self._executor.submit(_detect_with_cascade, cascade, gray, method_name))
+                       for method_name, cascade in self.face_cascades]
             
-            if not is_duplicate:
-                unique_faces.append(face)
+            all_boxes = []
+            all_methods = []
+            for method_name, future in futures:
+                try:
+                    boxes = _as_boxes(future.result())
+                    all_boxes.append(boxes)
+                    all_methods.extend([method_name] * len(boxes))
+                except Exception as e:
+                    self.logger.warning(f"Erro no método {method_name}: {e}")
+            results.append(self.remove_duplicate_faces(_stack_boxes(all_boxes), all_methods))
+        return results
+    
+    def _to_gray(self, image: np.ndarray) -> np.ndarray:
+        """
+        Escala de cinza uint8 no buffer reaproveitado (válida até a próxima
+        chamada); imagens já em cinza são devolvidas como estão
+        """
+        if image.ndim == 2:
+            return image
+        self._gray_buf = _reuse_buffer(self._gray_buf, image.shape[:2])
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._gray_buf)
+        return self._gray_buf
+    
+    def __del__(self):
+        """Encerra o pool de detecção"""
+        executor = getattr(self, "_executor", None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+    
+    def detect_faces_yunet(self, image: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+        """
+        Detecta faces com uma única passada do YuNet (a NMS já vem da rede)
+        Returns: (caixas (N, 4) int32, ['yunet'] * N)
+        """
+        if len(image.shape) == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        
+        self.yunet.setInputSize((image.shape[1], image.shape[0]))
+        _, detections = self.yunet.detect(image)
+        if detections is None:
+            return _NO_BOXES, []
+        
+        boxes = detections[:, :4].astype(np.int32)
+        # As caixas do YuNet podem sair parcialmente da imagem
+        np.maximum(boxes[:, :2], 0, out=boxes[:, :2])
         
-        return unique_faces
+        self.logger.info(f"Detectadas {len(boxes)} faces com YuNet")
+        return boxes, ['yunet'] * len(boxes)
     
-    def enhance_image_for_detection(self, image: np.ndarray) -> List[np.ndarray]:
+    def remove_duplicate_faces(self, boxes: np.ndarray, methods: List[str]) -> Tuple[np.ndarray, List[str]]:
         """
-        Cria versões melhoradas da imagem para detecção
+        Remove faces duplicadas (muito próximas): na ordem recebida, uma face é
+        descartada se a sobreposição com alguma já mantida passa de 50% da menor área
         """
-        enhanced_images = [image]  # Imagem original
+        if len(boxes) <= 1:
+            return boxes, methods
+        
+        b = boxes.astype(np.int64)
+        x1, y1 = b[:, 0], b[:, 1]
+        x2, y2 = x1 + b[:, 2], y1 + b[:, 3]
+        areas = b[:, 2] * b[:, 3]
+        
+        # Sobreposição de todos os pares de uma vez (broadcasting N x N)
+        overlap_x = np.clip(np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]), 0, None)
+        overlap_y = np.clip(np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]), 0, None)
+        duplicate = overlap_x * overlap_y > 0.5 * np.minimum(areas[:, None], areas[None, :])
+        
+        # Passada gulosa: só compara com as faces já mantidas
+        kept = np.zeros(len(boxes), dtype=bool)
+        for i in range(len(boxes)):
+            kept[i] = not (duplicate[i] & kept).any()
+        
+        return boxes[kept], [method for method, keep in zip(methods, kept) if keep]
+    
+    def enhance_image_for_detection(self, image: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Cria a versão de reserva da imagem (contraste e brilho ajustados, em escala
+        de cinza), usada só quando a original não tem nenhuma face. Os cascades já
+        toleram variações moderadas de iluminação; o YuNet dispensa a reserva
+        """
+        if self.yunet is not None:
+            return None
         
         try:
-            # Versão com equalização de histograma
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
-            equalized = cv2.equalizeHist(gray)
-            if len(image.shape) == 3:
-                equalized_bgr = cv2.cvtColor(equalized, cv2.COLOR_GRAY2BGR)
-                enhanced_images.append(equalized_bgr)
-            else:
-                enhanced_images.append(equalized)
-            
-            # Versão com ajuste de contraste
-            alpha = 1.2  # Contraste
-            beta = 10    # Brilho
-            contrast_adjusted = cv2.convertScaleAbs(image, alpha=alpha, beta=beta)
-            enhanced_images.append(contrast_adjusted)
-            
-            # Versão com desfoque gaussiano leve (remove ruído)
-            blurred = cv2.GaussianBlur(image, (3, 3), 0)
-            enhanced_images.append(blurred)
-            
+            # Escrita no buffer de rascunho, válida até a próxima chamada
+            gray = self._to_gray(image)
+            self._scratch_buf = _reuse_buffer(self._scratch_buf, gray.shape)
+            cv2.convertScaleAbs(gray, dst=self._scratch_buf, alpha=1.2, beta=10)
+            return self._scratch_buf
         except Exception as e:
             self.logger.warning(f"Erro ao melhorar imagem: {e}")
-        
-        return enhanced_images
+            return None
 
 class DocumentProcessor:
     """Processador principal de documentos com detecção avançada"""
     
-    def __init__(self, region='us-east-1'):
+    def __init__(self, region='us-east-1', s3_bucket: Optional[str] = None):
         self.region = region
+        self.s3_bucket = s3_bucket
+        # Uma sessão para todos os clientes (os clientes boto3 são thread-safe)
+        self.session = boto3.session.Session(region_name=region)
         self.textract_client = None
+        self.s3_client = None
         self.logger = logging.getLogger(__name__)
         self.face_detector = AdvancedFaceDetector()
         
@@ -226,6 +426,11 @@ class DocumentProcessor:
         self.max_image_size = 2048
         self.max_render_resolution = 1.5
         
+        # Cache LRU das páginas renderizadas: (página, escala, cinza) -> imagem,
+        # válido só para o documento em _page_cache_doc
+        self._page_cache = OrderedDict()
+        self._page_cache_doc = None
+        
         # Padrões para identificação de tipos de documento
         self.document_patterns = {
             'RG': [
@@ -268,11 +473,48 @@ class DocumentProcessor:
                 r'identidade[:\s]*(\d+\.?\d+\.?\d+[-\.]?\d*)'
             ]
         }
+        
+        # Compila todos os padrões uma única vez
+        self.document_patterns = {
+            doc_type: [re.compile(p, re.IGNORECASE) for p in patterns]
+            for doc_type, patterns in self.document_patterns.items()
+        }
+        self.info_patterns = {
+            field: [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in patterns]
+            for field, patterns in self.info_patterns.items()
+        }
+        
+        # Com o Hyperscan, uma passada no texto diz quais padrões de tipo aparecem;
+        # só esses são contados com findall
+        self._doc_type_db = None
+        if hyperscan is not None:
+            self._init_doc_type_db()
+    
+    def _init_doc_type_db(self):
+        """Compila todos os padrões de tipo de documento em um banco do Hyperscan"""
+        # O id de cada padrão é a sua posição na ordem de document_patterns
+        expressions = [pattern.pattern.encode('utf-8')
+                       for patterns in self.document_patterns.values()
+                       for pattern in patterns]
+        flags = hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_SINGLEMATCH
+        try:
+            db = hyperscan.Database()
+            db.compile(
+                expressions=expressions,
+                ids=list(range(len(expressions))),
+                elements=len(expressions),
+                flags=[flags] * len(expressions),
+            )
+            self._doc_type_db = db
+        except Exception as e:
+            self.logger.warning(f"Hyperscan indisponível, usando re: {e}")
     
     def initialize_textract(self):
         """Inicializa o cliente Textract"""
         try:
-            self.textract_client = boto3.client('textract', region_name=self.region)
+            self.textract_client = self.session.client('textract')
+            if self.s3_bucket:
+                self.s3_client = self.session.client('s3')
             self.logger.info("Cliente Textract inicializado com sucesso")
         except NoCredentialsError:
             self.logger.error("Credenciais AWS não encontradas")
@@ -280,39 +522,51 @@ class DocumentProcessor:
         except Exception as e:
             self.logger.error(f"Erro ao inicializar Textract: {e}")
             raise
-    def extract_text_with_textract(self, pdf_path: str) -> Tuple[str, Dict]:
-        """Extrai texto usando AWS Textract"""
+    
+    def extract_text_with_textract(self, pdf_path: str, doc: Optional[fitz.Document] = None) -> Tuple[str, Dict]:
+        """Extrai texto usando AWS Textract (doc: PDF já aberto, opcional)"""
         if not self.textract_client:
             self.initialize_textract()
         
         try:
-            with open(pdf_path, 'rb') as document:
-                document_bytes = document.read()
+            if doc is not None:
+                num_pages = len(doc)
+            else:
+                with fitz.open(pdf_path) as doc:
+                    num_pages = len(doc)
             
-            # Análise de texto simples
-            response = self.textract_client.detect_document_text(
-                Document={'Bytes': document_bytes}
-            )
+            if num_pages > TEXTRACT_ASYNC_MIN_PAGES:
+                if self.s3_bucket:
+                    return self.extract_text_with_textract_async(pdf_path)
+                self.logger.warning(f"PDF com {num_pages} páginas sem bucket S3; usando a API síncrona")
             
-            # Extrai texto
-            text = ""
-            for block in response['Blocks']:
-                if block['BlockType'] == 'LINE':
-                    text += block['Text'] + '\n'
+            with open(pdf_path, 'rb') as document:
+                document_bytes = document.read()
             
-            # Análise de formulários estruturados
-            try:
-                form_response = self.textract_client.analyze_document(
+            # Texto simples e formulários estruturados em paralelo
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                text_future = executor.submit(
+                    self.textract_client.detect_document_text,
+                    Document={'Bytes': document_bytes}
+                )
+                form_future = executor.submit(
+                    self.textract_client.analyze_document,
                     Document={'Bytes': document_bytes},
                     FeatureTypes=['FORMS']
                 )
                 
-                # Extrai campos estruturados
-                structured_data = self.extract_structured_data(form_response)
+                response = text_future.result()
                 
-            except Exception as e:
-                self.logger.warning(f"Erro na análise de formulários: {e}")
-                structured_data = {}
+                # Extrai texto
+                text = ''.join(block['Text'] + '\n' for block in response['Blocks']
+                               if block['BlockType'] == 'LINE')
+                
+                try:
+                    # Extrai campos estruturados
+                    structured_data = self.extract_structured_data(form_future.result())
+                except Exception as e:
+                    self.logger.warning(f"Erro na análise de formulários: {e}")
+                    structured_data = {}
             
             return text, structured_data
             
@@ -323,47 +577,107 @@ class DocumentProcessor:
             self.logger.error(f"Erro ao processar documento: {e}")
             raise
     
+    def extract_text_with_textract_async(self, pdf_path: str) -> Tuple[str, Dict]:
+        """
+        Extrai texto e formulários de PDFs com várias páginas pela API assíncrona
+        (start_document_analysis), enviando o arquivo a um prefixo temporário no S3
+        """
+        key = f"{TEXTRACT_S3_PREFIX}{uuid.uuid4().hex}/{os.path.basename(pdf_path)}"
+        self.s3_client.upload_file(pdf_path, self.s3_bucket, key)
+        
+        try:
+            # A análise com FORMS também devolve os blocos LINE do texto
+            job_id = self.textract_client.start_document_analysis(
+                DocumentLocation={'S3Object': {'Bucket': self.s3_bucket, 'Name': key}},
+                FeatureTypes=['FORMS']
+            )['JobId']
+            self.logger.info(f"Job assíncrono do Textract iniciado: {job_id}")
+            
+            deadline = time.monotonic() + TEXTRACT_TIMEOUT
+            while True:
+                response = self.textract_client.get_document_analysis(JobId=job_id)
+                status = response['JobStatus']
+                if status != 'IN_PROGRESS':
+                    break
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Job do Textract {job_id} não terminou em {TEXTRACT_TIMEOUT}s")
+                time.sleep(TEXTRACT_POLL_INTERVAL)
+            
+            if status == 'FAILED':
+                raise RuntimeError(f"Job do Textract {job_id} falhou: {response.get('StatusMessage', '')}")
+            if status == 'PARTIAL_SUCCESS':
+                self.logger.warning(f"Job do Textract {job_id} concluído parcialmente")
+            
+            # Resultado paginado
+            blocks = list(response['Blocks'])
+            while 'NextToken' in response:
+                response = self.textract_client.get_document_analysis(
+                    JobId=job_id, NextToken=response['NextToken']
+                )
+                blocks.extend(response['Blocks'])
+        finally:
+            try:
+                self.s3_client.delete_object(Bucket=self.s3_bucket, Key=key)
+            except Exception as e:
+                self.logger.warning(f"Erro ao remover {key} do S3: {e}")
+        
+        text = ''.join(block['Text'] + '\n' for block in blocks if block['BlockType'] == 'LINE')
+        
+        try:
+            structured_data = self.extract_structured_data({'Blocks': blocks})
+        except Exception as e:
+            self.logger.warning(f"Erro na análise de formulários: {e}")
+            structured_data = {}
+        
+        return text, structured_data
+    
     def extract_structured_data(self, response: Dict) -> Dict[str, str]:
         """Extrai dados estruturados da resposta do Textract"""
         structured_data = {}
         
-        # Mapeia blocos por ID
-        blocks = {block['Id']: block for block in response['Blocks']}
-        
-        # Processa pares chave-valor
+        # Uma passada só: separa chaves, valores e palavras por ID
+        keys = []
+        values = {}
+        words = {}
         for block in response['Blocks']:
-            if block['BlockType'] == 'KEY_VALUE_SET':
+            block_type = block['BlockType']
+            if block_type == 'WORD':
+                words[block['Id']] = block
+            elif block_type == 'KEY_VALUE_SET':
                 if 'KEY' in block.get('EntityTypes', []):
-                    # É uma chave
-                    key_text = self.get_text_from_block(block, blocks)
-                    
-                    # Procura o valor correspondente
-                    if 'Relationships' in block:
-                        for relationship in block['Relationships']:
-                            if relationship['Type'] == 'VALUE':
-                                for value_id in relationship['Ids']:
-                                    if value_id in blocks:
-                                        value_block = blocks[value_id]
-                                        value_text = self.get_text_from_block(value_block, blocks)
-                                        
-                                        # Limpa e armazena
-                                        clean_key = re.sub(r'[:\s]+$', '', key_text.lower().strip())
-                                        structured_data[clean_key] = value_text.strip()
+                    keys.append(block)
+                else:
+                    values[block['Id']] = block
+        
+        # Processa pares chave-valor
+        for block in keys:
+            # É uma chave
+            key_text = self.get_text_from_block(block, words)
+            
+            # Procura o valor correspondente
+            for relationship in block.get('Relationships', []):
+                if relationship['Type'] == 'VALUE':
+                    for value_id in relationship['Ids']:
+                        value_block = values.get(value_id)
+                        if value_block is not None:
+                            value_text = self.get_text_from_block(value_block, words)
+                            
+                            # Limpa e armazena
+                            clean_key = key_text.lower().strip().rstrip(_KEY_TRAILING_CHARS)
+                            structured_data[clean_key] = value_text.strip()
         
         return structured_data
     
     def get_text_from_block(self, block: Dict, blocks: Dict) -> str:
         """Extrai texto de um bloco"""
-        text = ""
-        if 'Relationships' in block:
-            for relationship in block['Relationships']:
-                if relationship['Type'] == 'CHILD':
-                    for child_id in relationship['Ids']:
-                        if child_id in blocks:
-                            child_block = blocks[child_id]
-                            if child_block['BlockType'] == 'WORD':
-                                text += child_block['Text'] + ' '
-        return text.strip()
+        parts = []
+        for relationship in block.get('Relationships', []):
+            if relationship['Type'] == 'CHILD':
+                for child_id in relationship['Ids']:
+                    child_block = blocks.get(child_id)
+                    if child_block is not None and child_block['BlockType'] == 'WORD':
+                        parts.append(child_block['Text'])
+        return ' '.join(parts).strip()
     
     def resize_image_if_needed(self, image: np.ndarray) -> np.ndarray:
         """Redimensiona imagem se for muito grande"""
@@ -384,13 +698,14 @@ class DocumentProcessor:
         
         return image
     
-    def extract_images_from_pdf(self, pdf_path: str) -> List[np.ndarray]:
-        """Extrai imagens embutidas do PDF"""
+    def extract_images_from_pdf(self, pdf_path: str, doc: Optional[fitz.Document] = None) -> List[np.ndarray]:
+        """Extrai imagens embutidas do PDF (doc: PDF já aberto, opcional)"""
         images = []
-        doc = None
+        owns_doc = doc is None
         
         try:
-            doc = fitz.open(pdf_path)
+            if owns_doc:
+                doc = fitz.open(pdf_path)
             
             for page_num in range(min(len(doc), 5)):
                 page = doc.load_page(page_num)
@@ -407,9 +722,7 @@ class DocumentProcessor:
                             continue
                         
                         if pix.n - pix.alpha < 4:
-                            img_data = pix.tobytes("png")
-                            nparr = np.frombuffer(img_data, np.uint8)
-                            cv_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                            cv_img = pixmap_to_bgr(pix)
                             
                             if cv_img is not None and cv_img.shape[0] > 50 and cv_img.shape[1] > 50:
                                 cv_img = self.resize_image_if_needed(cv_img)
@@ -424,46 +737,37 @@ class DocumentProcessor:
                         self.logger.warning(f"Erro ao extrair imagem {img_index} da página {page_num}: {e}")
                         continue
                 
-                gc.collect()
-                
                 if len(images) >= 10:
                     break
             
         except Exception as e:
             self.logger.error(f"Erro ao extrair imagens do PDF: {e}")
         finally:
-            if doc:
+            if owns_doc and doc:
                 doc.close()
         
         return images
     
-    def extract_full_page_images(self, pdf_path: str) -> List[np.ndarray]:
+    def extract_full_page_images(self, pdf_path: str, doc: Optional[fitz.Document] = None) -> List[np.ndarray]:
         """
         Extrai imagens completas das páginas do documento
         Usado como fallback quando não encontra rostos
         """
         page_images = []
-        doc = None
+        owns_doc = doc is None
         
         try:
-            doc = fitz.open(pdf_path)
+            if owns_doc:
+                doc = fitz.open(pdf_path)
             self.logger.info(f"Extraindo imagens completas de {min(len(doc), 3)} páginas")
             
             for page_num in range(min(len(doc), 3)):  # Máximo 3 páginas
-                page = doc.load_page(page_num)
-                
-                # Renderiza com resolução moderada
-                mat = fitz.Matrix(1.2, 1.2)  # Resolução menor para economizar memória
-                pix = page.get_pixmap(matrix=mat)
+                # Renderiza com resolução moderada (menor para economizar memória)
+                cv_img = self._render_page(doc, page_num, 1.2)
                 
-                if pix.width * pix.height > 8000000:  # Máximo 8MP para páginas completas
+                if cv_img.shape[0] * cv_img.shape[1] > 8000000:  # Máximo 8MP para páginas completas
                     self.logger.warning(f"Página {page_num} muito grande, reduzindo resolução")
-                    mat = fitz.Matrix(0.8, 0.8)  # Resolução ainda menor
-                    pix = page.get_pixmap(matrix=mat)
-                
-                img_data = pix.tobytes("png")
-                nparr = np.frombuffer(img_data, np.uint8)
-                cv_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                    cv_img = self._render_page(doc, page_num, 0.8)  # Resolução ainda menor
                 
                 if cv_img is not None:
                     # Redimensiona se necessário
@@ -475,15 +779,12 @@ class DocumentProcessor:
                         page_images.append(cropped_page)
                     else:
                         page_images.append(cv_img)
-                
-                pix = None
-                cv_img = None
-                gc.collect()
             
         except Exception as e:
             self.logger.error(f"Erro ao extrair páginas completas: {e}")
         finally:
-            if doc:
+            if owns_doc and doc:
+                self.clear_page_cache()
                 doc.close()
         
         return page_images
@@ -499,13 +800,15 @@ class DocumentProcessor:
             # Aplica threshold para encontrar conteúdo
             _, thresh = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY_INV)
             
-            # Encontra contornos
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            # Projeções por coluna e por linha: a caixa externa do conteúdo sai
+            # do primeiro e do último índice não nulo de cada uma
+            cols = np.flatnonzero(cv2.reduce(thresh, 0, cv2.REDUCE_MAX).ravel())
+            rows = np.flatnonzero(cv2.reduce(thresh, 1, cv2.REDUCE_MAX).ravel())
             
-            if contours:
-                # Encontra o maior contorno (conteúdo principal)
-                largest_contour = max(contours, key=cv2.contourArea)
-                x, y, w, h = cv2.boundingRect(largest_contour)
+            if cols.size:
+                x, y = int(cols[0]), int(rows[0])
+                w = int(cols[-1]) - x + 1
+                h = int(rows[-1]) - y + 1
                 
                 # Adiciona margem de 5%
                 margin_x = int(w * 0.05)
@@ -536,12 +839,21 @@ class DocumentProcessor:
         
         return None
     
-    def detect_faces_advanced(self, images: List[np.ndarray]) -> List[Tuple[np.ndarray, str, float]]:
+    def detect_faces_advanced(self, images: List[np.ndarray],
+                              color_source: Optional[Callable[[int], np.ndarray]] = None,
+                              stop_confidence: Optional[float] = None) -> List[Tuple[np.ndarray, str, float]]:
         """
-        Detecta faces usando métodos avançados
+        Detecta faces usando métodos avançados. Se as imagens estão em escala de
+        cinza, color_source(índice) fornece a versão colorida (mesmo tamanho) de
+        onde a face é recortada; ela só é pedida para imagens com face. Com
+        stop_confidence, as imagens seguintes são ignoradas assim que uma face da
+        imagem original passa dessa confiança
         Returns: Lista de (face_image, detection_method, confidence_score)
         """
-        all_faces = []
+        crops = []
+        labels = []
+        confidences = []
+        color_images = {}
         
         for img_idx, img in enumerate(images):
             if img is None or img.size == 0:
@@ -549,42 +861,63 @@ class DocumentProcessor:
             
             self.logger.info(f"Analisando imagem {img_idx + 1}/{len(images)} para detecção de faces")
             
-            # Cria versões melhoradas da imagem
-            enhanced_images = self.face_detector.enhance_image_for_detection(img)
+            # Detecta faces na imagem original (cascades em paralelo); a versão
+            # melhorada só é criada e analisada se nada for encontrado
+            enh_idx = 0
+            boxes, methods = self.face_detector.detect_faces_in_variants([img])[0]
+            if not len(boxes):
+                enhanced_img = self.face_detector.enhance_image_for_detection(img)
+                if enhanced_img is not None:
+                    enh_idx = 1
+                    boxes, methods = self.face_detector.detect_faces_in_variants([enhanced_img])[0]
             
-            for enh_idx, enhanced_img in enumerate(enhanced_images):
-                # Detecta faces com múltiplos métodos
-                faces = self.face_detector.detect_faces_multiple_methods(enhanced_img)
-                
-                for face_data in faces:
-                    x, y, w, h, method = face_data
-                    
-                    # Calcula score de confiança baseado no tamanho e método
-                    face_area = w * h
-                    confidence = face_area / (enhanced_img.shape[0] * enhanced_img.shape[1])
-                    
-                    # Bonus para métodos mais confiáveis
-                    if method == 'frontal_default':
-                        confidence *= 1.2
-                    elif method == 'frontal_alt':
-                        confidence *= 1.1
-                    
-                    # Bonus para imagem original (não melhorada)
-                    if enh_idx == 0:
-                        confidence *= 1.1
-                    
-                    # Extrai e processa a face
-                    try:
-                        face_region = self.crop_face_3x4(enhanced_img, x, y, w, h)
-                        if face_region is not None:
-                            detection_info = f"{method}_enh{enh_idx}"
-                            all_faces.append((face_region, detection_info, confidence))
-                    except Exception as e:
-                        self.logger.warning(f"Erro ao extrair face: {e}")
-                        continue
+            if not len(boxes):
+                continue
+            
+            # Score de confiança baseado no tamanho e no método, para todas as faces
+            # de uma vez
+            conf = boxes[:, 2].astype(np.float64) * boxes[:, 3] / (img.shape[0] * img.shape[1])
+            method_arr = np.array(methods)
+            for method_name, bonus in METHOD_CONFIDENCE_BONUS.items():
+                conf *= np.where(method_arr == method_name, bonus, 1.0)
+            
+            # Bonus para imagem original (não melhorada)
+            if enh_idx == 0:
+                conf *= 1.1
+            
+            # Extrai e processa a face (da imagem colorida original; a versão
+            # melhorada tem o mesmo tamanho e serve só à detecção)
+            crop_source = img
+            if color_source is not None and img.ndim == 2:
+                try:
+                    if img_idx not in color_images:
+                        color_images[img_idx] = color_source(img_idx)
+                except Exception as e:
+                    self.logger.warning(f"Erro ao extrair face: {e}")
+                    continue
+                if color_images[img_idx] is not None:
+                    crop_source = color_images[img_idx]
+            
+            first_new = len(confidences)
+            for (x, y, w, h), method, confidence in zip(boxes.tolist(), methods, conf):
+                try:
+                    face_region = self.crop_face_3x4(crop_source, x, y, w, h)
+                    if face_region is not None:
+                        crops.append(face_region)
+                        labels.append(f"{method}_enh{enh_idx}")
+                        confidences.append(confidence)
+                except Exception as e:
+                    self.logger.warning(f"Erro ao extrair face: {e}")
+                    continue
+            
+            new_confidences = confidences[first_new:]
+            if stop_confidence is not None and enh_idx == 0 and new_confidences and max(new_confidences) > stop_confidence:
+                self.logger.info(f"Face com confiança acima de {stop_confidence} na imagem {img_idx + 1}; encerrando a busca")
+                break
         
-        # Ordena por confiança (maior primeiro)
-        all_faces.sort(key=lambda x: x[2], reverse=True)
+        # Ordena por confiança (maior primeiro; empates mantêm a ordem de detecção)
+        order = np.argsort(-np.array(confidences, dtype=np.float64), kind='stable')
+        all_faces = [(crops[i], labels[i], float(confidences[i])) for i in order]
         
         self.logger.info(f"Total de faces detectadas: {len(all_faces)}")
         return all_faces
@@ -593,38 +926,9 @@ class DocumentProcessor:
         """Corta a imagem para formato 3x4 focando no rosto"""
         try:
             img_height, img_width = image.shape[:2]
-            aspect_ratio = 3.0 / 4.0
-            
-            # Margens otimizadas
-            top_margin = int(h * 0.3)
-            bottom_margin = int(h * 0.2)
-            side_margin = int(w * 0.1)
-            
-            # Calcular nova área expandida
-            expanded_x = max(0, x - side_margin)
-            expanded_y = max(0, y - top_margin)
-            expanded_w = min(img_width - expanded_x, w + 2 * side_margin)
-            expanded_h = min(img_height - expanded_y, h + top_margin + bottom_margin)
-            
-            # Ajustar para proporção 3x4
-            current_ratio = expanded_w / expanded_h
-            
-            if current_ratio > aspect_ratio:
-                new_width = int(expanded_h * aspect_ratio)
-                width_diff = expanded_w - new_width
-                expanded_x += width_diff // 2
-                expanded_w = new_width
-            else:
-                new_height = int(expanded_w / aspect_ratio)
-                height_diff = expanded_h - new_height
-                expanded_y += height_diff // 2
-                expanded_h = new_height
-            
-            # Garantir limites
-            expanded_x = max(0, expanded_x)
-            expanded_y = max(0, expanded_y)
-            expanded_w = min(img_width - expanded_x, expanded_w)
-            expanded_h = min(img_height - expanded_y, expanded_h)
+            expanded_x, expanded_y, expanded_w, expanded_h = _compute_3x4_box(
+                img_height, img_width, int(x), int(y), int(w), int(h)
+            )
             
             # Extrair região
             cropped_face = image[expanded_y:expanded_y + expanded_h, 
@@ -639,16 +943,23 @@ class DocumentProcessor:
             self.logger.error(f"Erro ao cortar face 3x4: {e}")
         
         return None
-    def detect_best_photo_or_fallback(self, images: List[np.ndarray], pdf_path: str) -> Tuple[Optional[np.ndarray], str]:
+    def detect_best_photo_or_fallback(self, images: List[np.ndarray], pdf_path: str,
+                                      doc: Optional[fitz.Document] = None) -> Tuple[Optional[np.ndarray], str]:
         """
         Detecta a melhor foto com rosto ou usa fallback para imagem completa
         Returns: (image, extraction_type)
         """
-        extraction_type = "none"
+        # O PDF é aberto uma vez e reaproveitado por todas as etapas
+        if doc is None:
+            with fitz.open(pdf_path) as doc:
+                try:
+                    return self.detect_best_photo_or_fallback(images, pdf_path, doc)
+                finally:
+                    self.clear_page_cache()
         
         # Primeiro: tenta detectar rostos com métodos avançados
         print("🔍 Iniciando detecção avançada de rostos...")
-        faces_detected = self.detect_faces_advanced(images)
+        faces_detected = self.detect_faces_advanced(images, stop_confidence=FACE_EARLY_EXIT_CONFIDENCE)
         
         if faces_detected:
             best_face, method, confidence = faces_detected[0]
@@ -660,9 +971,14 @@ class DocumentProcessor:
         # Segundo: tenta detectar rostos em páginas renderizadas
         print("🔍 Procurando rostos em páginas renderizadas...")
         try:
-            rendered_images = self.extract_faces_from_rendered_pages(pdf_path)
+            # Detecção nas páginas em cinza; só a página com face é renderizada em cor
+            rendered_images, page_nums = self.render_pages_for_detection(pdf_path, gray=True, doc=doc)
             if rendered_images:
-                rendered_faces = self.detect_faces_advanced(rendered_images)
+                rendered_faces = self.detect_faces_advanced(
+                    rendered_images,
+                    color_source=lambda idx: self.render_page_color(pdf_path, page_nums[idx], doc),
+                    stop_confidence=FACE_EARLY_EXIT_CONFIDENCE
+                )
                 if rendered_faces:
                     best_face, method, confidence = rendered_faces[0]
                     print(f"✅ Rosto encontrado em página renderizada com {method} (confiança: {confidence:.3f})")
@@ -680,7 +996,7 @@ class DocumentProcessor:
         # Terceiro: fallback para imagem completa do documento
         print("📄 Extraindo imagem completa do documento como fallback...")
         try:
-            page_images = self.extract_full_page_images(pdf_path)
+            page_images = self.extract_full_page_images(pdf_path, doc)
             if page_images:
                 # Seleciona a primeira página (geralmente a principal)
                 best_page = page_images[0]
@@ -693,36 +1009,78 @@ class DocumentProcessor:
         print("❌ Não foi possível extrair nenhuma imagem")
         return None, "none"
     
-    def extract_faces_from_rendered_pages(self, pdf_path: str) -> List[np.ndarray]:
-        """Extrai faces das páginas renderizadas"""
+    def _render_page(self, doc: fitz.Document, page_num: int, scale: float, gray: bool = False) -> np.ndarray:
+        """
+        Renderiza uma página em BGR (ou escala de cinza) na escala pedida, com cache
+        LRU por documento aberto. Se só houver no cache uma renderização maior da
+        mesma página, ela é reduzida com cv2.resize em vez de renderizar de novo
+        """
+        if doc is not self._page_cache_doc:
+            self.clear_page_cache()
+            self._page_cache_doc = doc
+        
+        key = (page_num, scale, gray)
+        image = self._page_cache.get(key)
+        if image is not None:
+            self._page_cache.move_to_end(key)
+            return image
+        
+        page = doc.load_page(page_num)
+        mat = fitz.Matrix(scale, scale)
+        
+        larger = [(cached_scale, cached) for (num, cached_scale, cached_gray), cached in self._page_cache.items()
+                  if num == page_num and cached_gray == gray and cached_scale > scale]
+        if larger:
+            # Mesmo tamanho que a renderização direta teria
+            target = (page.rect * mat).irect
+            _, cached = min(larger, key=lambda item: item[0])
+            image = cv2.resize(cached, (target.width, target.height), interpolation=cv2.INTER_AREA)
+        elif gray:
+            pix = page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False)
+            image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+        else:
+            image = pixmap_to_bgr(page.get_pixmap(matrix=mat, colorspace=fitz.csRGB, alpha=False))
+        
+        self._page_cache[key] = image
+        if len(self._page_cache) > PAGE_CACHE_SIZE:
+            self._page_cache.popitem(last=False)
+        return image
+    
+    def clear_page_cache(self):
+        """Descarta as páginas renderizadas em cache"""
+        self._page_cache.clear()
+        self._page_cache_doc = None
+    
+    def render_page_for_detection(self, doc: fitz.Document, page_num: int, gray: bool = True) -> Optional[np.ndarray]:
+        """
+        Renderiza uma página para a detecção de faces, direto em escala de cinza
+        (1 canal) ou em BGR. None se a página for grande demais
+        """
+        cv_img = self._render_page(doc, page_num, self.max_render_resolution, gray)
+        
+        if cv_img.shape[0] * cv_img.shape[1] > 6000000:
+            self.logger.warning(f"Página {page_num} muito grande, pulando")
+            return None
+        
+        return self.resize_image_if_needed(cv_img)
+    
+    def render_pages_for_detection(self, pdf_path: str, gray: bool = True,
+                                   doc: Optional[fitz.Document] = None) -> Tuple[List[np.ndarray], List[int]]:
+        """Renderiza até 3 páginas para a detecção. Returns: (imagens, números das páginas)"""
         faces = []
-        doc = None
+        page_nums = []
+        owns_doc = doc is None
         
         try:
-            doc = fitz.open(pdf_path)
+            if owns_doc:
+                doc = fitz.open(pdf_path)
             
             for page_num in range(min(len(doc), 3)):
-                page = doc.load_page(page_num)
-                
-                mat = fitz.Matrix(self.max_render_resolution, self.max_render_resolution)
-                pix = page.get_pixmap(matrix=mat)
-                
-                if pix.width * pix.height > 6000000:
-                    self.logger.warning(f"Página {page_num} muito grande, pulando")
-                    pix = None
-                    continue
-                
-                img_data = pix.tobytes("png")
-                nparr = np.frombuffer(img_data, np.uint8)
-                cv_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                cv_img = self.render_page_for_detection(doc, page_num, gray)
                 
                 if cv_img is not None:
-                    cv_img = self.resize_image_if_needed(cv_img)
                     faces.append(cv_img)
-                
-                pix = None
-                cv_img = None
-                gc.collect()
+                    page_nums.append(page_num)
                 
                 if len(faces) >= 3:
                     break
@@ -730,15 +1088,37 @@ class DocumentProcessor:
         except Exception as e:
             self.logger.error(f"Erro ao extrair faces das páginas renderizadas: {e}")
         finally:
-            if doc:
+            if owns_doc and doc:
+                self.clear_page_cache()
                 doc.close()
         
-        return faces
+        return faces, page_nums
+    
+    def extract_faces_from_rendered_pages(self, pdf_path: str, gray: bool = True,
+                                          doc: Optional[fitz.Document] = None) -> List[np.ndarray]:
+        """Extrai faces das páginas renderizadas (em escala de cinza por padrão)"""
+        return self.render_pages_for_detection(pdf_path, gray, doc)[0]
+    
+    def render_page_color(self, pdf_path: str, page_num: int,
+                          doc: Optional[fitz.Document] = None) -> Optional[np.ndarray]:
+        """Renderiza uma página em BGR, no mesmo tamanho da versão em cinza (para o recorte)"""
+        if doc is not None:
+            return self.render_page_for_detection(doc, page_num, gray=False)
+        with fitz.open(pdf_path) as doc:
+            try:
+                return self.render_page_for_detection(doc, page_num, gray=False)
+            finally:
+                self.clear_page_cache()
     
     def save_photo(self, photo: np.ndarray, output_path: str) -> bool:
-        """Salva a foto extraída"""
+        """Salva a foto extraída (codifica em memória e grava os bytes de uma vez)"""
         try:
-            cv2.imwrite(output_path, photo)
+            ext = os.path.splitext(output_path)[1].lower() or '.jpg'
+            ok, buf = cv2.imencode(ext, photo, PHOTO_ENCODE_OPTS.get(ext, []))
+            if not ok:
+                self.logger.error(f"Erro ao codificar foto: {output_path}")
+                return False
+            buf.tofile(output_path)
             return True
         except Exception as e:
             self.logger.error(f"Erro ao salvar foto: {e}")
@@ -748,12 +1128,22 @@ class DocumentProcessor:
         """Identifica o tipo de documento baseado no texto"""
         text = text.lower()
         
+        # Padrões presentes no texto (todos, sem o Hyperscan)
+        present = None
+        if self._doc_type_db is not None and not _HS_UNSAFE_CHARS_RE.search(text):
+            present = set()
+            self._doc_type_db.scan(text.encode('utf-8'),
+                                   match_event_handler=lambda id, start, end, flags, ctx: present.add(id))
+        
         scores = {}
+        pattern_id = 0
         for doc_type, patterns in self.document_patterns.items():
             score = 0
             for pattern in patterns:
-                matches = len(re.findall(pattern, text, re.IGNORECASE))
-                score += matches
+                if present is None or pattern_id in present:
+                    matches = len(pattern.findall(text))
+                    score += matches
+                pattern_id += 1
             scores[doc_type] = score
         
         if scores and max(scores.values()) > 0:
@@ -767,10 +1157,10 @@ class DocumentProcessor:
         
         for field, patterns in self.info_patterns.items():
             for pattern in patterns:
-                matches = re.findall(pattern, text, re.IGNORECASE | re.MULTILINE)
+                matches = pattern.findall(text)
                 if matches:
                     if field == 'cpf':
-                        cpf = re.sub(r'[^\d]', '', matches[0])
+                        cpf = _NON_DIGIT_RE.sub('', matches[0])
                         if len(cpf) == 11:
                             formatted_cpf = f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
                             info[field] = formatted_cpf
@@ -783,12 +1173,16 @@ class DocumentProcessor:
     
     def process_document(self, pdf_path: str, output_dir: str = "./") -> Dict[str, Any]:
         """Processa um documento PDF completo com detecção avançada"""
+        doc = None
         try:
             self.logger.info(f"Processando documento: {pdf_path}")
             
+            # Abre o PDF uma única vez para todas as etapas
+            doc = fitz.open(pdf_path)
+            
             # Extrai texto com Textract
             print("📝 Extraindo texto com AWS Textract...")
-            text, structured_data = self.extract_text_with_textract(pdf_path)
+            text, structured_data = self.extract_text_with_textract(pdf_path, doc)
             
             if structured_data:
                 print("📋 Analisando formulários estruturados...")
@@ -814,7 +1208,7 @@ class DocumentProcessor:
                             if key in structured_data:
                                 value = structured_data[key]
                                 if our_key == 'cpf' and value:
-                                    clean_cpf = re.sub(r'[^\d]', '', value)
+                                    clean_cpf = _NON_DIGIT_RE.sub('', value)
                                     if len(clean_cpf) == 11 and CPFValidator.validate_cpf(clean_cpf):
                                         formatted_cpf = f"{clean_cpf[:3]}.{clean_cpf[3:6]}.{clean_cpf[6:9]}-{clean_cpf[9:]}"
                                         extracted_info[our_key] = formatted_cpf
@@ -837,10 +1231,10 @@ class DocumentProcessor:
             
             try:
                 # Extrai imagens embutidas
-                embedded_images = self.extract_images_from_pdf(pdf_path)
+                embedded_images = self.extract_images_from_pdf(pdf_path, doc)
                 
                 # Detecta melhor foto ou usa fallback
-                best_image, extraction_method = self.detect_best_photo_or_fallback(embedded_images, pdf_path)
+                best_image, extraction_method = self.detect_best_photo_or_fallback(embedded_images, pdf_path, doc)
                 
                 # Limpa memória
                 embedded_images = None
@@ -895,6 +1289,10 @@ class DocumentProcessor:
                 'sucesso': False,
                 'erro': str(e)
             }
+        finally:
+            self.clear_page_cache()
+            if doc:
+                doc.close()
 
 def main():
     """Função principal"""
@@ -902,12 +1300,14 @@ def main():
     parser.add_argument('pdf_path', help='Caminho para o arquivo PDF')
     parser.add_argument('-o', '--output', default='./', help='Diretório de saída')
     parser.add_argument('-r', '--region', default='us-east-1', help='Região AWS')
+    parser.add_argument('-b', '--bucket', default=None,
+                        help=f'Bucket S3 para PDFs com mais de {TEXTRACT_ASYNC_MIN_PAGES} páginas (API assíncrona do Textract)')
     
     args = parser.parse_args()
     
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     
-    processor = DocumentProcessor(region=args.region)
+    processor = DocumentProcessor(region=args.region, s3_bucket=args.bucket)
     result = processor.process_document(args.pdf_path, args.output)
     
     print("\n" + "="*60)
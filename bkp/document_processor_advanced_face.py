@@ -11,24 +11,101 @@ import numpy as np
 from PIL import Image
 import boto3
 import base64
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 import argparse
 import sys
 import os
 import logging
 import json
 import gc  # Garbage collector
+from functools import lru_cache
+from operator import mul
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError, NoCredentialsError
 
+try:
+    # Multi-padrão em uma única passada (DFA compilado); opcional
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# Padrões auxiliares usados a cada chamada, compilados uma única vez
+_NON_DIGIT_RE = re.compile(r'[^0-9]')
+_TRAILING_SEP_RE = re.compile(r'[:\s]+$')
+
+# Caracteres em que o Hyperscan diverge do re (\s, \d e caixa): separadores
+# \x1c-\x1f, İ/ı e dígitos fora do BMP; com eles no texto, o pré-filtro é ignorado
+_HS_UNSAFE_CHARS_RE = re.compile('[\x1c-\x1f\u0130\u0131\U00010000-\U0010ffff]')
+
+# Detector de rostos YuNet (ONNX, backend DNN do OpenCV); sem o modelo, cai na
+# pilha de Haar cascades
+YUNET_MODEL = os.environ.get(
+    'YUNET_MODEL',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'face_detection_yunet_2023mar.onnx')
+)
+YUNET_SCORE_THRESHOLD = 0.6
+YUNET_NMS_THRESHOLD = 0.3
+YUNET_TOP_K = 5000
+USE_YUNET = hasattr(cv2, 'FaceDetectorYN') and os.path.exists(YUNET_MODEL)
+
+# Parâmetros de cada classificador Haar
+CASCADE_PARAMS = {
+    'frontal_default': dict(scaleFactor=1.1, minNeighbors=4, minSize=(30, 30), maxSize=(500, 500)),
+    'frontal_alt': dict(scaleFactor=1.05, minNeighbors=3, minSize=(25, 25), maxSize=(400, 400)),
+    'profile': dict(scaleFactor=1.1, minNeighbors=5, minSize=(30, 30), maxSize=(300, 300)),
+}
+
+# Caminho opcional em GPU (OpenCV com cudaobjdetect e um dispositivo CUDA): os
+# cascades da GPU só aceitam o formato antigo (pasta haarcascades_cuda do OpenCV)
+CUDA_HAAR_CASCADES = os.environ.get(
+    'CUDA_HAAR_CASCADES',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'haarcascades_cuda')
+)
+CUDA_CASCADE_FILES = {
+    'frontal_default': 'haarcascade_frontalface_default.xml',
+    'frontal_alt': 'haarcascade_frontalface_alt.xml',
+    'profile': 'haarcascade_profileface.xml',
+}
+# Pilhas do BufferPool: os buffers de cada imagem saem delas, sem cudaMalloc
+CUDA_BUFFER_POOL_STACK_SIZE = 64 * 1024 * 1024
+CUDA_BUFFER_POOL_STACK_COUNT = 2
+try:
+    USE_CUDA = hasattr(cv2, 'cuda_CascadeClassifier') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+except cv2.error:
+    USE_CUDA = False
+
+# Parada antecipada: uma face com pelo menos esta área, vinda de um classificador
+# com minNeighbors >= 4, encerra a busca (demais classificadores e variantes)
+FACE_EARLY_EXIT_MIN_AREA = 60 * 60
+FACE_EARLY_EXIT_MIN_NEIGHBORS = 4
+
+# Imagens maiores que isto são reduzidas com pyrDown uma única vez, e o mesmo
+# nível é lido por todos os classificadores (as caixas voltam à escala original)
+FACE_DETECTION_MAX_SIDE = 1024
+
+# Pesos dos dígitos verificadores do CPF; como os dígitos são lidos como bytes
+# ASCII, o deslocamento de ord('0') em cada posição é descontado de uma vez só
+_CPF_W1 = (10, 9, 8, 7, 6, 5, 4, 3, 2)
+_CPF_W2 = (11, 10, 9, 8, 7, 6, 5, 4, 3, 2)
+_CPF_W1_OFFSET = ord('0') * sum(_CPF_W1)
+_CPF_W2_OFFSET = ord('0') * sum(_CPF_W2)
+
+def _reuse_buffer(buf: Optional[np.ndarray], shape: Tuple[int, ...]) -> np.ndarray:
+    """Devolve buf se já tiver o formato pedido (uint8); senão aloca um novo"""
+    if buf is None or buf.shape != shape:
+        return np.empty(shape, dtype=np.uint8)
+    return buf
+
 class CPFValidator:
     """Classe para validação de CPF"""
     
     @staticmethod
     def clean_cpf(cpf: str) -> str:
         """Remove caracteres não numéricos do CPF"""
-        return re.sub(r'[^0-9]', '', cpf)
+        return _NON_DIGIT_RE.sub('', cpf)
     
     @staticmethod
+    @lru_cache(maxsize=4096)
     def validate_cpf(cpf: str) -> bool:
         """
         Valida CPF usando o algoritmo oficial
@@ -44,29 +121,52 @@ class CPFValidator:
         if cpf == cpf[0] * 11:
             return False
         
-        # Calcula primeiro dígito verificador
-        sum1 = sum(int(cpf[i]) * (10 - i) for i in range(9))
-        digit1 = 11 - (sum1 % 11)
-        if digit1 >= 10:
-            digit1 = 0
+        # Produto escalar dos dígitos (bytes ASCII) com os pesos, sem int() por dígito
+        digits = cpf.encode('ascii')
+        sum1 = sum(map(mul, digits, _CPF_W1)) - _CPF_W1_OFFSET
+        sum2 = sum(map(mul, digits, _CPF_W2)) - _CPF_W2_OFFSET
         
-        # Calcula segundo dígito verificador
-        sum2 = sum(int(cpf[i]) * (11 - i) for i in range(10))
-        digit2 = 11 - (sum2 % 11)
-        if digit2 >= 10:
-            digit2 = 0
+        # 11 - (soma % 11), com 10 e 11 virando 0
+        digit1 = (-sum1) % 11 % 10
+        digit2 = (-sum2) % 11 % 10
         
         # Verifica se os dígitos calculados conferem
-        return cpf[9] == str(digit1) and cpf[10] == str(digit2)
+        return digits[9] - 48 == digit1 and digits[10] - 48 == digit2
 
 class AdvancedFaceDetector:
     """Detector avançado de rostos com múltiplos métodos"""
     
-    def __init__(self):
+    def __init__(self, use_dnn: bool = True):
         self.logger = logging.getLogger(__name__)
         
-        # Carrega diferentes classificadores Haar
+        # Com o YuNet disponível, uma única passada da rede substitui os cascades
+        # e as variantes melhoradas da imagem
+        self.yunet = None
+        if use_dnn and USE_YUNET:
+            try:
+                self.yunet = cv2.FaceDetectorYN.create(
+                    YUNET_MODEL, "", (320, 320), YUNET_SCORE_THRESHOLD,
+                    YUNET_NMS_THRESHOLD, YUNET_TOP_K
+                )
+                self.logger.info("Detector YuNet carregado")
+            except cv2.error as e:
+                self.logger.warning(f"Erro ao carregar o YuNet, usando Haar cascades: {e}")
+        
+        # Carrega diferentes classificadores Haar (só como reserva do YuNet)
         self.face_cascades = []
+        self.cuda_cascades = []
+        self._pool = None
+        
+        # Buffers das variantes (equalizada, contraste, desfoque), reaproveitados
+        # entre imagens e documentos
+        self._equalized_buf = None
+        self._contrast_buf = None
+        self._blur_buf = None
+        if self.yunet is not None:
+            return
+        
+        if USE_CUDA:
+            self._init_cuda()
         
         # Classificador frontal padrão
         try:
@@ -93,6 +193,71 @@ class AdvancedFaceDetector:
             pass
         
         self.logger.info(f"Carregados {len(self.face_cascades)} classificadores de face")
+        
+        # Um cascade por thread: o detectMultiScale libera o GIL e cada instância
+        # só é usada por uma tarefa de cada vez
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.face_cascades)))
+    
+    def _init_cuda(self):
+        """Prepara stream, BufferPool e cascades da GPU; em caso de erro, fica só a CPU"""
+        try:
+            # O uso do BufferPool precisa ser ligado antes de criar qualquer stream
+            cv2.cuda.setBufferPoolUsage(True)
+            cv2.cuda.setBufferPoolConfig(cv2.cuda.getDevice(), CUDA_BUFFER_POOL_STACK_SIZE,
+                                         CUDA_BUFFER_POOL_STACK_COUNT)
+            self._cuda_stream = cv2.cuda.Stream()
+            self._cuda_buffers = cv2.cuda.BufferPool(self._cuda_stream)
+            
+            for method_name, filename in CUDA_CASCADE_FILES.items():
+                params = CASCADE_PARAMS[method_name]
+                cascade = cv2.cuda_CascadeClassifier.create(os.path.join(CUDA_HAAR_CASCADES, filename))
+                cascade.setScaleFactor(params['scaleFactor'])
+                cascade.setMinNeighbors(params['minNeighbors'])
+                cascade.setMinObjectSize(params['minSize'])
+                cascade.setMaxObjectSize(params['maxSize'])
+                self.cuda_cascades.append((method_name, cascade))
+            
+            self.logger.info(f"Carregados {len(self.cuda_cascades)} classificadores de face na GPU")
+        except cv2.error as e:
+            self.logger.warning(f"Erro ao preparar a detecção em GPU, usando a CPU: {e}")
+            self.cuda_cascades = []
+    
+    def detect_faces_cuda(self, image: np.ndarray) -> List[Tuple[int, int, int, int, str]]:
+        """
+        Detecta faces com os cascades da GPU: upload, conversão para cinza e os três
+        classificadores na mesma stream, com buffers do BufferPool e uma única sincronização
+        Returns: Lista de (x, y, w, h, method_name)
+        """
+        stream = self._cuda_stream
+        height, width = image.shape[:2]
+        
+        # O BufferPool é uma pilha: o buffer colorido, alocado por último, é o
+        # primeiro a ser liberado
+        gpu_gray = self._cuda_buffers.getBuffer(height, width, cv2.CV_8UC1)
+        gpu_img = None
+        if len(image.shape) == 3:
+            gpu_img = self._cuda_buffers.getBuffer(height, width, cv2.CV_8UC3)
+            gpu_img.upload(image, stream)
+            cv2.cuda.cvtColor(gpu_img, cv2.COLOR_BGR2GRAY, dst=gpu_gray, stream=stream)
+        else:
+            gpu_gray.upload(image, stream)
+        
+        detections = [(method_name, cascade, cascade.detectMultiScale(gpu_gray, stream=stream))
+                      for method_name, cascade in self.cuda_cascades]
+        stream.waitForCompletion()
+        gpu_img = None
+        
+        # Só os retângulos voltam para a CPU, na ordem dos métodos
+        all_faces = []
+        for method_name, cascade, objects in detections:
+            self._collect_faces(all_faces, method_name, cascade.convert(objects))
+        return all_faces
+    
+    def __del__(self):
+        """Encerra o pool de detecção"""
+        pool = getattr(self, "_pool", None)
+        if pool is not None:
+            pool.shutdown(wait=False)
     
     def detect_faces_multiple_methods(self, image: np.ndarray) -> List[Tuple[int, int, int, int, str]]:
         """
@@ -104,42 +269,46 @@ class AdvancedFaceDetector:
         if image is None or image.size == 0:
             return all_faces
         
-        # Converte para escala de cinza
+        if self.yunet is not None:
+            return self.detect_faces_yunet(image)
+        
+        if self.cuda_cascades:
+            try:
+                unique_faces = self.remove_duplicate_faces(self.detect_faces_cuda(image))
+                self.logger.info(f"Detectadas {len(unique_faces)} faces únicas na GPU")
+                return unique_faces
+            except cv2.error as e:
+                self.logger.warning(f"Erro na detecção em GPU, usando a CPU: {e}")
+        
+        # Converte para escala de cinza (um único buffer contíguo, lido por todas as threads)
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        gray = np.ascontiguousarray(gray)
+        
+        # Nível reduzido construído uma única vez e lido por todos os classificadores
+        level, scale = self.detection_level(gray)
+        
+        # O primeiro classificador (frontal_default) roda sozinho; se já achar uma
+        # face forte, os demais nem são executados
+        first_name, first_cascade = self.face_cascades[0] if self.face_cascades else (None, None)
+        if first_cascade is not None:
+            try:
+                self._collect_faces(all_faces, first_name, self.detect_on_level(first_cascade, first_name, level, scale))
+            except Exception as e:
+                self.logger.warning(f"Erro no método {first_name}: {e}")
+            
+            if self.has_strong_face(all_faces):
+                unique_faces = self.remove_duplicate_faces(all_faces)
+                self.logger.info(f"Detectadas {len(unique_faces)} faces únicas usando {first_name} (parada antecipada)")
+                return unique_faces
         
-        # Aplica diferentes métodos de detecção
-        for method_name, cascade in self.face_cascades:
+        # Aplica os demais métodos de detecção em paralelo
+        futures = [(method_name, self._pool.submit(self.detect_on_level, cascade, method_name, level, scale))
+                   for method_name, cascade in self.face_cascades[1:]]
+        
+        # Coleta na ordem dos métodos (a remoção de duplicatas depende da ordem)
+        for method_name, future in futures:
             try:
-                # Parâmetros otimizados para cada método
-                if method_name == 'frontal_default':
-                    faces = cascade.detectMultiScale(
-                        gray, 
-                        scaleFactor=1.1, 
-                        minNeighbors=4, 
-                        minSize=(30, 30),
-                        maxSize=(500, 500)
-                    )
-                elif method_name == 'frontal_alt':
-                    faces = cascade.detectMultiScale(
-                        gray, 
-                        scaleFactor=1.05, 
-                        minNeighbors=3, 
-                        minSize=(25, 25),
-                        maxSize=(400, 400)
-                    )
-                elif method_name == 'profile':
-                    faces = cascade.detectMultiScale(
-                        gray, 
-                        scaleFactor=1.1, 
-                        minNeighbors=5, 
-                        minSize=(30, 30),
-                        maxSize=(300, 300)
-                    )
-                
-                # Adiciona faces encontradas
-                for (x, y, w, h) in faces:
-                    all_faces.append((x, y, w, h, method_name))
-                    
+                self._collect_faces(all_faces, method_name, future.result())
             except Exception as e:
                 self.logger.warning(f"Erro no método {method_name}: {e}")
                 continue
@@ -150,68 +319,119 @@ class AdvancedFaceDetector:
         self.logger.info(f"Detectadas {len(unique_faces)} faces únicas usando {len(self.face_cascades)} métodos")
         return unique_faces
     
+    def detect_faces_yunet(self, image: np.ndarray) -> List[Tuple[int, int, int, int, str]]:
+        """
+        Detecta faces com uma única passada do YuNet (a NMS já vem da rede)
+        Returns: Lista de (x, y, w, h, 'yunet')
+        """
+        if len(image.shape) == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        
+        self.yunet.setInputSize((image.shape[1], image.shape[0]))
+        _, detections = self.yunet.detect(image)
+        if detections is None:
+            return []
+        
+        # Cada linha: caixa, 5 pontos de referência e score; a caixa pode sair da imagem
+        faces = []
+        for x, y, w, h in detections[:, :4].astype(np.int32):
+            faces.append((max(0, int(x)), max(0, int(y)), int(w), int(h), 'yunet'))
+        
+        self.logger.info(f"Detectadas {len(faces)} faces com YuNet")
+        return faces
+    
+    @staticmethod
+    def detection_level(gray: np.ndarray) -> Tuple[np.ndarray, int]:
+        """Nível da pirâmide gaussiana usado na detecção e seu fator de escala"""
+        level, scale = gray, 1
+        while max(level.shape[:2]) > FACE_DETECTION_MAX_SIDE:
+            level = cv2.pyrDown(level)
+            scale *= 2
+        return level, scale
+    
+    @staticmethod
+    def detect_on_level(cascade, method_name: str, level: np.ndarray, scale: int) -> List[Tuple[int, int, int, int]]:
+        """Roda um classificador no nível reduzido e devolve as caixas na escala original"""
+        params = dict(CASCADE_PARAMS[method_name])
+        if scale > 1:
+            params['minSize'] = tuple(v // scale for v in params['minSize'])
+            params['maxSize'] = tuple(v // scale for v in params['maxSize'])
+        return [(int(x) * scale, int(y) * scale, int(w) * scale, int(h) * scale)
+                for (x, y, w, h) in cascade.detectMultiScale(level, **params)]
+    
+    @staticmethod
+    def _collect_faces(all_faces: List[Tuple[int, int, int, int, str]], method_name: str, faces) -> None:
+        """Adiciona as faces encontradas por um método"""
+        for (x, y, w, h) in faces:
+            all_faces.append((x, y, w, h, method_name))
+    
+    @staticmethod
+    def has_strong_face(faces: List[Tuple[int, int, int, int, str]]) -> bool:
+        """Verifica se há face grande vinda de um classificador restritivo"""
+        return any(w * h >= FACE_EARLY_EXIT_MIN_AREA
+                   and (method == 'yunet'
+                        or CASCADE_PARAMS[method]['minNeighbors'] >= FACE_EARLY_EXIT_MIN_NEIGHBORS)
+                   for (x, y, w, h, method) in faces)
+    
     def remove_duplicate_faces(self, faces: List[Tuple[int, int, int, int, str]]) -> List[Tuple[int, int, int, int, str]]:
-        """Remove faces duplicadas (muito próximas)"""
+        """
+        Remove faces duplicadas (muito próximas): na ordem recebida, uma face é
+        descartada se a sobreposição com alguma já mantida passa de 50% da menor área
+        """
         if len(faces) <= 1:
             return faces
         
-        unique_faces = []
+        boxes = np.array([face[:4] for face in faces], dtype=np.int64)
+        x1, y1 = boxes[:, 0], boxes[:, 1]
+        x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+        areas = boxes[:, 2] * boxes[:, 3]
         
-        for face in faces:
-            x1, y1, w1, h1, method1 = face
-            is_duplicate = False
-            
-            for unique_face in unique_faces:
-                x2, y2, w2, h2, method2 = unique_face
-                
-                # Calcula sobreposição
-                overlap_x = max(0, min(x1 + w1, x2 + w2) - max(x1, x2))
-                overlap_y = max(0, min(y1 + h1, y2 + h2) - max(y1, y2))
-                overlap_area = overlap_x * overlap_y
-                
-                area1 = w1 * h1
-                area2 = w2 * h2
-                
-                # Se sobreposição > 50%, considera duplicata
-                if overlap_area > 0.5 * min(area1, area2):
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate:
-                unique_faces.append(face)
+        # Sobreposição de todos os pares de uma vez (broadcasting N x N)
+        overlap_x = np.clip(np.minimum.outer(x2, x2) - np.maximum.outer(x1, x1), 0, None)
+        overlap_y = np.clip(np.minimum.outer(y2, y2) - np.maximum.outer(y1, y1), 0, None)
+        duplicate = overlap_x * overlap_y > 0.5 * np.minimum.outer(areas, areas)
         
-        return unique_faces
+        # Passada gulosa: só compara com as faces já mantidas
+        kept = np.zeros(len(faces), dtype=bool)
+        for i in range(len(faces)):
+            kept[i] = not (duplicate[i] & kept).any()
+        
+        return [face for face, keep in zip(faces, kept) if keep]
     
-    def enhance_image_for_detection(self, image: np.ndarray) -> List[np.ndarray]:
+    def enhance_image_for_detection(self, image: np.ndarray) -> Iterator[Tuple[str, np.ndarray]]:
         """
-        Cria versões melhoradas da imagem para detecção
+        Gera versões melhoradas da imagem para detecção, uma de cada vez:
+        a próxima só é calculada se o chamador pedir. As variantes saem em escala
+        de cinza (os cascades convertem para cinza de qualquer forma), escritas em
+        buffers reaproveitados e válidas até o próximo item
+        Returns: (tag, imagem)
         """
-        enhanced_images = [image]  # Imagem original
+        # A rede já tolera contraste e desfoque e precisa da imagem colorida
+        if self.yunet is not None:
+            yield 'enh0', image
+            return
         
         try:
-            # Versão com equalização de histograma
+            # Imagem original, convertida para cinza uma única vez
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
-            equalized = cv2.equalizeHist(gray)
-            if len(image.shape) == 3:
-                equalized_bgr = cv2.cvtColor(equalized, cv2.COLOR_GRAY2BGR)
-                enhanced_images.append(equalized_bgr)
-            else:
-                enhanced_images.append(equalized)
+            yield 'enh0', gray
+            
+            # Versão com equalização de histograma
+            self._equalized_buf = _reuse_buffer(self._equalized_buf, gray.shape)
+            yield 'enh1', cv2.equalizeHist(gray, dst=self._equalized_buf)
             
             # Versão com ajuste de contraste
             alpha = 1.2  # Contraste
             beta = 10    # Brilho
-            contrast_adjusted = cv2.convertScaleAbs(image, alpha=alpha, beta=beta)
-            enhanced_images.append(contrast_adjusted)
+            self._contrast_buf = _reuse_buffer(self._contrast_buf, gray.shape)
+            yield 'enh2', cv2.convertScaleAbs(gray, dst=self._contrast_buf, alpha=alpha, beta=beta)
             
             # Versão com desfoque gaussiano leve (remove ruído)
-            blurred = cv2.GaussianBlur(image, (3, 3), 0)
-            enhanced_images.append(blurred)
+            self._blur_buf = _reuse_buffer(self._blur_buf, gray.shape)
+            yield 'enh3', cv2.GaussianBlur(gray, (3, 3), 0, dst=self._blur_buf)
             
         except Exception as e:
             self.logger.warning(f"Erro ao melhorar imagem: {e}")
-        
-        return enhanced_images
 
 class DocumentProcessor:
     """Processador principal de documentos com detecção avançada"""
@@ -255,19 +475,74 @@ class DocumentProcessor:
             'nome': [
                 r'nome[:\s]+([A-ZÁÀÂÃÉÊÍÓÔÕÚÇ\s]+)',
                 r'name[:\s]+([A-ZÁÀÂÃÉÊÍÓÔÕÚÇ\s]+)',
-                r'^([A-ZÁÀÂÃÉÊÍÓÔÕÚÇ\s]{10,})$'
+                # Linha só com 3+ palavras em maiúsculas; classes disjuntas (sem \s,
+                # que inclui \n) mantêm a busca linear
+                r'^[ \t]*(?-i:([A-ZÁÀÂÃÉÊÍÓÔÕÚÇ]+(?:[ \t]+[A-ZÁÀÂÃÉÊÍÓÔÕÚÇ]+){2,}))[ \t]*$'
             ],
             'cpf': [
                 r'cpf[:\s]*(\d{3}\.?\d{3}\.?\d{3}[-\.]?\d{2})',
                 r'(\d{3}\.?\d{3}\.?\d{3}[-\.]?\d{2})',
                 r'cpf[:\s]*(\d{11})'
             ],
+            # Número do RG: 3+ dígitos em até 3 grupos separados por ponto (o
+            # lookahead confere os 3 dígitos; sem \d+ sobrepostos, não há retrocesso)
             'rg': [
-                r'rg[:\s]*(\d+\.?\d+\.?\d+[-\.]?\d*)',
-                r'registro\s+geral[:\s]*(\d+\.?\d+\.?\d+[-\.]?\d*)',
-                r'identidade[:\s]*(\d+\.?\d+\.?\d+[-\.]?\d*)'
+                r'rg[:\s]*((?=(?:\d\.?){2}\d)\d+(?:\.\d+){0,2}[-.]?\d*)',
+                r'registro\s+geral[:\s]*((?=(?:\d\.?){2}\d)\d+(?:\.\d+){0,2}[-.]?\d*)',
+                r'identidade[:\s]*((?=(?:\d\.?){2}\d)\d+(?:\.\d+){0,2}[-.]?\d*)'
             ]
         }
+        
+        # Compila todos os padrões uma única vez
+        self.document_patterns = {
+            doc_type: [re.compile(p, re.IGNORECASE) for p in patterns]
+            for doc_type, patterns in self.document_patterns.items()
+        }
+        self.info_patterns = {
+            field: [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in patterns]
+            for field, patterns in self.info_patterns.items()
+        }
+        
+        # Com o Hyperscan, uma passada no texto diz quais padrões aparecem (o id
+        # de cada padrão é a sua posição na ordem dos dicionários); só esses são
+        # avaliados com re
+        self._doc_type_db = None
+        self._info_db = None
+        if hyperscan is not None:
+            self._doc_type_db = self._compile_pattern_db(self.document_patterns, 0)
+            self._info_db = self._compile_pattern_db(self.info_patterns, hyperscan.HS_FLAG_MULTILINE)
+    
+    def _compile_pattern_db(self, pattern_groups: Dict[str, List[re.Pattern]], extra_flags: int):
+        """Compila todos os padrões dos grupos em um banco do Hyperscan (None se falhar)"""
+        expressions = [pattern.pattern.encode('utf-8')
+                       for patterns in pattern_groups.values()
+                       for pattern in patterns]
+        # PREFILTER: aceita construções que o Hyperscan não suporta (lookahead),
+        # casando um superconjunto, o que basta para um pré-filtro
+        flags = (hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+                 | hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_PREFILTER | extra_flags)
+        try:
+            db = hyperscan.Database()
+            db.compile(
+                expressions=expressions,
+                ids=list(range(len(expressions))),
+                elements=len(expressions),
+                flags=[flags] * len(expressions),
+            )
+            return db
+        except Exception as e:
+            self.logger.warning(f"Hyperscan indisponível, usando re: {e}")
+            return None
+    
+    @staticmethod
+    def _patterns_present(db, text: str) -> Optional[set]:
+        """Ids dos padrões que aparecem no texto, em uma passada (None sem o banco)"""
+        if db is None or _HS_UNSAFE_CHARS_RE.search(text):
+            return None
+        present = set()
+        db.scan(text.encode('utf-8'),
+                match_event_handler=lambda id, start, end, flags, ctx: present.add(id))
+        return present
     
     def initialize_textract(self):
         """Inicializa o cliente Textract"""
@@ -65,7 +65,7 @@
                                         value_text = self.get_text_from_block(value_block, blocks)
                                         
                                         # Limpa e armazena
-                                        clean_key = re.sub(r'[:\s]+$', '', key_text.lower().strip())
+                                        clean_key = _TRAILING_SEP_RE.sub('', key_text.lower().strip())
                                         structured_data[clean_key] = value_text.strip()
         
         return structured_data
@@ -267,13 +267,16 @@
             
             self.logger.info(f"Analisando imagem {img_idx + 1}/{len(images)} para detecção de faces")
             
-            # Cria versões melhoradas da imagem
+            # Versões melhoradas da imagem, geradas sob demanda
             enhanced_images = self.face_detector.enhance_image_for_detection(img)
             
-            for enh_idx, enhanced_img in enumerate(enhanced_images):
+            for enh_tag, enhanced_img in enhanced_images:
                 # Detecta faces com múltiplos métodos
                 faces = self.face_detector.detect_faces_multiple_methods(enhanced_img)
                 
+                # Face forte encontrada: as variantes seguintes nem são calculadas
+                found_strong = self.face_detector.has_strong_face(faces)
+                
                 for face_data in faces:
                     x, y, w, h, method = face_data
                     
@@ -288,18 +291,22 @@
                         confidence *= 1.1
                     
                     # Bonus para imagem original (não melhorada)
-                    if enh_idx == 0:
+                    if enh_tag == 'enh0':
                         confidence *= 1.1
                     
-                    # Extrai e processa a face
+                    # Extrai e processa a face (sempre da imagem original colorida;
+                    # as variantes em cinza só servem à detecção)
                     try:
-                        face_region = self.crop_face_3x4(enhanced_img, x, y, w, h)
+                        face_region = self.crop_face_3x4(img, x, y, w, h)
                         if face_region is not None:
-                            detection_info = f"{method}_enh{enh_idx}"
+                            detection_info = f"{method}_{enh_tag}"
                             all_faces.append((face_region, detection_info, confidence))
                     except Exception as e:
                         self.logger.warning(f"Erro ao extrair face: {e}")
                         continue
+                
+                if found_strong:
+                    break
         
         # Ordena por confiança (maior primeiro)
         all_faces.sort(key=lambda x: x[2], reverse=True)
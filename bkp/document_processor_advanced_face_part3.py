@@ -107,12 +107,18 @@
         """Identifica o tipo de documento baseado no texto"""
         text = text.lower()
         
+        # Padrões presentes no texto (todos, sem o Hyperscan)
+        present = self._patterns_present(self._doc_type_db, text)
+        
         scores = {}
+        pattern_id = 0
         for doc_type, patterns in self.document_patterns.items():
             score = 0
             for pattern in patterns:
-                matches = len(re.findall(pattern, text, re.IGNORECASE))
-                score += matches
+                if present is None or pattern_id in present:
+                    matches = len(pattern.findall(text))
+                    score += matches
+                pattern_id += 1
             scores[doc_type] = score
         
         if scores and max(scores.values()) > 0:
@@ -124,12 +130,18 @@
         """Extrai informações do texto usando regex"""
         info = {}
         
+        # Padrões presentes no texto; o grupo capturado vem do re
+        present = self._patterns_present(self._info_db, text)
+        
+        first_id = 0
         for field, patterns in self.info_patterns.items():
-            for pattern in patterns:
-                matches = re.findall(pattern, text, re.IGNORECASE | re.MULTILINE)
+            for pattern_id, pattern in enumerate(patterns, first_id):
+                if present is not None and pattern_id not in present:
+                    continue
+                matches = pattern.findall(text)
                 if matches:
                     if field == 'cpf':
-                        cpf = re.sub(r'[^\d]', '', matches[0])
+                        cpf = _NON_DIGIT_RE.sub('', matches[0])
                         if len(cpf) == 11:
                             formatted_cpf = f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
                             info[field] = formatted_cpf
@@ -137,6 +149,7 @@
                     else:
                         info[field] = matches[0].strip()
                         break
+            first_id += len(patterns)
         
         return info
     
@@ -173,7 +186,7 @@
                             if key in structured_data:
                                 value = structured_data[key]
                                 if our_key == 'cpf' and value:
-                                    clean_cpf = re.sub(r'[^\d]', '', value)
+                                    clean_cpf = _NON_DIGIT_RE.sub('', value)
                                     if len(clean_cpf) == 11 and CPFValidator.validate_cpf(clean_cpf):
                                         formatted_cpf = f"{clean_cpf[:3]}.{clean_cpf[3:6]}.{clean_cpf[6:9]}-{clean_cpf[9:]}"
                                         extracted_info[our_key] = formatted_cpf
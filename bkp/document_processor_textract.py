@@ -17,8 +17,40 @@ import sys
 import os
 import logging
 import json
+import threading
+import time
+import uuid
+from functools import lru_cache
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
 
+# Bucket S3 temporário para a API assíncrona do Textract (documentos com várias páginas)
+TEXTRACT_S3_BUCKET = os.environ.get('TEXTRACT_S3_BUCKET')
+
+# Limite de jobs assíncronos simultâneos, para não estourar o throttling do Textract
+TEXTRACT_MAX_JOBS = int(os.environ.get('TEXTRACT_MAX_JOBS', '2'))
+_TEXTRACT_JOB_SLOTS = threading.BoundedSemaphore(TEXTRACT_MAX_JOBS)
+
+# Configuração compartilhada dos clientes AWS: pool de conexões maior para as
+# chamadas concorrentes e novas tentativas em caso de throttling
+_AWS_CLIENT_CONFIG = Config(max_pool_connections=32, retries={'max_attempts': 5})
+
+@lru_cache(maxsize=None)
+def _get_aws_client(service: str, region_name: str):
+    """Cria um único cliente boto3 por serviço/região (clientes são thread-safe)"""
+    return boto3.client(service, region_name=region_name, config=_AWS_CLIENT_CONFIG)
+
+@lru_cache(maxsize=8)
+def _render_pdf_pages(pdf_path: str, mtime_ns: int, size: int, dpi: int) -> Tuple[bytes, ...]:
+    """Renderiza as páginas em PNG; mtime/tamanho entram na chave do cache para
+    invalidar quando o arquivo muda"""
+    doc = fitz.open(pdf_path)
+    try:
+        mat = fitz.Matrix(dpi/72, dpi/72)
+        return tuple(page.get_pixmap(matrix=mat).tobytes("png") for page in doc)
+    finally:
+        doc.close()
+
 class CPFValidator:
     """Classe para validação de CPF"""
     
@@ -64,7 +96,8 @@ class TextractOCR:
     def __init__(self, region_name: str = 'us-east-1'):
         """Inicializa o cliente Textract"""
         try:
-            self.textract = boto3.client('textract', region_name=region_name)
+            self.textract = _get_aws_client('textract', region_name)
+            self.s3 = None  # criado sob demanda pela API assíncrona
             self.logger = logging.getLogger(__name__)
             self.region = region_name
         except NoCredentialsError:
@@ -126,28 +159,7 @@ class TextractOCR:
                 FeatureTypes=['FORMS']
             )
             
-            # Extrair pares chave-valor
-            key_value_pairs = {}
-            
-            # Mapear blocos por ID
-            blocks_by_id = {block['Id']: block for block in response.get('Blocks', [])}
-            
-            for block in response.get('Blocks', []):
-                if block['BlockType'] == 'KEY_VALUE_SET':
-                    if block.get('EntityTypes') and 'KEY' in block['EntityTypes']:
-                        # Este é um bloco de chave
-                        key_text = self._get_text_from_relationships(block, blocks_by_id)
-                        
-                        # Encontrar o valor correspondente
-                        if 'Relationships' in block:
-                            for relationship in block['Relationships']:
-                                if relationship['Type'] == 'VALUE':
-                                    for value_id in relationship['Ids']:
-                                        value_block = blocks_by_id.get(value_id)
-                                        if value_block:
-                                            value_text = self._get_text_from_relationships(value_block, blocks_by_id)
-                                            if key_text and value_text:
-                                                key_value_pairs[key_text.lower()] = value_text
+            key_value_pairs = self._get_key_value_pairs(response.get('Blocks', []))
             
             return {
                 'key_value_pairs': key_value_pairs,
@@ -158,6 +170,95 @@ class TextractOCR:
             self.logger.warning(f"Erro na análise de formulários: {e}")
             return {'key_value_pairs': {}, 'raw_response': None}
     
+    def analyze_document_async(self, pdf_path: str, bucket: str,
+                               max_wait: float = 600.0) -> Dict[str, Any]:
+        """
+        Analisa o PDF inteiro (todas as páginas) com a API assíncrona do Textract:
+        um upload para o S3 e um único job, em vez de uma chamada síncrona por página
+        Returns: Dicionário com texto, linhas, pares chave-valor e número de páginas
+        """
+        if self.s3 is None:
+            self.s3 = _get_aws_client('s3', self.region)
+        
+        key = f"textract-tmp/{uuid.uuid4().hex}-{os.path.basename(pdf_path)}"
+        
+        with _TEXTRACT_JOB_SLOTS:
+            try:
+                self.s3.upload_file(pdf_path, bucket, key)
+                job = self.textract.start_document_analysis(
+                    DocumentLocation={'S3Object': {'Bucket': bucket, 'Name': key}},
+                    FeatureTypes=['FORMS']
+                )
+                job_id = job['JobId']
+                
+                # Espera o job terminar com backoff exponencial
+                delay = 1.0
+                deadline = time.monotonic() + max_wait
+                while True:
+                    response = self.textract.get_document_analysis(JobId=job_id)
+                    status = response['JobStatus']
+                    if status != 'IN_PROGRESS':
+                        break
+                    if time.monotonic() > deadline:
+                        raise Exception(f"Tempo esgotado aguardando o job {job_id} do Textract")
+                    time.sleep(delay)
+                    delay = min(delay * 2, 10.0)
+                
+                if status != 'SUCCEEDED':
+                    raise Exception(f"Job do Textract terminou com status {status}: "
+                                    f"{response.get('StatusMessage', '')}")
+                
+                # Resultado paginado
+                blocks = list(response.get('Blocks', []))
+                next_token = response.get('NextToken')
+                while next_token:
+                    response = self.textract.get_document_analysis(JobId=job_id, NextToken=next_token)
+                    blocks.extend(response.get('Blocks', []))
+                    next_token = response.get('NextToken')
+            
+            except ClientError as e:
+                raise Exception(f"Erro do Textract: {e}")
+            finally:
+                try:
+                    self.s3.delete_object(Bucket=bucket, Key=key)
+                except Exception as e:
+                    self.logger.warning(f"Não foi possível remover s3://{bucket}/{key}: {e}")
+        
+        lines = [block['Text'] for block in blocks if block['BlockType'] == 'LINE']
+        
+        return {
+            'text': '\n'.join(lines),
+            'lines': lines,
+            'key_value_pairs': self._get_key_value_pairs(blocks),
+            'pages': response.get('DocumentMetadata', {}).get('Pages', 0)
+        }
+    
+    def _get_key_value_pairs(self, blocks: List[Dict]) -> Dict[str, str]:
+        """Extrai os pares chave-valor dos blocos KEY_VALUE_SET"""
+        key_value_pairs = {}
+        
+        # Mapear blocos por ID
+        blocks_by_id = {block['Id']: block for block in blocks}
+        
+        for block in blocks:
+            if block['BlockType'] == 'KEY_VALUE_SET':
+                if block.get('EntityTypes') and 'KEY' in block['EntityTypes']:
+                    # Este é um bloco de chave
+                    key_text = self._get_text_from_relationships(block, blocks_by_id)
+                    
+                    # Encontrar o valor correspondente
+                    if 'Relationships' in block:
+                        for relationship in block['Relationships']:
+                            if relationship['Type'] == 'VALUE':
+                                for value_id in relationship['Ids']:
+                                    value_block = blocks_by_id.get(value_id)
+                                    if value_block:
+                                        value_text = self._get_text_from_relationships(value_block, blocks_by_id)
+                                        if key_text and value_text:
+                                            key_value_pairs[key_text.lower()] = value_text
+        
+        return key_value_pairs
+    
     def _get_text_from_relationships(self, block: Dict, blocks_by_id: Dict) -> str:
         """Extrai texto de um bloco seguindo suas relações"""
         text_parts = []
@@ -246,22 +347,11 @@ class DocumentProcessorTextract:
     
     def pdf_to_images(self, pdf_path: str, dpi: int = 200) -> List[bytes]:
         """Converte páginas do PDF em imagens para processamento pelo Textract"""
-        images = []
         try:
-            doc = fitz.open(pdf_path)
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                
-                # Aumentar resolução para melhor OCR
-                mat = fitz.Matrix(dpi/72, dpi/72)
-                pix = page.get_pixmap(matrix=mat)
-                
-                # Converter para bytes PNG
-                img_bytes = pix.tobytes("png")
-                images.append(img_bytes)
-                
-            doc.close()
-            return images
+            # Aumentar resolução para melhor OCR; o resultado fica em cache
+            # enquanto o arquivo não mudar
+            stat = os.stat(pdf_path)
+            return list(_render_pdf_pages(os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size, dpi))
             
         except Exception as e:
             self.logger.error(f"Erro ao converter PDF para imagens: {e}")
@@ -569,13 +659,57 @@ class DocumentProcessorTextract:
             print("Analisando formulários estruturados...")
             forms_result = self.textract_ocr.analyze_document_forms(page_images[0])
             
+            return self._build_result(pdf_path, output_dir, text, forms_result['key_value_pairs'])
+            
+        except Exception as e:
+            error_msg = f"Erro durante o processamento: {str(e)}"
+            self.logger.error(error_msg)
+            return {"erro": error_msg, "sucesso": False}
+    
+    def process_document_async(self, pdf_path: str, output_dir: str = ".",
+                               bucket: Optional[str] = None) -> Dict:
+        """
+        Processa o documento completo com a API assíncrona do Textract (todas as páginas
+        em um único job). Sem bucket S3 configurado, usa o fluxo síncrono.
+        """
+        bucket = bucket or TEXTRACT_S3_BUCKET
+        if not bucket:
+            self.logger.info("TEXTRACT_S3_BUCKET não definido, usando a API síncrona")
+            return self.process_document(pdf_path, output_dir)
+        
+        if not os.path.exists(pdf_path):
+            return {"erro": "Arquivo PDF não encontrado", "sucesso": False}
+        
+        os.makedirs(output_dir, exist_ok=True)
+        
+        print(f"Processando documento: {pdf_path}")
+        
+        try:
+            print("Extraindo texto e formulários com AWS Textract (assíncrono)...")
+            textract_result = self.textract_ocr.analyze_document_async(pdf_path, bucket)
+            text = textract_result['text']
+            
+            if not text:
+                return {"erro": "Não foi possível extrair texto do PDF", "sucesso": False}
+            
+            return self._build_result(pdf_path, output_dir, text, textract_result['key_value_pairs'])
+            
+        except Exception as e:
+            error_msg = f"Erro durante o processamento: {str(e)}"
+            self.logger.error(error_msg)
+            return {"erro": error_msg, "sucesso": False}
+    
+    def _build_result(self, pdf_path: str, output_dir: str, text: str,
+                      key_value_pairs: Dict[str, str]) -> Dict:
+        """Extrai campos, valida o CPF e procura a foto a partir do texto do Textract"""
+        try:
             # Identifica tipo de documento
             doc_type = self.identify_document_type(text)
             print(f"Tipo de documento identificado: {doc_type or 'Não identificado'}")
             
             # Extrai informações usando ambas as abordagens
             info_text = self.extract_information_from_text(text)
-            info_forms = self.extract_information_from_forms(forms_result['key_value_pairs'])
+            info_forms = self.extract_information_from_forms(key_value_pairs)
             
             # Combina resultados (prioriza formulários estruturados)
             info = {}
@@ -613,7 +747,7 @@ class DocumentProcessorTextract:
                 "cpf_valido": cpf_valido,
                 "foto_extraida": photo_path,
                 "texto_completo": text,
-                "campos_estruturados": forms_result['key_value_pairs'],
+                "campos_estruturados": key_value_pairs,
                 "sucesso": True
             }
             
@@ -0,0 +1,21 @@
+"""
+Configuração do Gunicorn para os frontends Flask do processador de documentos
+
+Uso:
+    gunicorn -c gunicorn.conf.py app_improved:app
+    gunicorn -c gunicorn.conf.py app_real:app
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# Vários processos + threads para que um PDF lento não bloqueie os demais
+workers = int(os.environ.get('GUNICORN_WORKERS', 2 * multiprocessing.cpu_count() + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+worker_class = 'gthread'
+
+# Textract + OCR + detecção de faces podem levar vários segundos por documento
+timeout = 120
+graceful_timeout = 30
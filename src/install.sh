@@ -17,6 +17,10 @@ sudo yum install tesseract -y
 echo "Instalando dependências Python..."
 pip3 install --user -r requirements.txt
 
+# Verifica se o OpenCV instalado usa libjpeg-turbo (wheel do PyPI)
+echo "Verificando codecs do OpenCV..."
+python3 -c "import cv2; print([l.strip() for l in cv2.getBuildInformation().splitlines() if l.strip().startswith('JPEG:')])"
+
 echo ""
 echo "=== INSTALAÇÃO CONCLUÍDA ==="
 echo ""
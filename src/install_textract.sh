@@ -18,6 +18,10 @@ fi
 echo "Instalando dependências Python..."
 pip3 install -r requirements_textract.txt
 
+# Verifica se o OpenCV instalado usa libjpeg-turbo (wheel do PyPI)
+echo "Verificando codecs do OpenCV..."
+python3 -c "import cv2; print([l.strip() for l in cv2.getBuildInformation().splitlines() if l.strip().startswith('JPEG:')])"
+
 # Verificar se AWS CLI está instalado
 if ! command -v aws &> /dev/null; then
     echo "AWS CLI não encontrado. Instalando..."
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Teste das validações de CPF em lote contra a validação unitária (validate_cpf)
+"""
+
+import random
+import sys
+
+import pytest
+
+# bkp/ entra no path pela configuração do pytest (pytest.ini)
+import cpf_validator_demo
+from document_processor import CPFValidator
+
+VALID_CPFS = [
+    "11144477735",
+    "12345678909",
+    "529.982.247-25",
+    "111.444.777-35",
+]
+
+INVALID_CPFS = [
+    "12345678910",
+    "11144477734",
+    "529.982.247-52",
+    "123.456.789-10",
+]
+
+REPEATED_DIGIT_CPFS = [
+    "00000000000",
+    "111.111.111-11",
+    "99999999999",
+]
+
+SHORT_CPFS = [
+    "",
+    "123",
+    "1234567890",
+    "abc.def.ghi-jk",
+]
+
+# Com mais de 11 dígitos, o clean_cpf do document_processor aproveita 11 deles
+# (ex.: 200~262106898/76) e o do demo mantém todos; cada lote segue o seu módulo
+LONG_CPFS = [
+    "123456789012",
+    "111.444.777-355",
+    "200~262106898/76",
+]
+
+WRONG_LENGTH_CPFS = SHORT_CPFS + LONG_CPFS
+
+def _random_cpfs(count=500, seed=1234):
+    """CPFs aleatórios de 11 dígitos, metade com os dígitos verificadores corretos"""
+    rng = random.Random(seed)
+    cpfs = []
+    for i in range(count):
+        base = ''.join(rng.choice('0123456789') for _ in range(9))
+        if i % 2:
+            cpfs.append(base + ''.join(rng.choice('0123456789') for _ in range(2)))
+            continue
+        # Procura o sufixo válido (sempre existe um único)
+        for suffix in range(100):
+            cpf = f"{base}{suffix:02d}"
+            if CPFValidator.validate_cpf(cpf):
+                cpfs.append(cpf)
+                break
+        else:
+            cpfs.append(base + "00")
+    return cpfs
+
+CASES = VALID_CPFS + INVALID_CPFS + REPEATED_DIGIT_CPFS + WRONG_LENGTH_CPFS + _random_cpfs()
+
+def test_known_cases():
+    """Confere os casos fixos com validate_cpf"""
+    assert all(CPFValidator.validate_cpf(cpf) for cpf in VALID_CPFS)
+    assert not any(CPFValidator.validate_cpf(cpf) for cpf in INVALID_CPFS)
+    assert not any(CPFValidator.validate_cpf(cpf) for cpf in REPEATED_DIGIT_CPFS)
+    assert not any(CPFValidator.validate_cpf(cpf) for cpf in SHORT_CPFS)
+
+def test_document_processor_batch():
+    """CPFValidator.validate_cpf_batch (document_processor)"""
+    expected = [CPFValidator.validate_cpf(cpf) for cpf in CASES]
+    assert CPFValidator.validate_cpf_batch(CASES).tolist() == expected
+    assert CPFValidator.validate_cpf_batch([]).tolist() == []
+
+def test_demo_validate_many():
+    """CPFValidator.validate_many (cpf_validator_demo), com o caminho ativo (numba ou numpy)"""
+    demo = cpf_validator_demo.CPFValidator
+    expected = [demo.validate_cpf(cpf) for cpf in CASES]
+    assert not any(demo.validate_cpf(cpf) for cpf in WRONG_LENGTH_CPFS)
+    assert demo.validate_many(CASES) == expected
+    assert demo.validate_many(iter(CASES)) == expected
+    assert demo.validate_many([]) == []
+
+def test_demo_numpy_kernel():
+    """Kernel vetorizado em numpy do cpf_validator_demo"""
+    pytest.importorskip("numpy")
+    demo = cpf_validator_demo.CPFValidator
+    digits = cpf_validator_demo.cpfs_to_digit_matrix(CASES)
+    expected = [demo.validate_cpf(cpf) for cpf in CASES]
+    assert cpf_validator_demo._validate_digit_matrix_numpy(digits).tolist() == expected
+
+def test_demo_numba_kernel():
+    """Kernel compilado com numba do cpf_validator_demo"""
+    pytest.importorskip("numba")
+    demo = cpf_validator_demo.CPFValidator
+    digits = cpf_validator_demo.cpfs_to_digit_matrix(CASES)
+    expected = [demo.validate_cpf(cpf) for cpf in CASES]
+    assert cpf_validator_demo._validate_digit_matrix(digits).tolist() == expected
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))